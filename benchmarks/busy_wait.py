@@ -0,0 +1,60 @@
+# Waiting for the panel: polling BUSY against the edge event, on a fake transport that keeps the panel busy for a
+# while after each refresh.  Shows how late each notices the panel is idle and how often the thread wakes up, and
+# how much sooner two frames get out when the second is drawn while the first refreshes.
+# Run from the top of the repo:  python -m benchmarks.busy_wait
+import time
+
+from display import epd4in2b
+from display import epdif
+
+REFRESH_SECONDS = 0.53
+RENDER_SECONDS = 0.2
+
+
+# One refresh, waited for.  Returns how long after the panel went idle the wait returned, and the wakeups.
+def wait_for_refresh(edge_events, poll_ms):
+    default_poll_ms = epdif.BUSY_POLL_MS
+    epdif.BUSY_POLL_MS = poll_ms
+    transport = epdif.FakeTransport(record_transfers=False, busy_times={epd4in2b.DISPLAY_REFRESH: REFRESH_SECONDS},
+                                    edge_events=edge_events)
+    epdif.set_transport(transport)
+    epd = epd4in2b.EPD()
+
+    try:
+        epd.refresh(wait=False)
+        epd.wait_until_idle()
+        return time.monotonic() - transport.busy_until, transport.busy_wakeups
+    finally:
+        epdif.BUSY_POLL_MS = default_poll_ms
+
+
+# Draws and sends two frames, the second drawn either after the first refresh or while it is going on.
+def two_frames(wait):
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False,
+                                            busy_times={epd4in2b.DISPLAY_REFRESH: REFRESH_SECONDS}))
+    epd = epd4in2b.EPD()
+    plane = bytes(int(epd.width * epd.height / 8))
+
+    start = time.monotonic()
+    for frame in range(2):
+        time.sleep(RENDER_SECONDS)      # drawing the frame
+        epd.display_frame(plane, plane, wait=wait)
+    epd.wait_if_refreshing()
+    return time.monotonic() - start
+
+
+def run():
+    print("{}s refresh".format(REFRESH_SECONDS))
+    print("{:10} {:>12} {:>10}".format("wait", "late by ms", "wakeups"))
+    # 100 ms was the original polling interval.
+    for name, edge_events, poll_ms in (("poll 100ms", False, 100), ("poll 10ms", False, 10), ("edge", True, 10)):
+        late, wakeups = wait_for_refresh(edge_events, poll_ms)
+        print("{:10} {:>12.2f} {:>10}".format(name, late * 1000, wakeups))
+
+    print("two frames, {}s to draw each".format(RENDER_SECONDS))
+    print("draw after refresh  : {:6.2f} s".format(two_frames(True)))
+    print("draw during refresh : {:6.2f} s".format(two_frames(False)))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,44 @@
+# Compares the packed-bytes get_frame_buffer with the original per-pixel loop on a full 400x300 panel image.
+# Run from the top of the repo:  python -m benchmarks.frame_buffer
+import timeit
+
+from PIL import Image
+from PIL import ImageDraw
+from PIL import ImageFont
+
+from display import epd4in2b
+
+
+# Builds an image that looks roughly like a clock frame - some large text plus blocks of smaller text.
+def make_test_image():
+    image = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype('./display/HammersmithOne-Regular.ttf', 30)
+
+    draw.text((10, 10), "12:34", 0, ImageFont.truetype('./display/HammersmithOne-Regular.ttf', 100))
+    for row in range(5):
+        draw.text((10, 140 + row * 30), "BAK OK  JUB MIN.D", 0, font)
+    draw.rectangle((300, 20, 390, 120), fill=0)
+    return image
+
+
+def run(repeat=5):
+    epd = epd4in2b.EPD()
+    image = make_test_image()
+
+    packed = epd.get_frame_buffer(image)
+    reference = epd.get_frame_buffer_reference(image)
+    if bytes(reference) != packed:
+        raise AssertionError("Packed frame buffer does not match the reference bit order")
+
+    reference_time = min(timeit.repeat(lambda: epd.get_frame_buffer_reference(image), number=1, repeat=repeat))
+    packed_time = min(timeit.repeat(lambda: epd.get_frame_buffer(image), number=1, repeat=repeat))
+
+    print("{}x{} frame, {} bytes".format(epd.width, epd.height, len(packed)))
+    print("reference loop : {:8.2f} ms".format(reference_time * 1000))
+    print("packed bytes   : {:8.2f} ms".format(packed_time * 1000))
+    print("speed up       : {:8.1f}x".format(reference_time / packed_time))
+
+
+if __name__ == "__main__":
+    run()
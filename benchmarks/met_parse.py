@@ -0,0 +1,68 @@
+# Parse time and memory of the Met Office daily forecast: the original dictionary-per-day parser against the
+# single pass DayForecast parser, on met_weather_status/weather_data_json_example.json.
+# Decoding the JSON takes most of the time either way, so it is timed on its own: picking the fields out is where
+# the parsers differ, and the total is only a little faster.  What DayForecast mostly saves is memory - the days
+# are held as numbers, not strings - and formatting the text again for every frame.
+# Run from the top of the repo:  python -m benchmarks.met_parse
+import json
+import timeit
+import tracemalloc
+from datetime import date
+
+from met_weather_status import forecast
+
+EXAMPLE_FILE = './met_weather_status/weather_data_json_example.json'
+
+
+# The original parser - a dictionary of strings for each day.
+def parse_to_dicts(result):
+    five_day_forecast = []
+    for day in result["SiteRep"]["DV"]["Location"]["Period"]:
+        forecast_date = date(int(day["value"][:4]), int(day["value"][5:7]), int(day["value"][8:10]))
+        day_forecast = day["Rep"][0]
+        night_forecast = day["Rep"][1]
+        five_day_forecast.append({"date": forecast_date.strftime("%a %d %m %y"),
+                                  "day_weather_type": forecast.weather_types[int(day_forecast["W"])],
+                                  "night_weather_type": forecast.weather_types[int(night_forecast["W"])],
+                                  "high_temp": day_forecast["Dm"],
+                                  "low_temp": night_forecast["Nm"],
+                                  "prob_ppt_day": day_forecast["PPd"],
+                                  "prob_ppt_night": night_forecast["PPn"]})
+    return five_day_forecast
+
+
+# Bytes allocated by building the result (still held afterwards) and the peak while building it.
+def memory_use(parse, text):
+    tracemalloc.start()
+    result = parse(json.loads(text))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def run(number=2000):
+    with open(EXAMPLE_FILE) as example_file:
+        text = example_file.read()
+
+    parsers = (("dicts", parse_to_dicts), ("DayForecast", forecast.parse_daily))
+    result = json.loads(text)
+    decode_time = min(timeit.repeat(lambda: json.loads(text), number=number, repeat=3)) / number
+    print("json decode {:.1f} us".format(decode_time * 1e6))
+
+    print("{:12} {:>12} {:>12} {:>14} {:>12}".format("parser", "fields us", "total us", "retained bytes",
+                                                     "peak bytes"))
+    for name, parse in parsers:
+        fields_time = min(timeit.repeat(lambda: parse(result), number=number, repeat=3)) / number
+        parse_time = min(timeit.repeat(lambda: parse(json.loads(text)), number=number, repeat=3)) / number
+        retained, peak = memory_use(parse, text)
+        print("{:12} {:>12.1f} {:>12.1f} {:>14} {:>12}".format(name, fields_time * 1e6, parse_time * 1e6, retained,
+                                                             peak))
+
+    with open(EXAMPLE_FILE) as example_file:
+        periods = sum(1 for period in forecast.iter_periods(example_file))
+    print("streamed {} periods ({})".format(periods, "ijson" if forecast.ijson is not None else "json fallback"))
+
+
+if __name__ == "__main__":
+    run()
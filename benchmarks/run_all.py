@@ -0,0 +1,270 @@
+# Runs the end to end benchmarks on simulated hardware - render, pack, transfer, fetch and semaphore sequence - and
+# compares the results that don't depend on the machine with their stored baselines in benchmarks/baselines.json:
+# bytes and calls sent to the panel, round trips to pigpio, and speedups over the reference code in the tree.  A
+# result worse than its baseline by more than the metric's threshold (a fraction of the baseline) is a regression,
+# and the exit status is 1.  Timings differ too much from one machine, and one run, to the next to be checked, so
+# they are only shown.
+# Run from the top of the repo:  python -m benchmarks.run_all [--update-baselines]
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import fetch_engine
+from display import epdif
+from display import frame_diff
+from fetch_engine import stub_server
+from semaphore import fake_pigpio
+from semaphore import semaphore
+from semaphore import servo_output
+from simulation import fixture_sources
+from simulation import simulator
+
+BASELINES_FILE = './benchmarks/baselines.json'
+DEFAULT_THRESHOLD = 0.5
+
+# The metrics checked against the baselines, and whether a higher value is better.
+GATED_METRICS = {
+    "transfer_full_bytes": False,
+    "transfer_partial_bytes": False,
+    "transfer_partial_spi_calls": False,
+    "semaphore_round_trips": False,
+    "semaphore_batched_round_trips": False,
+    "pack_speedup": True,
+    "boundary_drawn_ahead_speedup": True,
+}
+
+
+# Median wall time of repeat calls of function, in milliseconds.
+def median_ms(function, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+# A booted simulation with the first screen drawn.
+def warm_simulation():
+    simulation = simulator.Simulation()
+    simulation.step()
+    return simulation
+
+
+def next_minute(simulation):
+    simulation.clock.advance(60)
+    simulation.display.post_time(simulation.clock.localtime())
+    simulation.display.update()
+
+
+# Drawing a new minute - text, packing, diffing and sending - on a screen that is already up.
+def bench_render(repeat=30):
+    simulation = warm_simulation()
+    return {"render_ms": median_ms(lambda: next_minute(simulation), repeat)}
+
+
+# Time from a new minute being posted to its refresh being started, over the in-memory transport - drawn when the
+# minute comes, and drawn ahead of time so that all that is left is sending it.
+def bench_boundary(repeat=30):
+    simulation = warm_simulation()
+    display = simulation.display
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+
+    results = {}
+    for metric, draw_ahead in (("boundary_ms", False), ("boundary_drawn_ahead_ms", True)):
+        samples = []
+        for i in range(repeat):
+            simulation.clock.advance(60)
+            next_time = simulation.clock.localtime()
+            if draw_ahead:
+                display.post_next_time(next_time)
+                display.prepare_ahead()
+
+            start = time.perf_counter()
+            display.post_time(next_time)
+            display.update()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[metric] = statistics.median(samples)
+
+    results["boundary_drawn_ahead_speedup"] = results["boundary_ms"] / results["boundary_drawn_ahead_ms"]
+    return results
+
+
+# Packing both planes, against the original per-pixel packing.
+def bench_pack(repeat=30, reference_repeat=3):
+    display = warm_simulation().display
+    epd = display.epd
+    pack_ms = median_ms(lambda: (epd.get_frame_buffer(display.image_black),
+                                 epd.get_frame_buffer(display.image_red)), repeat)
+    reference_ms = median_ms(lambda: (epd.get_frame_buffer_reference(display.image_black),
+                                      epd.get_frame_buffer_reference(display.image_red)), reference_repeat)
+    return {"pack_ms": pack_ms, "pack_reference_ms": reference_ms, "pack_speedup": reference_ms / pack_ms}
+
+
+# A full frame, and the partial update from one minute to the next, sent over the in-memory transport.
+def bench_transfer(repeat=30):
+    simulation = warm_simulation()
+    display = simulation.display
+    epd = display.epd
+
+    old_frames = (display.last_frame_black, display.last_frame_red)
+    next_minute(simulation)
+    new_frames = (display.last_frame_black, display.last_frame_red)
+    regions = frame_diff.changed_regions(old_frames, new_frames, epd.width, epd.height)
+
+    transport = epdif.FakeTransport(record_transfers=False)
+    epdif.set_transport(transport)
+
+    results = {"transfer_full_ms": median_ms(lambda: epd.display_frame(*new_frames), repeat),
+               "transfer_partial_ms": median_ms(lambda: epd.display_partial_frame(*new_frames, regions), repeat)}
+
+    transport.reset_counters()
+    epd.display_frame(*new_frames)
+    results["transfer_full_bytes"] = transport.spi_bytes
+
+    transport.reset_counters()
+    epd.display_partial_frame(*new_frames, regions)
+    results["transfer_partial_bytes"] = transport.spi_bytes
+    results["transfer_partial_spi_calls"] = transport.spi_calls
+    return results
+
+
+# Both sources fetched by the FetchEngine from a local stub server serving the fixtures.
+def bench_fetch(repeat=5):
+    server = stub_server.StubServer({"/tfl": fixture_sources.TFL_FIXTURES[0], "/met": fixture_sources.MET_FIXTURES[0]})
+    server.start()
+
+    def fetch_both():
+        sources = [fixture_sources.FixtureTflStatus(status_request_url=server.url("/tfl")),
+                   fixture_sources.FixtureMetWeatherStatus(status_request_url=server.url("/met"))]
+        engine = fetch_engine.FetchEngine(sources)
+        engine.daemon = True
+        engine.start()
+        while sources[0].status_dictionary is None or len(sources[1].five_day_forecast) == 0:
+            time.sleep(0.001)
+        engine.stop()
+        engine.join()
+
+    try:
+        return {"fetch_ms": median_ms(fetch_both, repeat)}
+    finally:
+        server.stop()
+
+
+# Signalling a time message with a fake pigpio and no pauses - the cost of working out the moves - with a request
+# per servo, and with both arms set by one script run.  The flagger's own estimate of the message - round trips
+# from where the arms rest, and how far they travel - is shown alongside.
+def bench_semaphore_sequence(repeat=30):
+    results = {}
+    for prefix, output_type in (("semaphore", None), ("semaphore_batched", servo_output.ScriptOutput)):
+        fake_pi = fake_pigpio.FakePi()
+        left_servo = semaphore.Servo(simulator.LEFT_SERVO, fake_pi)
+        right_servo = semaphore.Servo(simulator.RIGHT_SERVO, fake_pi)
+        output = output_type(left_servo, right_servo) if output_type is not None else None
+        flagger = semaphore.SemaphoreFlagger(left_servo, right_servo, 2, left_offset=22, right_offset=22,
+                                             sleep=lambda seconds: None, output=output)
+
+        def signal_time():
+            flagger.cmd_queue.put("12h 34m ", flagger.cmd_queue.TIME)
+            flagger.signal(flagger.cmd_queue.get())
+
+        results[prefix + "_sequence_ms"] = median_ms(signal_time, repeat)
+        writes = fake_pi.round_trips()
+        signal_time()
+        results[prefix + "_round_trips"] = fake_pi.round_trips() - writes
+
+        estimate = flagger.estimate_message("12h 34m ")
+        results[prefix + "_estimated_round_trips"] = estimate["round_trips"]
+        results[prefix + "_travel_degrees"] = estimate["travel_degrees"]
+    return results
+
+
+# An hour of the whole clock in virtual time.
+def bench_simulated_hour():
+    simulation = simulator.Simulation()
+    start = time.perf_counter()
+    simulation.run(1)
+    return {"simulated_hour_s": time.perf_counter() - start}
+
+
+BENCHMARKS = (
+    bench_render,
+    bench_boundary,
+    bench_pack,
+    bench_transfer,
+    bench_fetch,
+    bench_semaphore_sequence,
+    bench_simulated_hour,
+)
+
+
+def run_benchmarks():
+    results = {}
+    for benchmark in BENCHMARKS:
+        results.update(benchmark())
+    return results
+
+
+def load_baselines(baselines_file=BASELINES_FILE):
+    try:
+        with open(baselines_file) as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return {}
+
+
+# Prints each result against its baseline and returns the names of the metrics that have regressed.
+def compare(results, baselines):
+    regressions = []
+    print("{:40} {:>12} {:>12} {:>8}".format("metric", "result", "baseline", "change"))
+    for name, value in results.items():
+        if name not in GATED_METRICS or name not in baselines:
+            print("{:40} {:>12.3f} {:>12} {:>8}".format(name, value, "-", "new" if name in GATED_METRICS else "info"))
+            continue
+
+        baseline = baselines[name]["baseline"]
+        threshold = baselines[name].get("threshold", DEFAULT_THRESHOLD)
+        change = (value - baseline) / baseline if baseline != 0 else 0.0
+        if GATED_METRICS[name]:
+            regressed = value < baseline * (1 - threshold)
+        else:
+            regressed = value > baseline * (1 + threshold)
+        if regressed:
+            regressions.append(name)
+        print("{:40} {:>12.3f} {:>12.3f} {:>+7.0%}{}".format(name, value, baseline, change,
+                                                            "  REGRESSION" if regressed else ""))
+    return regressions
+
+
+# New baselines for the gated metrics from the results, keeping the thresholds already set.
+def update_baselines(results, baselines, baselines_file=BASELINES_FILE):
+    for name in list(baselines):
+        if name not in GATED_METRICS:
+            del baselines[name]
+
+    for name, value in results.items():
+        if name not in GATED_METRICS:
+            continue
+        threshold = baselines.get(name, {}).get("threshold", DEFAULT_THRESHOLD)
+        baselines[name] = {"baseline": round(value, 4), "threshold": threshold}
+
+    with open(baselines_file, 'w') as json_file:
+        json.dump(baselines, json_file, indent=2, sort_keys=True)
+        json_file.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks and check them against the baselines.")
+    parser.add_argument("--update-baselines", action="store_true", help="store these results as the new baselines")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmarks()
+    stored_baselines = load_baselines()
+
+    if arguments.update_baselines:
+        update_baselines(benchmark_results, stored_baselines)
+        print("Baselines written to {}".format(BASELINES_FILE))
+    elif len(compare(benchmark_results, stored_baselines)) > 0:
+        sys.exit(1)
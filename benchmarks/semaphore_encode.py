@@ -0,0 +1,44 @@
+# Compares encoding long messages with the compiled SemaphoreCodes index against the original scan of the code list
+# for every character.
+# Run from the top of the repo:  python -m benchmarks.semaphore_encode
+import timeit
+
+from semaphore.semaphore import SemaphoreCodes
+
+
+# The original lookup - a linear scan of the code list for each character of the message.
+def encode_by_scan(codes, message):
+    sequence = []
+    for char in message.upper():
+        ret_code = None
+        for array_member in codes["semaphore_codes"]:
+            if array_member['code'] == char:
+                ret_code = (array_member["left"], array_member["right"])
+                break
+        sequence.append((char, ret_code))
+    return sequence
+
+
+def run(repeat=5):
+    semaphore_codes = SemaphoreCodes()
+    message = "The quick brown fox jumps over the lazy dog 0123456789 " * 200
+
+    if encode_by_scan(semaphore_codes.codes, message) != semaphore_codes.encode(message):
+        raise AssertionError("Indexed encoding differs from the original scan")
+
+    with_words = "[REST]" + message + "[LETTERS]"
+    encoded = semaphore_codes.encode(with_words)
+    if encoded[0][0] != "[REST]" or encoded[-1][0] != "[LETTERS]":
+        raise AssertionError("Word codes were not matched")
+
+    scan_time = min(timeit.repeat(lambda: encode_by_scan(semaphore_codes.codes, message), number=1, repeat=repeat))
+    index_time = min(timeit.repeat(lambda: semaphore_codes.encode(message), number=1, repeat=repeat))
+
+    print("{} character message".format(len(message)))
+    print("list scan : {:8.2f} ms".format(scan_time * 1000))
+    print("indexed   : {:8.2f} ms".format(index_time * 1000))
+    print("speed up  : {:8.1f}x".format(scan_time / index_time))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,90 @@
+# Servo timing while the screen is drawn: a thread steps every STEP_SECONDS, as the flagger does when it moves the
+# arms, and records how late each step wakes up - with nothing else going on, while the display draws one minute
+# after another in this process, and while it draws them in a render process and only sends them from this one.
+# The render process only helps when it has a core of its own: on a single core machine it competes with the
+# stepping thread just as the display thread does, and the results are no better.  The display drawing without a
+# break is far more than the clock's one frame a minute, so this is the worst case either way.
+# Run from the top of the repo:  python -m benchmarks.servo_jitter
+import os
+import statistics
+import threading
+import time
+
+from display import display
+from display import epdif
+from display import render_process
+
+STEP_SECONDS = 0.02
+RUN_SECONDS = 5
+START_TIME = 1700000000
+
+
+# Steps every STEP_SECONDS for run_seconds.  Returns how late each step woke up, in seconds.
+def step_lateness(run_seconds):
+    lateness = []
+    next_step = time.monotonic()
+    end = next_step + run_seconds
+    while next_step < end:
+        next_step += STEP_SECONDS
+        time.sleep(max(0.0, next_step - time.monotonic()))
+        lateness.append(time.monotonic() - next_step)
+    return lateness
+
+
+# Keeps posting a new minute to the display, so it is drawing the whole time.  Returns the frames sent.
+def steps_while_drawing(clock_display):
+    done = threading.Event()
+
+    def post_minutes():
+        minute = 0
+        while not done.is_set():
+            clock_display.post_time(time.localtime(START_TIME + minute * 60))
+            minute += 1
+            time.sleep(0.01)
+
+    poster = threading.Thread(target=post_minutes, daemon=True)
+    poster.start()
+    lateness = step_lateness(RUN_SECONDS)
+    done.set()
+    poster.join()
+    return lateness
+
+
+def in_process():
+    clock_display = display.ClockDisplay()
+    clock_display.daemon = True
+    clock_display.start()
+    lateness = steps_while_drawing(clock_display)
+    return lateness, clock_display.update_count
+
+
+def out_of_process():
+    clock_display = render_process.RenderProcess()
+    clock_display.daemon = True
+    clock_display.start()
+    try:
+        lateness = steps_while_drawing(clock_display)
+    finally:
+        clock_display.stop()
+    return lateness, clock_display.frames_sent
+
+
+def report(name, lateness, frames):
+    lateness_ms = sorted(late * 1000 for late in lateness)
+    p99 = lateness_ms[int(len(lateness_ms) * 0.99)]
+    print("{:16} {:>8} {:>10.2f} {:>10.2f} {:>10.2f}".format(name, frames, statistics.median(lateness_ms), p99,
+                                                           lateness_ms[-1]))
+
+
+def run():
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+
+    print("{} ms steps for {} s, {} CPUs".format(int(STEP_SECONDS * 1000), RUN_SECONDS, os.cpu_count()))
+    print("{:16} {:>8} {:>10} {:>10} {:>10}".format("drawing", "frames", "median ms", "p99 ms", "max ms"))
+    report("none", step_lateness(RUN_SECONDS), 0)
+    report("in process", *in_process())
+    report("render process", *out_of_process())
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,41 @@
+# Compares per-byte and bulk frame transfers over the in-memory fake transport: SPI calls, DC pin writes and time.
+# Run from the top of the repo:  python -m benchmarks.spi_transfer
+import time
+
+from display import epd4in2b
+from display import epdif
+
+
+# Sends one full frame (both planes) and returns the transport counters and the time it took.
+def send_frame(bulk_transfer, frame_buffer_black, frame_buffer_red):
+    transport = epdif.FakeTransport()
+    epdif.set_transport(transport)
+    epd = epd4in2b.EPD(bulk_transfer=bulk_transfer)
+
+    start = time.perf_counter()
+    epd.display_frame(frame_buffer_black, frame_buffer_red)
+    elapsed = time.perf_counter() - start
+
+    return transport, elapsed
+
+
+def run():
+    plane_size = int(epd4in2b.EPD_WIDTH * epd4in2b.EPD_HEIGHT / 8)
+    frame_buffer_black = bytes(i & 0xFF for i in range(plane_size))
+    frame_buffer_red = bytes(0xFF - (i & 0xFF) for i in range(plane_size))
+
+    per_byte, per_byte_time = send_frame(False, frame_buffer_black, frame_buffer_red)
+    bulk, bulk_time = send_frame(True, frame_buffer_black, frame_buffer_red)
+
+    # Both modes have to put exactly the same bytes on the wire.
+    if per_byte.data_bytes() != bulk.data_bytes():
+        raise AssertionError("Bulk transfer data differs from the per-byte transfer")
+
+    print("{:10} {:>10} {:>12} {:>10} {:>10}".format("mode", "spi calls", "gpio writes", "bytes", "ms"))
+    for name, transport, elapsed in (("per byte", per_byte, per_byte_time), ("bulk", bulk, bulk_time)):
+        print("{:10} {:>10} {:>12} {:>10} {:>10.2f}".format(name, transport.spi_calls, transport.gpio_writes,
+                                                           transport.spi_bytes, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    run()
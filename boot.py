@@ -0,0 +1,78 @@
+import concurrent.futures
+import sys
+import threading
+import time
+
+
+# Runs the start up phases of the clock (daemon checks, panel init, font loading, NTP sync, first fetches...) at
+# the same time, each as soon as the phases it depends on are done, and records when each started and finished.
+# A phase that raises is reported and counts as finished, so one failing piece of hardware doesn't stop the rest.
+class BootOrchestrator:
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.phases = {}
+        self.order = []
+        self.futures = {}
+        self.finished = {}
+        self.timings = {}
+        self.errors = {}
+        self.boot_start = None
+        self.executor = None
+
+    def add_phase(self, name, function, depends_on=()):
+        self.phases[name] = (function, tuple(depends_on))
+        self.finished[name] = threading.Event()
+        self.order.append(name)
+
+    # Starts every phase and returns straight away.
+    def start(self):
+        self.boot_start = self.clock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.phases)),
+                                                              thread_name_prefix="boot")
+        for name in self.order:
+            self.futures[name] = self.executor.submit(self.run_phase, name)
+        self.executor.shutdown(wait=False)
+
+    def run_phase(self, name):
+        function, depends_on = self.phases[name]
+        if len(depends_on) > 0:
+            self.wait(*depends_on)
+
+        start = self.clock()
+        try:
+            return function()
+        except Exception:
+            self.errors[name] = sys.exc_info()[1]
+            print("*** Boot phase {} failed: {}".format(name, self.errors[name]))
+        finally:
+            self.timings[name] = (start - self.boot_start, self.clock() - start)
+            self.finished[name].set()
+
+    # Waits for the named phases, or all of them if none are named.  Returns False if timeout runs out first.
+    def wait(self, *names, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in (names if len(names) > 0 else self.order):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.finished[name].wait(remaining):
+                return False
+        return True
+
+    def result(self, name):
+        return self.futures[name].result()
+
+    # Per phase start offset and duration from the start of boot, in seconds.
+    def report(self):
+        lines = ["{:12} {:>9} {:>9}".format("phase", "start s", "took s")]
+        for name in self.order:
+            if name in self.timings:
+                start, duration = self.timings[name]
+                status = " FAILED" if name in self.errors else ""
+                lines.append("{:12} {:>9.2f} {:>9.2f}{}".format(name, start, duration, status))
+            else:
+                lines.append("{:12} {:>9} {:>9}".format(name, "-", "running"))
+        if len(self.timings) == len(self.order):
+            lines.append("{:12} {:>9} {:>9.2f}".format("total", "", max(start + duration for start, duration
+                                                                             in self.timings.values())))
+        return "\n".join(lines)
+
@@ -0,0 +1,3 @@
+from .mailbox import Mailbox
+from .mailbox import Letter
+from .mailbox import freeze
@@ -0,0 +1,54 @@
+import itertools
+import types
+from typing import NamedTuple
+
+
+# What is in a mailbox: the value and the number of the put that left it there (0 before anything has been put).
+class Letter(NamedTuple):
+    version: int
+    value: object
+
+
+# Makes a value safe to hand to another thread without copying it: dicts become read-only views of themselves and
+# lists become tuples.  Whoever freezes a dict hands it over, and mustn't change it afterwards.
+def freeze(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType(value)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+# A single slot for passing the latest value from one thread to another, versioned by the Letter it is kept in.
+# A put replaces whatever is there, so a consumer that falls behind - the display during a 15 s refresh, say - only
+# ever finds the newest value, and nothing builds up.  Values are frozen as they are put; the slot is a single
+# Letter that is replaced whole, so neither side takes a lock.
+# take() is for the one consumer, and returns each value once - None means there is nothing new, so None can't be
+# put.  wakeup, if given, is an Event set on every put - one Event can be shared by all the mailboxes a thread
+# waits on.
+class Mailbox:
+
+    def __init__(self, wakeup=None):
+        self.wakeup = wakeup
+        self.versions = itertools.count(1)
+        self.letter = Letter(0, None)
+        self.taken = 0
+
+    def put(self, value):
+        if value is None:
+            raise ValueError("None can't be put in a Mailbox - take() returns None when there is nothing new")
+        self.letter = Letter(next(self.versions), freeze(value))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    # The newest value if it hasn't been taken yet, otherwise None.
+    def take(self):
+        letter = self.letter
+        if letter.version == self.taken:
+            return None
+        self.taken = letter.version
+        return letter.value
+
+    # The newest value, taken or not.
+    def peek(self):
+        return self.letter.value
@@ -0,0 +1 @@
+# Lets the tests import the clock's packages when pytest is run from the top of the repo.
@@ -1 +1,2 @@
-from display.display import ClockDisplay
\ No newline at end of file
+from display.display import ClockDisplay
+from display.render_process import RenderProcess
\ No newline at end of file
@@ -25,12 +25,55 @@
  ##
 
 from . import epd4in2b
+from . import frame_diff
+from . import layout
+from . import text_cache
+import channels
 from PIL import Image
 from PIL import ImageFont
 from PIL import ImageDraw
 import time
 import threading
-import queue
+import hashlib
+from typing import NamedTuple
+
+import instrumentation
+
+
+# Rough time a full 3-colour refresh keeps the panel busy, used until a refresh has actually been timed.
+REFRESH_SECONDS_ESTIMATE = 15
+
+
+# A frame drawn ahead of time for the next minute: the layout and images it was drawn on, the weather state that
+# goes with it and the packed frame ready to send.  It can only be used if nothing has been drawn since (version).
+class PreparedFrame(NamedTuple):
+    time_to_display: tuple
+    version: int
+    layout: object
+    image_black: object
+    image_red: object
+    forecast_day: int
+    weather_text: tuple
+    packed: object
+
+
+# The packed black and red frames for the images, with their hash and the regions to send - regions is None for a
+# full refresh, and the frames are None if the images are already on the panel.
+class PackedFrame(NamedTuple):
+    frame_hash: bytes
+    frame_black: bytes
+    frame_red: bytes
+    regions: list
+
+
+# The year, month, day, hour and minute of a time - what the screen shows of it.
+def minute_key(time_to_display):
+    return tuple(time_to_display[:5])
+
+
+# Seconds since the epoch at the start of the minute of a local time.
+def minute_start(time_to_display):
+    return time.mktime(time_to_display) - time_to_display.tm_sec
 
 
 class LineStatus:
@@ -49,188 +92,426 @@ class LineStatus:
                            ["Victoria", "VIC", "None"]
                            ]
 
+        # Where each line is in line_list, by line name, so a status goes straight to its line.
+        self.line_index = {line[0]: i for i, line in enumerate(self.line_list)}
+
         self.abbrev_status = {"Good Service": "OK", "Part Closure": "P.CLS", "Special Service": "SPEC",
                               "Severe Delays": "SEV.D", "Minor Delays": "MIN.D", "Planned Closure": "CLS",
                               "Service Closed": "CLS", "Part Suspended": "P.SUS", "Suspended": "SUS"}
 
-    # Fill out the line status, using abbreviations as possible.
+    # Fill out the line status, using abbreviations as possible.  Returns the positions in line_list of the lines
+    # whose status has changed, in display order - lines TfL doesn't report keep their last status.
     def fill_line_status(self, tfl_status_dict):
+        changed = []
 
         # Go through all the status in the tfl status dictionary, replace lines and status with abbrev
-        for line in tfl_status_dict:
+        for line, status in tfl_status_dict.items():
+            i = self.line_index.get(line)
+            if i is None:
+                continue
 
-            for i in range(len(self.line_list)):
-                if line == self.line_list[i][0]:
-                    # Check for Abbrev - use if available, otherwise don't change it.
-                    if tfl_status_dict[line] in self.abbrev_status:
-                        self.line_list[i][2] = self.abbrev_status[tfl_status_dict[line]]
-                    else:
-                        self.line_list[i][2] = tfl_status_dict[line]
-                    break
+            # Check for Abbrev - use if available, otherwise don't change it.
+            status = self.abbrev_status.get(status, status)
+            if self.line_list[i][2] != status:
+                self.line_list[i][2] = status
+                changed.append(i)
+
+        return sorted(changed)
 
 
 # Clock Display Class - takes care of the display.
 class ClockDisplay(threading.Thread):
 
     # Initialising - set up the display, fonts, etc.
-    def __init__(self):
+    # Only the changed parts of the screen are normally sent to the panel.  Every full_refresh_every updates the
+    # whole screen is refreshed instead, to clear the ghosting that builds up with partial refreshes.
+    # With defer_init the panel isn't initialised and the fonts aren't loaded - call init_panel() and load_fonts()
+    # (they can run at the same time) before anything is posted to the display.
+    # clock (the time module by default) is used to put up a frame drawn ahead when its minute starts, and to
+    # measure how late after the start of the minute the refresh started.
+    def __init__(self, full_refresh_every=10, defer_init=False, clock=time):
         threading.Thread.__init__(self)
+        self.clock = clock
 
         self.epd = epd4in2b.EPD()
-        self.epd.init()
         self.image_red = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT), 255)    # 255: clear the frame
         self.draw_red = ImageDraw.Draw(self.image_red)
         self.image_black = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT), 255)    # 255: clear the frame
         self.draw_black = ImageDraw.Draw(self.image_black)
 
-        main_font = './display/HammersmithOne-Regular.ttf'
+        self.date_font = None
+        self.time_font = None
+        self.status_font = None
 
-        self.date_font = ImageFont.truetype(main_font, 35)
-        self.time_font = ImageFont.truetype(main_font, 100)
-        self.status_font = ImageFont.truetype(main_font, 30)
+        # Rendered text and text sizes are cached, and the time is put together from prebuilt digit glyphs.
+        # The images above are kept from frame to frame - the layout only redraws the parts whose text has changed.
+        self.text_cache = text_cache.TextMaskCache()
+        self.text_metrics = layout.TextMetrics()
+        self.time_atlas = None
+        self.layout = None
 
-        self.time_queue = queue.Queue()
+        # Producers put updates in the mailboxes below through the post_ methods, which wakes the display thread.
+        # Each mailbox only holds the latest update, so nothing piles up while the panel is refreshing.
+        self.wakeup = threading.Event()
+        self.time_mailbox = channels.Mailbox(self.wakeup)
+        self.time_to_display = None
 
         self.tfl_status_dict = None
         self.line_status = LineStatus()
-        self.tfl_status_queue = queue.Queue()
+        self.tfl_status_mailbox = channels.Mailbox(self.wakeup)
         self.tfl_status_str = None
 
-        # Queue and Variable for Met Office 5 day forecast
+        # Mailbox and Variable for Met Office 5 day forecast
         self.weather_text = ""
-        self.met_forecast_queue = queue.Queue()
+        self.met_forecast_mailbox = channels.Mailbox(self.wakeup)
         self.five_day_forecast = None
+        self.forecast_day = 0
+
+        # Frames last sent to the panel, used to work out what has changed.
+        self.last_frame_black = None
+        self.last_frame_red = None
+        self.full_refresh_every = full_refresh_every
+        self.update_count = 0
+
+        # Hash of the images on the panel - identical frames are not sent again.
+        self.panel_hash = None
+        self.skipped_refreshes = 0
+        self.panel_time_saved = 0.0
+        self.refresh_seconds = None
+
+        # The next minute's frame is drawn and packed ahead of time once the time it will show is known.
+        # version goes up every time something is drawn, which makes a frame drawn ahead before then out of date.
+        self.next_time_mailbox = channels.Mailbox()
+        self.prepared = None
+        self.version = 0
+        self.frames_drawn_ahead = 0
+
+        # Seconds from the start of the last minute shown to the start of its refresh.  lag_hook, if set, is called
+        # with the lag and whether the frame was drawn ahead each time a new minute goes up.
+        self.last_minute_lag = None
+        self.lag_hook = None
+
+        if not defer_init:
+            self.init_panel()
+            self.load_fonts()
+
+    def init_panel(self):
+        self.epd.init()
 
-    def handle_met_status(self):
-        if not self.met_forecast_queue.empty():
-            while not self.met_forecast_queue.empty():
-                self.five_day_forecast = self.met_forecast_queue.get_nowait()
+    def load_fonts(self):
+        main_font = './display/HammersmithOne-Regular.ttf'
 
-        if self.five_day_forecast is not None and len(self.five_day_forecast) == 5:
-            degree_sign = u"\N{DEGREE SIGN}"
+        self.date_font = ImageFont.truetype(main_font, 35)
+        self.time_font = ImageFont.truetype(main_font, 100)
+        self.status_font = ImageFont.truetype(main_font, 30)
 
-            self.weather_text = [self.five_day_forecast[0]['date'][:3],"{} {}{}C {}%".format(
-                                self.five_day_forecast[0]['day_weather_type'],
-                                self.five_day_forecast[0]['high_temp'], degree_sign,
-                                self.five_day_forecast[0]['prob_ppt_day']),
+        self.time_atlas = text_cache.GlyphAtlas(self.time_font, "0123456789:", rotation=270)
+        self.build_layout()
 
-                            "{} {}{}C {}%".format(
-                                self.five_day_forecast[0]['night_weather_type'],
-                                self.five_day_forecast[0]['low_temp'], degree_sign,
-                                self.five_day_forecast[0]['prob_ppt_night'])]
+    # Where everything goes on the screen, drawn rotated so the screen reads in portrait:
+    # the date and the time along the top, the weather below them and the tube status in two columns underneath.
+    def build_layout(self):
+        self.layout = layout.Layout(self.text_cache, self.text_metrics)
+        self.layout.add_slot("date", layout.centred(self.date_font, 370, layout.BLACK, epd4in2b.EPD_HEIGHT))
+        self.layout.add_slot("time", layout.centred(self.time_font, 295, layout.RED, epd4in2b.EPD_HEIGHT,
+                                                    atlas=self.time_atlas))
+        self.layout.add_slot("weather", self.place_weather)
 
-        # Weather Text drawn here.
-        if len(self.weather_text) > 0:
+        # Six lines a column, 35 pixels apart.
+        for line_number in range(len(self.line_status.line_list)):
+            column, row = divmod(line_number, 6)
+            self.layout.add_slot("tfl_{}".format(line_number),
+                                 layout.fixed(self.status_font, (190 - row * 35, column * 150)))
+
+    # The day name, with the day's forecast after it and the night's below that.
+    def place_weather(self, metrics, weather_text):
+        fc_size = [metrics.size(self.status_font, text) for text in weather_text]   # width, height size
+
+        day_hor = 0
+        day_vert = 265  # vertical location of day string - adjust forecast by their height
 
-            fc_size = []
+        vert_loc = [day_vert, day_vert - (fc_size[1][1] - fc_size[0][1]),
+                    day_vert - (fc_size[2][1] - fc_size[0][1]) - 35]
 
-            for i in range(3):
-                fc_size.append(self.status_font.getsize(self.weather_text[i]))  # width, height size
+        fore_hor = day_hor + fc_size[0][0] + 5
 
-            day_hor = 0
-            day_vert = 265  # vertical location of day string - adjust forecast by their height
+        return (layout.TextItem((vert_loc[0], day_hor), self.status_font, weather_text[0], layout.BLACK),
+                layout.TextItem((vert_loc[1], fore_hor), self.status_font, weather_text[1], layout.BLACK),
+                layout.TextItem((vert_loc[2], fore_hor), self.status_font, weather_text[2], layout.BLACK))
 
-            vert_loc = [day_vert, day_vert - (fc_size[1][1] - fc_size[0][1]),
-                        day_vert - (fc_size[2][1] - fc_size[0][1]) - 35]
+    # Hands a new time to display to the display thread.
+    def post_time(self, time_to_display):
+        self.time_mailbox.put(time_to_display)
 
-            fore_hor = day_hor + fc_size[0][0] + 5
+    # Tells the display thread which time it will be given next, so it can draw that frame ahead of time.
+    def post_next_time(self, next_time_to_display):
+        self.next_time_mailbox.put(next_time_to_display)
 
-            self.draw_text((vert_loc[0], day_hor), self.status_font, self.weather_text[0],
-                           self.image_black, rotation=270)
-            self.draw_text((vert_loc[1], fore_hor),
-                           self.status_font, self.weather_text[1], self.image_black, rotation=270)
-            self.draw_text((vert_loc[2], fore_hor),
-                           self.status_font, self.weather_text[2], self.image_black, rotation=270)
+    # Hands a new TfL status dictionary to the display thread.  It is frozen, and mustn't be changed afterwards.
+    def post_tfl_status(self, tfl_status_dict):
+        self.tfl_status_mailbox.put(tfl_status_dict)
 
-            # print(weather_text[0],  )
-            # pop the first forecast and put it on the end to rotate through a new day each display.
-            self.five_day_forecast.append(self.five_day_forecast.pop(0))
+    # Hands a new Met Office forecast to the display thread.
+    def post_met_forecast(self, five_day_forecast):
+        self.met_forecast_mailbox.put(five_day_forecast)
 
-    # Deals with the TfL Status, including getting the data and preparing the text.
-    def handle_tfl_status(self):
-        while not self.tfl_status_queue.empty():
-            self.tfl_status_dict = self.tfl_status_queue.get_nowait()
+    # Draws the weather.  The forecast moves on to the next day only when next_day is set (i.e. on a new time)
+    # or a new forecast arrives, so redraws for other reasons keep the same day on screen.
+    # The forecast is a tuple of met_weather_status.DayForecast - it isn't changed here, the day shown is tracked
+    # with forecast_day instead.  new_forecast is None if there isn't a different one.
+    def handle_met_status(self, new_forecast, next_day=True):
+        if new_forecast is not None:
+            self.five_day_forecast = new_forecast
+            self.forecast_day = 0
 
-        shift = 0  # used to move the text along as move on to next status.
+        if (next_day or new_forecast is not None) and self.five_day_forecast is not None \
+                and len(self.five_day_forecast) == 5:
 
-        if self.tfl_status_dict is not None:
-            self.line_status.fill_line_status(self.tfl_status_dict)
+            self.weather_text = self.five_day_forecast[self.forecast_day].display_text()
 
-            x_align = 0
-            status_num = 0
+            # move on to the next forecast to rotate through a new day each display.
+            self.forecast_day = (self.forecast_day + 1) % len(self.five_day_forecast)
 
-            for item in self.line_status.line_list:
-                status_str = '{} {}'.format(item[1], item[2])
+        # Weather Text goes in its slot of the layout.
+        if len(self.weather_text) > 0:
+            self.layout.set("weather", tuple(self.weather_text))
+
+    # Deals with the TfL Status, including getting the data and preparing the text.  Only the lines whose status
+    # has changed are put in the layout again, so only their part of the screen is redrawn.
+    def handle_tfl_status(self, new_tfl_status):
+        if new_tfl_status is None:
+            return
+
+        self.tfl_status_dict = new_tfl_status
+        changed = self.line_status.fill_line_status(self.tfl_status_dict)
 
-                # If a line is OK, then display in black, otherwise red.
-                if item[2] == "OK":
-                    image = self.image_black
-                else:
-                    image = self.image_red
+        for line_number in changed:
+            item = self.line_status.line_list[line_number]
+            status_str = '{} {}'.format(item[1], item[2])
 
-                # This draws ths status in the right colour.
-                self.draw_text((190 - shift, x_align), self.status_font, status_str, image, rotation=270)
-                shift += 35  # Spacing text
-                status_num += 1
+            # If a line is OK, then display in black, otherwise red.
+            colour = layout.BLACK if item[2] == "OK" else layout.RED
+            self.layout.set("tfl_{}".format(line_number), (status_str, colour))
 
-                # Perform a wrap after 6 lines.
-                if status_num == 6:
-                    x_align = 150
-                    shift = 0
+        if len(changed) > 0:
+            instrumentation.count("display_tfl_line_changes_total", len(changed))
 
     # Displays dte and time on the screen
     def display_time(self, time_to_display):
-        date_str = time.strftime("%a %d %m %Y", time_to_display)
-        w, h = self.date_font.getsize(date_str)
-        # print("date size", w, h)
-        date_offset = int((epd4in2b.EPD_HEIGHT - w)/2)  # Calculate offset to center text.
-        self.draw_text((370, date_offset), self.date_font, date_str, self.image_black, rotation=270)
-
-        time_str = time.strftime("%H:%M", time_to_display)
-        w, h = self.time_font.getsize(time_str)
-        # print("time size", w, h)
-        time_offset = int((epd4in2b.EPD_HEIGHT - w)/2)  # Calculate offset to center text
-        self.draw_text((295, time_offset), self.time_font, time_str, self.image_red, rotation=270)
+        self.layout.set("date", time.strftime("%a %d %m %Y", time_to_display))
+        self.layout.set("time", time.strftime("%H:%M", time_to_display))
 
     # Writes the display frames to the display.
     def write_display(self):
-        # display the frames
-        self.epd.display_frame(self.epd.get_frame_buffer(self.image_black), self.epd.get_frame_buffer(self.image_red))
-
-    # Rotates the text - allows to write text portrait or whatever.
-    def draw_text(self, position, font, text, image_red_or_black, rotation=0):
-        w, h = font.getsize(text)
-        mask = Image.new('1', (w, h), color=1)
-        draw = ImageDraw.Draw(mask)
-        draw.text((0, 0), text, 0, font)
-        mask = mask.rotate(rotation, expand=True)
-        image_red_or_black.paste(mask, position)
-
-    # Main process of the thread.  Waits for the criteria to be reached for the displaying on the screen.
+        self.push_frame(self.pack_frame())
+
+    # Packs the images and works out what to send.  Only the regions that differ from the last frames sent are
+    # pushed, unless a full refresh is due or so much has changed that the whole frame is cheaper.
+    def pack_frame(self):
+        frame_hash = self.frame_hash()
+        if frame_hash == self.panel_hash:
+            # Already on the panel - skip the packing, the transfer and the refresh.
+            return PackedFrame(frame_hash, None, None, None)
+
+        frame_black = self.epd.get_frame_buffer(self.image_black)
+        frame_red = self.epd.get_frame_buffer(self.image_red)
+
+        full_refresh = self.last_frame_black is None or self.update_count % self.full_refresh_every == 0
+
+        if not full_refresh:
+            regions = frame_diff.changed_regions((self.last_frame_black, self.last_frame_red),
+                                                 (frame_black, frame_red), self.epd.width, self.epd.height)
+            if frame_diff.region_area(regions) <= self.epd.width * self.epd.height / 2:
+                return PackedFrame(frame_hash, frame_black, frame_red, regions)
+
+        return PackedFrame(frame_hash, frame_black, frame_red, None)
+
+    # Sends a packed frame to the panel.
+    def push_frame(self, packed):
+        if packed.frame_black is None:
+            self.skipped_refreshes += 1
+            instrumentation.count("display_skipped_refreshes_total")
+            saved = self.refresh_seconds if self.refresh_seconds is not None else REFRESH_SECONDS_ESTIMATE
+            self.panel_time_saved += saved
+            instrumentation.count("display_panel_time_saved_seconds_total", saved)
+            return
+
+        if packed.regions is not None and len(packed.regions) == 0:
+            self.panel_hash = packed.frame_hash
+            return   # Nothing has changed on screen.
+
+        self.send_to_panel(packed)
+
+        self.panel_hash = packed.frame_hash
+        self.last_frame_black = packed.frame_black
+        self.last_frame_red = packed.frame_red
+        self.update_count += 1
+
+    # The transfer and the refresh.  The panel refreshes in the background - the next frame is drawn while it does,
+    # and only waits for the refresh to finish when it is sent.
+    def send_to_panel(self, packed):
+        if packed.regions is None:
+            self.epd.display_frame(packed.frame_black, packed.frame_red, wait=False)
+            instrumentation.count("display_full_refreshes_total")
+        else:
+            self.epd.display_partial_frame(packed.frame_black, packed.frame_red, packed.regions, wait=False)
+            instrumentation.count("display_partial_refreshes_total")
+        if self.epd.last_refresh_seconds is not None:
+            self.record_refresh_time(self.epd.last_refresh_seconds)
+
+    # Hash of the content of both images.
+    def frame_hash(self):
+        frame_hash = hashlib.blake2b(digest_size=16)
+        frame_hash.update(self.image_black.tobytes())
+        frame_hash.update(self.image_red.tobytes())
+        return frame_hash.digest()
+
+    # Keeps a running average of how long a refresh takes, for working out the panel time saved by skipping one.
+    def record_refresh_time(self, seconds):
+        if self.refresh_seconds is None:
+            self.refresh_seconds = seconds
+        else:
+            self.refresh_seconds = 0.8 * self.refresh_seconds + 0.2 * seconds
+
+    # Hit and miss counts for the text cache and the time glyphs.
+    def text_cache_stats(self):
+        stats = self.text_cache.stats()
+        stats["atlas_hits"] = self.time_atlas.hits
+        stats["atlas_misses"] = self.time_atlas.misses
+        stats["metrics_hits"] = self.text_metrics.hits
+        stats["metrics_misses"] = self.text_metrics.misses
+        return stats
+
+    # Publishes the hit and miss counts as gauges - display_text_cache_hits and so on.
+    def export_text_cache_stats(self):
+        for name, value in self.text_cache_stats().items():
+            instrumentation.set_gauge("display_text_cache_{}".format(name), value)
+
+    # Draws the screen once with everything that has been posted since the last time.  Nothing is drawn until there
+    # is a time to display.  Returns whether the screen was drawn.
+    def update(self):
+        new_time = self.time_mailbox.take()
+        if new_time is None and self.time_to_display is None:
+            return False
+
+        # A minute that is already up was drawn ahead and put up when it started.
+        if new_time is not None and self.time_to_display is not None \
+                and minute_key(new_time) == minute_key(self.time_to_display):
+            new_time = None
+
+        new_forecast = self.met_forecast_mailbox.take()
+        if new_forecast == self.five_day_forecast:
+            new_forecast = None
+
+        new_tfl_status = self.tfl_status_mailbox.take()
+        if new_tfl_status == self.tfl_status_dict:
+            new_tfl_status = None
+
+        # If the new minute has been drawn ahead and nothing else has changed, it only has to be sent.
+        if new_time is not None and new_forecast is None and new_tfl_status is None \
+                and self.push_prepared(new_time):
+            return True
+
+        if new_time is not None:
+            self.time_to_display = new_time
+
+        # Display time and date
+        self.display_time(self.time_to_display)
+
+        # Handle the Met Office Status - ie. the weather forecast
+        self.handle_met_status(new_forecast, next_day=new_time is not None)
+
+        # Deal with the TfL status, including preparing the text.
+        self.handle_tfl_status(new_tfl_status)
+
+        if not self.layout.dirty() and self.panel_hash is not None:
+            return False    # Nothing on the screen has changed.
+
+        with instrumentation.timer("display_layout_render_seconds"):
+            self.layout.render(self.image_black, self.image_red)
+
+        self.write_display()
+        self.export_text_cache_stats()
+        self.version += 1
+        self.prepared = None    # Drawn before this frame, so out of date.
+        if new_time is not None:
+            self.record_minute_lag(new_time, drawn_ahead=False)
+        return True
+
+    # Draws and packs the next minute's frame while the current one is on the panel, so that when the minute comes
+    # only the transfer and the refresh are left.  It is drawn on copies of the layout and images - nothing on the
+    # panel, or behind it, changes until the frame is used.  Returns whether a frame was drawn.
+    def prepare_ahead(self):
+        next_time = self.next_time_mailbox.peek()
+        if next_time is None or self.time_to_display is None or self.layout is None \
+                or minute_key(next_time) <= minute_key(self.time_to_display):
+            return False
+
+        prepared = self.prepared
+        if prepared is not None and prepared.version == self.version \
+                and minute_key(prepared.time_to_display) == minute_key(next_time):
+            return False    # Already drawn.
+
+        live = (self.layout, self.image_black, self.image_red, self.forecast_day, self.weather_text)
+        with instrumentation.timer("display_prepare_ahead_seconds"):
+            try:
+                self.layout = self.layout.copy()
+                self.image_black = self.image_black.copy()
+                self.image_red = self.image_red.copy()
+
+                self.display_time(next_time)
+                self.handle_met_status(None, next_day=True)
+                self.layout.render(self.image_black, self.image_red)
+
+                self.prepared = PreparedFrame(next_time, self.version, self.layout, self.image_black, self.image_red,
+                                              self.forecast_day, self.weather_text, self.pack_frame())
+            finally:
+                self.layout, self.image_black, self.image_red, self.forecast_day, self.weather_text = live
+        return True
+
+    # Puts up the frame drawn ahead for new_time, if there is one and it is still up to date.  Returns whether it did.
+    def push_prepared(self, new_time):
+        prepared = self.prepared
+        self.prepared = None
+        if prepared is None or prepared.version != self.version \
+                or minute_key(prepared.time_to_display) != minute_key(new_time):
+            return False
+
+        self.time_to_display = new_time
+        self.layout, self.image_black, self.image_red = prepared.layout, prepared.image_black, prepared.image_red
+        self.forecast_day, self.weather_text = prepared.forecast_day, prepared.weather_text
+
+        self.push_frame(prepared.packed)
+        self.version += 1
+        self.frames_drawn_ahead += 1
+        self.record_minute_lag(new_time, drawn_ahead=True)
+        return True
+
+    # Seconds until the minute of the frame drawn ahead starts, or None if there isn't one.
+    def seconds_to_prepared(self):
+        if self.prepared is None:
+            return None
+        return max(0.0, minute_start(self.prepared.time_to_display) - self.clock.time())
+
+    # The refresh has just been started (frames are sent without waiting for the refresh to finish).
+    def record_minute_lag(self, time_to_display, drawn_ahead):
+        self.last_minute_lag = self.clock.time() - minute_start(time_to_display)
+        instrumentation.observe("display_minute_lag_seconds", self.last_minute_lag)
+        if self.lag_hook is not None:
+            self.lag_hook(self.last_minute_lag, drawn_ahead)
+
+    # Main process of the thread.  Sleeps until a producer posts something, then draws the screen once with
+    # everything that has arrived - updates that turn up while the panel is refreshing are merged into the next one.
+    # In between, the next minute is drawn ahead, and put up by the thread itself as soon as its minute starts.
     def run(self):
 
         while True:
-            if not self.time_queue.empty():
-                time_to_display = self.time_queue.get_nowait()
-
-                self.image_red = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT), 255)  # 255: clear the frame
-                self.draw_red = ImageDraw.Draw(self.image_red)
-                self.image_black = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT),
-                                             255)  # 255: clear the frame
-                self.draw_black = ImageDraw.Draw(self.image_black)
-
-                # Display time and date
-                self.display_time(time_to_display)
-
-                # Handle the Met Office Status - ie. the weather forecast
-                self.handle_met_status()
-
-                # Deal with the TfL status, including preparing the text.
-                self.handle_tfl_status()
-
-                self.write_display()
-
-            time.sleep(1)
+            if not self.wakeup.wait(self.seconds_to_prepared()):
+                self.time_mailbox.put(self.prepared.time_to_display)
+            self.wakeup.clear()
+            with instrumentation.timer("display_update_seconds"):
+                self.update()
+            self.prepare_ahead()
 
 
 if __name__ == '__main__':
@@ -24,14 +24,20 @@
  # THE SOFTWARE.
  #
 
+import time
+
+import instrumentation
+
 from . import epdif
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 400
 EPD_HEIGHT      = 300
 
+# Longest wait for the panel to go idle - a full 3-colour refresh takes about 15 s.
+BUSY_TIMEOUT_MS = 30000
+
 # EPD4IN2B commands
 PANEL_SETTING                               = 0x00
 POWER_SETTING                               = 0x01
@@ -73,12 +79,20 @@ READ_OTP_DATA                               = 0xA2
 POWER_SAVING                                = 0xE3
 
 class EPD:
-    def __init__(self):
+    # bulk_transfer streams each frame plane in large SPI writes, set it to False to send one byte per write.
+    def __init__(self, bulk_transfer=True):
         self.reset_pin = epdif.RST_PIN
         self.dc_pin = epdif.DC_PIN
         self.busy_pin = epdif.BUSY_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.bulk_transfer = bulk_transfer
+
+        # Set while a refresh started without waiting may still be going on.
+        self.refreshing = False
+        self.refresh_started = None
+        self.last_refresh_seconds = None
+        self.polled_idle_at = None
 
     def digital_write(self, pin, value):
         epdif.epd_digital_write(pin, value)
@@ -90,17 +104,33 @@ class EPD:
         epdif.epd_delay_ms(delaytime)
 
     def send_command(self, command):
-        self.digital_write(self.dc_pin, GPIO.LOW)
+        self.digital_write(self.dc_pin, epdif.LOW)
         # the parameter type is list but not int
         # so use [command] instead of command
         epdif.spi_transfer([command])
 
     def send_data(self, data):
-        self.digital_write(self.dc_pin, GPIO.HIGH)
+        self.digital_write(self.dc_pin, epdif.HIGH)
         # the parameter type is list but not int
         # so use [data] instead of data
         epdif.spi_transfer([data])
 
+    # Sends a block of data: DC is set once, then the bytes are streamed in chunks the SPI driver takes in one go.
+    def send_data_bulk(self, data):
+        self.digital_write(self.dc_pin, epdif.HIGH)
+        for start in range(0, len(data), epdif.SPI_CHUNK_SIZE):
+            epdif.spi_transfer(data[start:start + epdif.SPI_CHUNK_SIZE])
+
+    # Sends one frame plane, either in bulk or a byte at a time.
+    def send_frame_plane(self, frame_buffer):
+        plane_size = int(self.width * self.height / 8)
+        with instrumentation.timer("epd_spi_seconds"):
+            if self.bulk_transfer:
+                self.send_data_bulk(frame_buffer[:plane_size])
+            else:
+                for i in range(0, plane_size):
+                    self.send_data(frame_buffer[i])
+
     def init(self):
         if (epdif.epd_init() != 0):
             return -1
@@ -114,17 +144,79 @@ class EPD:
         self.send_command(PANEL_SETTING)
         self.send_data(0x0F)        # LUT from OTP
 
-    def wait_until_idle(self):
+    # Waits for BUSY to go high, on the transport's edge event if it has one, otherwise by polling.
+    # Returns False if the panel is still busy after timeout_ms.
+    # At the end of a refresh, last_refresh_seconds is set to how long the panel was busy - from the time of the
+    # edge, or from the poll that saw it go idle.  If neither says when the refresh finished (polling found the panel
+    # idle already) it is None.
+    def wait_until_idle(self, timeout_ms=BUSY_TIMEOUT_MS):
+        self.polled_idle_at = None
+        with instrumentation.timer("epd_busy_wait_seconds"):
+            idle = epdif.epd_wait_for_idle(timeout_ms)
+            if idle is None:
+                idle = self.poll_until_idle(timeout_ms)
+
+        if self.refreshing and idle:
+            self.refreshing = False
+            self.last_refresh_seconds = None
+            idle_at = epdif.epd_idle_since()
+            if idle_at is None:
+                idle_at = self.polled_idle_at
+            if idle_at is not None and idle_at >= self.refresh_started:
+                self.last_refresh_seconds = idle_at - self.refresh_started
+
+        if not idle:
+            print("*** Panel still busy after {} ms".format(timeout_ms))
+        return idle
+
+    def poll_until_idle(self, timeout_ms):
+        waited_ms = 0
         while(self.digital_read(self.busy_pin) == 0):      # 0: busy, 1: idle
-            self.delay_ms(100)
+            if waited_ms >= timeout_ms:
+                return False
+            self.delay_ms(epdif.BUSY_POLL_MS)
+            waited_ms += epdif.BUSY_POLL_MS
+
+        # Seen busy and then idle, so it went idle within the last poll.
+        if waited_ms > 0:
+            self.polled_idle_at = time.monotonic()
+        return True
+
+    # Starts the refresh of the panel from its memory.  Without wait it returns straight away, and the next
+    # frame waits for the refresh to finish before it is sent - the frame can be drawn in the meantime.
+    def refresh(self, wait=True):
+        self.send_command(DISPLAY_REFRESH)
+        self.refreshing = True
+        self.refresh_started = time.monotonic()
+        if wait:
+            self.wait_until_idle()
+
+    # Waits for a refresh that was started without waiting, if there is one.
+    def wait_if_refreshing(self):
+        if self.refreshing:
+            self.wait_until_idle()
 
     def reset(self):
-        self.digital_write(self.reset_pin, GPIO.LOW)         # module reset
+        self.digital_write(self.reset_pin, epdif.LOW)         # module reset
         self.delay_ms(200)
-        self.digital_write(self.reset_pin, GPIO.HIGH)
+        self.digital_write(self.reset_pin, epdif.HIGH)
         self.delay_ms(200)
 
+    # Packs a PIL image into the panel's frame buffer format: one bit per pixel, MSB first, 1 = white.
+    # Pillow's native 1-bit packing already uses this layout, so the raw bytes can be sent as they are.
     def get_frame_buffer(self, image):
+        with instrumentation.timer("display_pack_seconds"):
+            # Image must be in mode 1.
+            image_monocolor = image.convert('1')
+            imwidth, imheight = image_monocolor.size
+            if imwidth != self.width or imheight != self.height:
+                raise ValueError('Image must be same dimensions as display \
+                    ({0}x{1}).' .format(self.width, self.height))
+
+            return image_monocolor.tobytes()
+
+    # Original per-pixel implementation.  Kept as the reference for the bit order and for benchmarking.
+    def get_frame_buffer_reference(self, image):
         buf = [0xFF] * int(self.width * self.height / 8)
         # Set buffer to value of Python Imaging Library image.
         # Image must be in mode 1.
@@ -142,25 +234,65 @@ class EPD:
                     buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
         return buf
 
-    def display_frame(self, frame_buffer_black, frame_buffer_red):
+    def display_frame(self, frame_buffer_black, frame_buffer_red, wait=True):
+        self.wait_if_refreshing()
         if (frame_buffer_black != None):
             self.send_command(DATA_START_TRANSMISSION_1)           
             self.delay_ms(2)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(frame_buffer_black[i])  
+            self.send_frame_plane(frame_buffer_black)
             self.delay_ms(2)                  
         if (frame_buffer_red != None):
             self.send_command(DATA_START_TRANSMISSION_2)
             self.delay_ms(2)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(frame_buffer_red[i])  
+            self.send_frame_plane(frame_buffer_red)
             self.delay_ms(2)        
 
-        self.send_command(DISPLAY_REFRESH)
-        self.wait_until_idle()
+        self.refresh(wait)
+
+    # Cuts the bytes for a window out of a full frame buffer.  x and w must be multiples of 8.
+    def get_window_buffer(self, frame_buffer, x, y, w, l):
+        row_bytes = int(self.width / 8)
+        first = int(x / 8)
+        last = int((x + w) / 8)
+        return b''.join(bytes(frame_buffer[row * row_bytes + first:row * row_bytes + last])
+                        for row in range(y, y + l))
+
+    # Writes a window of both planes into the panel memory.  Nothing changes on screen until DISPLAY_REFRESH.
+    def set_partial_window(self, buffer_black, buffer_red, x, y, w, l):
+        self.send_command(PARTIAL_IN)
+        self.send_command(PARTIAL_WINDOW)
+        x_end = (x & ~0x07) + w - 1  # the window is whole bytes wide, and may end past x = 255
+        self.send_data(x >> 8)
+        self.send_data(x & 0xf8)     # x should be the multiple of 8, the last 3 bit will always be ignored
+        self.send_data(x_end >> 8)
+        self.send_data((x_end | 0x07) & 0xff)
+        self.send_data(y >> 8)
+        self.send_data(y & 0xff)
+        self.send_data((y + l - 1) >> 8)
+        self.send_data((y + l - 1) & 0xff)
+        self.send_data(0x01)         # Gates scan both inside and outside of the partial window. (default)
+        self.delay_ms(2)
+        with instrumentation.timer("epd_spi_seconds"):
+            self.send_command(DATA_START_TRANSMISSION_1)
+            self.send_data_bulk(buffer_black)
+            self.delay_ms(2)
+            self.send_command(DATA_START_TRANSMISSION_2)
+            self.send_data_bulk(buffer_red)
+            self.delay_ms(2)
+        self.send_command(PARTIAL_OUT)
+
+    # Sends only the given (x, y, w, h) windows of the frames, then refreshes the panel once.
+    def display_partial_frame(self, frame_buffer_black, frame_buffer_red, regions, wait=True):
+        self.wait_if_refreshing()
+        for x, y, w, l in regions:
+            self.set_partial_window(self.get_window_buffer(frame_buffer_black, x, y, w, l),
+                                    self.get_window_buffer(frame_buffer_red, x, y, w, l), x, y, w, l)
+
+        self.refresh(wait)
 
     # after this, call epd.init() to awaken the module
     def sleep(self):
+        self.wait_if_refreshing()
         self.send_command(VCOM_AND_DATA_INTERVAL_SETTING)
         self.send_data(0xF7)        # border floating
         self.send_command(POWER_OFF)
@@ -24,8 +24,7 @@
  # THE SOFTWARE.
  #
 
-import spidev
-import RPi.GPIO as GPIO
+import threading
 import time
 
 # Pin definition
@@ -34,30 +33,202 @@ DC_PIN          = 25
 RST_PIN         = 0
 BUSY_PIN        = 6
 
-# SPI device, bus = 0, device = 0
-SPI = spidev.SpiDev(0, 0)
+# Pin levels - same values as RPi.GPIO.LOW / RPi.GPIO.HIGH
+LOW             = 0
+HIGH            = 1
+
+# spidev rejects transfers bigger than its buffer, which is 4096 bytes unless the module's bufsiz is raised.
+SPI_CHUNK_SIZE  = 4096
+
+# How often BUSY is read when edge events can't be used.
+BUSY_POLL_MS    = 10
+
+
+# Transport that drives the panel through the Raspberry Pi SPI bus and GPIO pins.
+# The hardware libraries are only imported when the transport is created, so the rest of the display
+# code can be used without them.
+# The panel raises BUSY when it is done.  The rising edge is caught by the GPIO library's event detection, so
+# waiting for it doesn't wake the thread until then - if event detection can't be set up, wait_for_idle() returns
+# None and the EPD polls instead.
+class SpiGpioTransport:
+
+    # SPI device, bus = 0, device = 0
+    def __init__(self, bus=0, device=0):
+        import spidev
+        import RPi.GPIO as GPIO
+
+        self.gpio = GPIO
+        self.spi = spidev.SpiDev(bus, device)
+        self.idle_event = threading.Event()
+        self.edge_events = False
+        self.idle_at = None
+
+    def init(self):
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        self.gpio.setup(RST_PIN, self.gpio.OUT)
+        self.gpio.setup(DC_PIN, self.gpio.OUT)
+        self.gpio.setup(CS_PIN, self.gpio.OUT)
+        self.gpio.setup(BUSY_PIN, self.gpio.IN)
+        self.spi.max_speed_hz = 2000000
+        self.spi.mode = 0b00
+
+        if not self.edge_events:
+            try:
+                self.gpio.add_event_detect(BUSY_PIN, self.gpio.RISING, callback=self.went_idle)
+                self.edge_events = True
+            except RuntimeError as error:
+                print("*** No edge detection on the BUSY pin, polling it instead: {}".format(error))
+        return 0
+
+    def went_idle(self, channel):
+        self.idle_at = time.monotonic()
+        self.idle_event.set()
+
+    # When BUSY last went high, in time.monotonic() seconds, or None if there are no edge events to tell.
+    def idle_since(self):
+        return self.idle_at if self.edge_events else None
+
+    def digital_write(self, pin, value):
+        self.gpio.output(pin, value)
+
+    def digital_read(self, pin):
+        return self.gpio.input(pin)
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_transfer(self, data):
+        self.spi.writebytes(data)
+
+    # Waits for BUSY to go high.  Returns whether it did within timeout_ms, or None if edge events aren't available.
+    def wait_for_idle(self, timeout_ms):
+        if not self.edge_events:
+            return None
+
+        # Cleared before reading the pin, so an edge between the read and the wait still wakes it.
+        self.idle_event.clear()
+        if self.gpio.input(BUSY_PIN) == HIGH:
+            return True
+        return self.idle_event.wait(timeout_ms / 1000.0) or self.gpio.input(BUSY_PIN) == HIGH
+
+
+# In-memory stand-in for the SPI bus and GPIO pins.  Nothing is sent anywhere - calls are counted and the bytes
+# written are kept along with the level of the DC pin at the time, so transfers can be measured and checked
+# without a panel.  Delays are added up rather than slept.
+# busy_times maps commands to how many seconds the panel stays busy (BUSY low) after them, e.g.
+# {epd4in2b.DISPLAY_REFRESH: 15}.  While the panel is busy delays really sleep, and each time a waiting thread
+# wakes up to look at BUSY is counted in busy_wakeups.  edge_events says whether wait_for_idle() works like the
+# GPIO event detection or isn't available, which makes the EPD poll.
+class FakeTransport:
+
+    def __init__(self, record_transfers=True, busy_times=None, edge_events=True):
+        self.record_transfers = record_transfers
+        self.busy_times = dict(busy_times) if busy_times is not None else {}
+        self.edge_events = edge_events
+        self.pins = {BUSY_PIN: HIGH}     # BUSY high: panel idle
+        self.busy_until = 0.0
+        self.transfers = []
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.gpio_writes = 0
+        self.spi_calls = 0
+        self.spi_bytes = 0
+        self.delay_ms_total = 0
+        self.busy_wakeups = 0
+        self.transfers.clear()
+
+    def init(self):
+        return 0
+
+    def digital_write(self, pin, value):
+        self.gpio_writes += 1
+        self.pins[pin] = value
+
+    def digital_read(self, pin):
+        if pin == BUSY_PIN and self.busy():
+            self.busy_wakeups += 1
+            return LOW
+        return self.pins.get(pin, LOW)
+
+    def delay_ms(self, delaytime):
+        self.delay_ms_total += delaytime
+        if self.busy():
+            time.sleep(delaytime / 1000.0)
+
+    def busy(self):
+        return self.busy_until > 0 and time.monotonic() < self.busy_until
+
+    def spi_transfer(self, data):
+        self.spi_calls += 1
+        self.spi_bytes += len(data)
+        if self.record_transfers:
+            self.transfers.append((self.pins.get(DC_PIN, LOW), bytes(data)))
+
+        if self.pins.get(DC_PIN, LOW) == LOW and len(self.busy_times) > 0:
+            for command in data:
+                if command in self.busy_times:
+                    self.busy_until = time.monotonic() + self.busy_times[command]
+
+    # The end of the last busy period, if it is over and edge events are on.
+    def idle_since(self):
+        if not self.edge_events or self.busy_until == 0 or self.busy():
+            return None
+        return self.busy_until
+
+    # Sleeps through to the end of the busy period in one go, as the edge event would.
+    def wait_for_idle(self, timeout_ms):
+        if not self.edge_events:
+            return None
+        if not self.busy():
+            return True
+
+        self.busy_wakeups += 1
+        remaining = self.busy_until - time.monotonic()
+        time.sleep(max(0.0, min(remaining, timeout_ms / 1000.0)))
+        return not self.busy()
+
+    # All bytes sent while DC was high, i.e. data rather than commands.
+    def data_bytes(self):
+        return b''.join(data for dc, data in self.transfers if dc == HIGH)
+
+
+# The transport in use.  Created on first use unless one has been set already, e.g. a FakeTransport.
+_transport = None
+
+
+def set_transport(transport):
+    global _transport
+    _transport = transport
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = SpiGpioTransport()
+    return _transport
+
 
 def epd_digital_write(pin, value):
-    GPIO.output(pin, value)
+    get_transport().digital_write(pin, value)
 
 def epd_digital_read(pin):
-    return GPIO.input(pin)
+    return get_transport().digital_read(pin)
 
 def epd_delay_ms(delaytime):
-    time.sleep(delaytime / 1000.0)
+    get_transport().delay_ms(delaytime)
 
 def spi_transfer(data):
-    SPI.writebytes(data)
+    get_transport().spi_transfer(data)
+
+def epd_wait_for_idle(timeout_ms):
+    return get_transport().wait_for_idle(timeout_ms)
+
+def epd_idle_since():
+    return get_transport().idle_since()
 
 def epd_init():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
-    GPIO.setup(RST_PIN, GPIO.OUT)
-    GPIO.setup(DC_PIN, GPIO.OUT)
-    GPIO.setup(CS_PIN, GPIO.OUT)
-    GPIO.setup(BUSY_PIN, GPIO.IN)
-    SPI.max_speed_hz = 2000000
-    SPI.mode = 0b00
-    return 0
+    return get_transport().init()
 
 ### END OF FILE ###
@@ -0,0 +1,68 @@
+# Works out which parts of the panel have changed between two frames, so only those windows need to be sent.
+# Frames are packed frame buffers as returned by EPD.get_frame_buffer - one bit per pixel, width / 8 bytes per row.
+
+
+# Returns the first and last byte columns that differ in a row, or None if the row is the same.
+def changed_columns(old_row, new_row):
+    if old_row == new_row:
+        return None
+
+    first = 0
+    while old_row[first] == new_row[first]:
+        first += 1
+
+    last = len(new_row) - 1
+    while old_row[last] == new_row[last]:
+        last -= 1
+
+    return first, last
+
+
+# Compares the old and new frames of every plane (e.g. black and red) and returns a list of (x, y, w, h) boxes
+# covering all the changes.  The panel addresses whole bytes horizontally, so x and w are multiples of 8.
+# Changed rows that are no more than merge_gap rows apart are put in the same box - each window costs a few
+# commands to set up, so a handful of rows of unchanged data is cheaper than another window.
+def changed_regions(old_frames, new_frames, width, height, merge_gap=8):
+    row_bytes = width // 8
+    regions = []
+    band = None     # [first row, last row, first column, last column] of the box being built
+
+    for y in range(height):
+        start = y * row_bytes
+        end = start + row_bytes
+
+        row_change = None
+        for old_frame, new_frame in zip(old_frames, new_frames):
+            columns = changed_columns(old_frame[start:end], new_frame[start:end])
+            if columns is not None:
+                if row_change is None:
+                    row_change = list(columns)
+                else:
+                    row_change = [min(row_change[0], columns[0]), max(row_change[1], columns[1])]
+
+        if row_change is None:
+            continue
+
+        if band is not None and y - band[1] <= merge_gap:
+            band[1] = y
+            band[2] = min(band[2], row_change[0])
+            band[3] = max(band[3], row_change[1])
+        else:
+            if band is not None:
+                regions.append(band_to_region(band))
+            band = [y, y, row_change[0], row_change[1]]
+
+    if band is not None:
+        regions.append(band_to_region(band))
+
+    return regions
+
+
+def band_to_region(band):
+    first_row, last_row, first_col, last_col = band
+    return first_col * 8, first_row, (last_col - first_col + 1) * 8, last_row - first_row + 1
+
+
+# Total number of pixels covered by a list of regions.
+def region_area(regions):
+    return sum(w * h for x, y, w, h in regions)
@@ -0,0 +1,180 @@
+import copy
+from collections import OrderedDict
+from typing import NamedTuple
+
+BLACK = "black"
+RED = "red"
+
+
+# LRU cache of text sizes (font.getsize) keyed by font, size and text.
+class TextMetrics:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.sizes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def size(self, font, text):
+        key = (font.path, font.size, text)
+
+        size = self.sizes.get(key)
+        if size is not None:
+            self.sizes.move_to_end(key)
+            self.hits += 1
+            return size
+
+        self.misses += 1
+        size = font.getsize(text)
+        self.sizes[key] = size
+        if len(self.sizes) > self.max_entries:
+            self.sizes.popitem(last=False)
+        return size
+
+
+# A piece of text placed on the screen: the top left corner of the rotated text, and which image it goes in.
+# Text with an atlas is put together from the atlas's glyphs rather than rendered.
+class TextItem(NamedTuple):
+    position: tuple
+    font: object
+    text: str
+    colour: str
+    rotation: int = 270
+    atlas: object = None
+
+
+# A named part of the screen.  place(metrics, content) turns the slot's content into the TextItems to draw - it is
+# only called when the content changes.
+class Slot:
+
+    def __init__(self, name, place):
+        self.name = name
+        self.place = place
+        self.content = None
+        self.items = ()
+        self.boxes = ()
+        self.dirty = False
+
+
+# Place functions for the usual kinds of slot.
+
+# Text centred along the long side of the rotated screen, at a fixed distance x across it.
+def centred(font, x, colour, length=300, atlas=None):
+    def place(metrics, text):
+        w, h = atlas.text_size(text) if atlas is not None else metrics.size(font, text)
+        return (TextItem((x, int((length - w) / 2)), font, text, colour, 270, atlas),)
+    return place
+
+
+# Text at a fixed position.  The content is (text, colour), or None for nothing.
+def fixed(font, position):
+    def place(metrics, content):
+        if content is None:
+            return ()
+        text, colour = content
+        return (TextItem(position, font, text, colour),)
+    return place
+
+
+# Lays out the screen as a set of slots.  Setting a slot to new content marks it dirty, and render() repaints only
+# the dirty slots - and anything they overlap - in images that are kept from one frame to the next.
+# The text is pasted as whole rectangles, as ClockDisplay always drew it, in the order the slots were added; what
+# render() leaves in the images is the same as drawing every slot from scratch.
+class Layout:
+
+    def __init__(self, text_cache, metrics=None):
+        self.text_cache = text_cache
+        self.metrics = metrics if metrics is not None else TextMetrics()
+        self.slots = OrderedDict()
+        self.repaints = 0
+
+    def add_slot(self, name, place):
+        self.slots[name] = Slot(name, place)
+
+    # Returns whether the content changed.
+    def set(self, name, content):
+        slot = self.slots[name]
+        if content == slot.content:
+            return False
+
+        slot.content = content
+        slot.items = slot.place(self.metrics, content)
+        slot.dirty = True
+        return True
+
+    # A copy to draw on without changing this layout.  The slots are copied, the caches are shared.
+    def copy(self):
+        other = Layout(self.text_cache, self.metrics)
+        for name, slot in self.slots.items():
+            other.slots[name] = copy.copy(slot)
+        other.repaints = self.repaints
+        return other
+
+    def dirty(self):
+        return any(slot.dirty for slot in self.slots.values())
+
+    # Repaints the dirty slots.  Returns the (x0, y0, x1, y1) boxes that were cleared or drawn.
+    def render(self, image_black, image_red):
+        images = {BLACK: image_black, RED: image_red}
+
+        cleared = []
+        for slot in self.slots.values():
+            if slot.dirty:
+                cleared.extend(slot.boxes)
+                slot.boxes = tuple(self.item_box(item) for item in slot.items)
+
+        if len(cleared) == 0 and not self.dirty():
+            return []
+
+        # Everything drawn over the old or new boxes of a dirty slot has to be drawn again, along with anything
+        # that overlaps that in turn.
+        boxes = list(cleared)
+        redraw = set()
+        for slot in self.slots.values():
+            if slot.dirty:
+                redraw.add(slot.name)
+                boxes.extend(slot.boxes)
+
+        growing = True
+        while growing:
+            growing = False
+            for slot in self.slots.values():
+                if slot.name not in redraw and any(overlaps(box, other) for box in slot.boxes for other in boxes):
+                    redraw.add(slot.name)
+                    boxes.extend(slot.boxes)
+                    growing = True
+
+        for box in cleared:
+            for image in images.values():
+                image.paste(255, box)
+
+        for slot in self.slots.values():
+            if slot.name in redraw:
+                for item in slot.items:
+                    self.draw_item(item, images[item.colour])
+                slot.dirty = False
+
+        self.repaints += 1
+        return boxes
+
+    def draw_item(self, item, image):
+        if item.atlas is not None:
+            item.atlas.paste(image, item.position, item.text)
+        else:
+            image.paste(self.text_cache.get_mask(item.font, item.text, item.rotation), item.position)
+
+    # The rectangle the item's text takes up once rotated.
+    def item_box(self, item):
+        if item.atlas is not None:
+            w, h = item.atlas.text_size(item.text)
+            if item.rotation in (90, 270):
+                w, h = h, w
+        else:
+            w, h = self.text_cache.get_mask(item.font, item.text, item.rotation).size
+
+        x, y = item.position
+        return x, y, x + w, y + h
+
+
+def overlaps(box, other):
+    return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
@@ -0,0 +1,260 @@
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+from . import display
+from . import epd4in2b
+
+import instrumentation
+
+PLANE_BYTES = epd4in2b.EPD_WIDTH * epd4in2b.EPD_HEIGHT // 8
+
+# What the render process is sent that it needs again after a restart - the latest of each kind is kept.
+REPLAYED = ("time", "next_time", "tfl", "met")
+
+# The render process is started afresh rather than forked, so it doesn't inherit the clock's threads and locks.
+context = multiprocessing.get_context("spawn")
+
+
+# Frame slots in shared memory, each a black plane followed by a red one in the panel's frame buffer format.
+# The process that creates them (no name) unlinks them when it closes them; others attach by name.
+class SharedFrames:
+
+    def __init__(self, name=None, slots=2):
+        self.slots = slots
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * 2 * PLANE_BYTES)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+    # Views of the two planes of a slot - nothing is copied.
+    def planes(self, slot):
+        start = slot * 2 * PLANE_BYTES
+        return (self.memory.buf[start:start + PLANE_BYTES],
+                self.memory.buf[start + PLANE_BYTES:start + 2 * PLANE_BYTES])
+
+    def write(self, slot, frame_black, frame_red):
+        start = slot * 2 * PLANE_BYTES
+        self.memory.buf[start:start + PLANE_BYTES] = frame_black
+        self.memory.buf[start + PLANE_BYTES:start + 2 * PLANE_BYTES] = frame_red
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# ClockDisplay as it runs in the render process.  It draws and packs the frames just the same, but puts them in a
+# free slot of the shared frames for the clock's process to send, instead of sending them to the panel.
+class RenderWorker(display.ClockDisplay):
+
+    def __init__(self, connection, frames, full_refresh_every):
+        display.ClockDisplay.__init__(self, full_refresh_every, defer_init=True)
+        self.connection = connection
+        self.frames = frames
+        self.free_slots = queue.Queue()
+        for slot in range(frames.slots):
+            self.free_slots.put(slot)
+
+    # Passes on what the clock's process sends, until it says stop or goes away.
+    def receive(self):
+        while True:
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                return
+
+            kind = message[0]
+            if kind == "time":
+                self.post_time(message[1])
+            elif kind == "next_time":
+                self.post_next_time(message[1])
+            elif kind == "tfl":
+                self.post_tfl_status(message[1])
+            elif kind == "met":
+                self.post_met_forecast(message[1])
+            elif kind == "sent":
+                # The frame in the slot has gone to the panel, so the slot can be used again.
+                slot, refresh_seconds = message[1:]
+                if refresh_seconds is not None:
+                    self.record_refresh_time(refresh_seconds)
+                self.free_slots.put(slot)
+            elif kind == "stop":
+                return
+
+    def send_to_panel(self, packed):
+        slot = self.free_slots.get()
+        self.frames.write(slot, packed.frame_black, packed.frame_red)
+        self.connection.send(("frame", slot, packed.regions))
+
+    # The refresh is started by the clock's process, so that is where the lag is worked out.
+    def record_minute_lag(self, time_to_display, drawn_ahead):
+        self.connection.send(("lag", display.minute_start(time_to_display), drawn_ahead))
+
+
+# Where the render process starts.
+def render_main(connection, frames_name, full_refresh_every):
+    frames = SharedFrames(frames_name)
+    worker = RenderWorker(connection, frames, full_refresh_every)
+    worker.load_fonts()
+    worker.daemon = True
+    worker.start()
+
+    connection.send(("ready",))
+    worker.receive()
+
+
+# Draws the screen in a separate process, so drawing and packing don't hold up the clock's other threads - the servo
+# timing in particular - on the GIL.  It can be used by SemaphoreClock in place of ClockDisplay.
+# The render process draws and packs each frame as ClockDisplay does, and puts the planes in shared memory.  The
+# thread here only sends them to the panel, straight from the shared memory, and hands the slot back.  There are
+# two slots, so the next frame can be drawn while one is being sent.
+# The render process keeps its own time (for drawing the next minute ahead) and its own metrics; the lag of each
+# new minute is worked out here, with clock.
+# If the render process dies, it is started again and given the latest of everything posted, so it can draw the
+# screen again - with a full refresh, as it doesn't know what is on the panel.
+class RenderProcess(threading.Thread):
+
+    def __init__(self, full_refresh_every=10, defer_init=False, clock=time):
+        threading.Thread.__init__(self)
+        self.clock = clock
+        self.full_refresh_every = full_refresh_every
+        self.epd = epd4in2b.EPD()
+
+        self.frames = SharedFrames()
+        self.connection = None
+        self.send_lock = threading.Lock()
+        self.posted = {}
+        self.process = None
+        self.started = threading.Event()
+        self.stopping = False
+        self.restarts = 0
+
+        self.frames_sent = 0
+        self.last_minute_lag = None
+        self.lag_hook = None
+
+        if not defer_init:
+            self.init_panel()
+            self.load_fonts()
+
+    def init_panel(self):
+        self.epd.init()
+
+    # Starts the render process, which loads the fonts, and waits until it is ready.
+    def load_fonts(self, timeout=60):
+        self.start_render_process(timeout)
+
+        # The thread can read the frames from now on.
+        self.started.set()
+
+    # Starts a render process and, once it is ready, hands it whatever has been posted.
+    def start_render_process(self, timeout):
+        connection, child_connection = context.Pipe()
+        process = context.Process(target=render_main, name="render",
+                                  args=(child_connection, self.frames.name, self.full_refresh_every))
+        process.daemon = True
+        process.start()
+        child_connection.close()
+
+        try:
+            ready = connection.poll(timeout) and connection.recv() == ("ready",)
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            process.kill()
+            raise RuntimeError("Render process didn't start within {} s".format(timeout))
+
+        with self.send_lock:
+            self.connection = connection
+            self.process = process
+            for message in self.posted.values():
+                connection.send(message)
+
+    # Messages that can't be sent because the render process has gone are dropped - what was posted is kept and
+    # handed to the next one.
+    def send(self, message):
+        with self.send_lock:
+            if message[0] in REPLAYED:
+                self.posted[message[0]] = message
+            if self.connection is None:
+                return
+            try:
+                self.connection.send(message)
+            except OSError:
+                pass
+
+    def post_time(self, time_to_display):
+        self.send(("time", time_to_display))
+
+    def post_next_time(self, next_time_to_display):
+        self.send(("next_time", next_time_to_display))
+
+    # Statuses are frozen into read-only views, which can't be pickled, so the render process gets a copy.
+    def post_tfl_status(self, tfl_status_dict):
+        self.send(("tfl", dict(tfl_status_dict)))
+
+    def post_met_forecast(self, five_day_forecast):
+        self.send(("met", five_day_forecast))
+
+    # Sends the frame in a slot to the panel, straight from the shared memory, then hands the slot back.
+    def send_frame(self, slot, regions):
+        frame_black, frame_red = self.frames.planes(slot)
+        if regions is None:
+            self.epd.display_frame(frame_black, frame_red, wait=False)
+            instrumentation.count("display_full_refreshes_total")
+        else:
+            self.epd.display_partial_frame(frame_black, frame_red, regions, wait=False)
+            instrumentation.count("display_partial_refreshes_total")
+
+        self.frames_sent += 1
+        self.send(("sent", slot, self.epd.last_refresh_seconds))
+
+    def record_minute_lag(self, minute_start, drawn_ahead):
+        self.last_minute_lag = self.clock.time() - minute_start
+        instrumentation.observe("display_minute_lag_seconds", self.last_minute_lag)
+        if self.lag_hook is not None:
+            self.lag_hook(self.last_minute_lag, drawn_ahead)
+
+    # Stops the render process and frees the shared memory.
+    def stop(self, timeout=5):
+        self.stopping = True
+        self.send(("stop",))
+        self.process.join(timeout)
+        self.join(timeout)
+        self.frames.close()
+
+    # Starts the render process again after it has died.  Returns whether it did.
+    def restart(self, timeout=60):
+        print("*** Render process has stopped - restarting it")
+        self.process.join(1)
+        self.restarts += 1
+        instrumentation.count("display_render_restarts_total")
+        try:
+            self.start_render_process(timeout)
+            return True
+        except RuntimeError:
+            print("*** Render process couldn't be restarted: {}".format(sys.exc_info()[1]))
+            return False
+
+    def run(self):
+        self.started.wait()
+
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                if self.stopping or not self.restart():
+                    return
+                continue
+
+            if message[0] == "frame":
+                with instrumentation.timer("display_send_seconds"):
+                    self.send_frame(*message[1:])
+            elif message[0] == "lag":
+                self.record_minute_lag(*message[1:])
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from PIL import Image
+from PIL import ImageDraw
+
+
+# Renders text into a 1 bit mask (0 where the text is) and rotates it - as ClockDisplay.draw_text always did.
+def render_mask(font, text, rotation=0):
+    w, h = font.getsize(text)
+    mask = Image.new('1', (w, h), color=1)
+    draw = ImageDraw.Draw(mask)
+    draw.text((0, 0), text, 0, font)
+    if rotation != 0:
+        mask = mask.rotate(rotation, expand=True)
+    return mask
+
+
+# Size in bytes of a 1 bit mask - rows are padded to whole bytes.
+def mask_bytes(mask):
+    w, h = mask.size
+    return int((w + 7) / 8) * h
+
+
+# LRU cache of rendered, rotated text masks keyed by font, size, text and rotation.  Memory is bounded by
+# max_bytes of mask data - the least recently used masks are dropped first.  Masks handed out must not be changed.
+class TextMaskCache:
+
+    def __init__(self, max_bytes=256 * 1024):
+        self.max_bytes = max_bytes
+        self.masks = OrderedDict()
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_mask(self, font, text, rotation=0):
+        key = (font.path, font.size, text, rotation)
+
+        mask = self.masks.get(key)
+        if mask is not None:
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return mask
+
+        self.misses += 1
+        mask = render_mask(font, text, rotation)
+        size = mask_bytes(mask)
+
+        # Anything bigger than the whole cache is just returned, there is no point evicting everything for it.
+        if size <= self.max_bytes:
+            while self.size_bytes + size > self.max_bytes:
+                old_key, old_mask = self.masks.popitem(last=False)
+                self.size_bytes -= mask_bytes(old_mask)
+                self.evictions += 1
+
+            self.masks[key] = mask
+            self.size_bytes += size
+
+        return mask
+
+    def clear(self):
+        self.masks.clear()
+        self.size_bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.masks), "bytes": self.size_bytes}
+
+
+# Prebuilt masks for a fixed set of characters - e.g. the digits and colon of the clock - so strings made only of
+# those characters can be put together from glyphs rather than rendered.  Each glyph goes where the font's advances
+# put it and only its ink is drawn, as the ink of one character can reach into the next (a 7 does), so the composed
+# string is the same as render_mask gives for it.
+class GlyphAtlas:
+
+    def __init__(self, font, characters="0123456789:", rotation=270):
+        if rotation not in (0, 90, 180, 270):
+            raise ValueError("GlyphAtlas only supports rotations of 0, 90, 180 or 270, not {}".format(rotation))
+
+        self.font = font
+        self.rotation = rotation
+        self.advances = {}
+        self.glyphs = {}
+        self.inks = {}
+
+        for char in characters:
+            glyph = render_mask(font, char)
+            self.advances[char] = font.getlength(char)
+            self.glyphs[char] = glyph
+            self.inks[char] = glyph.convert('L').point(lambda value: 255 - value)
+
+        self.hits = 0
+        self.misses = 0
+
+    def can_render(self, text):
+        return all(char in self.glyphs for char in text)
+
+    # Where each character of the text starts.
+    def pen_positions(self, text):
+        positions = []
+        pen = 0.0
+        for char in text:
+            positions.append(int(round(pen)))
+            pen += self.advances[char]
+        return positions
+
+    # Width and height of the text before rotation, the same as font.getsize gives - the text is as wide as the ink
+    # reaches, which can be past the advance of its last character.
+    def text_size(self, text):
+        positions = self.pen_positions(text)
+        return (max(position + self.glyphs[char].size[0] for position, char in zip(positions, text)),
+                max(self.glyphs[char].size[1] for char in text))
+
+    # Pastes the text into the image with its rotated top left corner at position, like ClockDisplay.draw_text.
+    def paste(self, image, position, text):
+        if not self.can_render(text):
+            self.misses += 1
+            raise KeyError("No glyphs in the atlas for some of {!r}".format(text))
+
+        self.hits += 1
+        mask = Image.new('1', self.text_size(text), color=1)
+        for pen, char in zip(self.pen_positions(text), text):
+            mask.paste(0, (pen, 0), self.inks[char])
+
+        if self.rotation != 0:
+            mask = mask.rotate(self.rotation, expand=True)
+        image.paste(mask, position)
@@ -0,0 +1,3 @@
+from .engine import FetchEngine
+from .response_cache import ResponseCache
+from .scheduler import FetchScheduler
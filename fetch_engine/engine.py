@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import sys
+import time
+
+import aiohttp
+
+import instrumentation
+
+from . import scheduler
+
+
+# Fetches the data for all the sources (TfL, Met Office) from one thread running a single asyncio event loop.
+# Requests go through one pooled client session, so connections are kept alive between fetches rather than
+# paying for a new TCP/TLS handshake each time, and every request has its own timeout.
+#
+# A source needs a name, a status_request_url, a refresh_interval in seconds, parse_summary_status(json) to turn
+# the response into its data and publish(data) to hand the data to the rest of the clock.
+#
+# With a ResponseCache, a source's cache_ttl (seconds, 0 if it has none) says how long a response is used without
+# asking the server again, and at start up anything cached less than warm_start_max_age ago is published straight
+# away so the screen can be drawn before the network is up.
+#
+# When each source is fetched is up to the FetchScheduler - refresh_interval apart, lined up with the display
+# updates, and backing off while fetches are failing.
+class FetchEngine(threading.Thread):
+
+    def __init__(self, sources, request_timeout=20, max_connections=4, keepalive_timeout=300, cache=None,
+                 warm_start_max_age=24 * 60 * 60, fetch_scheduler=None):
+        threading.Thread.__init__(self)
+
+        self.sources = list(sources)
+        self.scheduler = fetch_scheduler if fetch_scheduler is not None else scheduler.FetchScheduler()
+        for source in self.sources:
+            self.scheduler.add_source(source.name, source.refresh_interval)
+        self.cache = cache
+        self.warm_start_max_age = warm_start_max_age
+        self.request_timeout = request_timeout
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+
+        self.loop = None
+        self.session = None
+        self.stop_event = None
+
+        self.fetches = {source.name: 0 for source in self.sources}
+        self.failures = {source.name: 0 for source in self.sources}
+        self.published = set()      # names of the sources that have been given data
+
+    def run(self):
+        asyncio.run(self.main())
+
+    # Asks the engine to stop; safe to call from any thread.
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+
+        self.publish_cached()
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
+            pollers = [asyncio.create_task(self.poll(source)) for source in self.sources]
+
+            await self.stop_event.wait()
+
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+    # Fetches a source whenever the scheduler says it is due.  Anything fetch doesn't expect - the cache failing to
+    # write, or the source failing to take the data - counts as a failed fetch too, so the source keeps being polled.
+    async def poll(self, source):
+        while True:
+            try:
+                worked = await self.fetch(source)
+            except Exception:
+                self.failures[source.name] += 1
+                instrumentation.count("{}_fetch_failures_total".format(source.name))
+                print("*** {} fetch failed unexpectedly: {!r}".format(source.name, sys.exc_info()[1]))
+                worked = False
+
+            if worked:
+                self.scheduler.record_success(source.name)
+            else:
+                self.scheduler.record_failure(source.name)
+
+            await asyncio.sleep(self.scheduler.delay_until_due(source.name))
+
+    def publish(self, source, data):
+        source.publish(data)
+        self.published.add(source.name)
+
+    # Publishes whatever is in the cache for each source, if it isn't too old.
+    def publish_cached(self):
+        if self.cache is None:
+            return
+
+        for source in self.sources:
+            entry = self.cache.load(source.name)
+            if entry is not None and self.cache.age(entry) < self.warm_start_max_age:
+                self.publish_entry(source, entry)
+
+    # Parses and publishes a cached entry.  Returns whether it worked - if it didn't, the next request for the
+    # source asks for the whole response.
+    def publish_entry(self, source, entry):
+        try:
+            self.publish(source, source.parse_summary_status(entry["body"]))
+            return True
+        except (ValueError, KeyError, IndexError, TypeError):
+            print("*** Cached {} data could not be used: {}".format(source.name, sys.exc_info()[1]))
+            self.cache.drop_validators(source.name)
+            return False
+
+    # Fetches, parses and publishes one source.  Returns whether it worked - on failure the source keeps the data
+    # it already has.  A response still within its cache TTL isn't fetched, and one the server says hasn't
+    # changed isn't published again - unless nothing has been published yet, when the cached copy is.  If that
+    # can't be parsed, the whole response is asked for - straight away within the TTL, by the next fetch after a 304.
+    async def fetch(self, source):
+        entry = None
+        headers = {}
+
+        if self.cache is not None:
+            entry = self.cache.load(source.name)
+            if self.cache.is_fresh(entry, getattr(source, "cache_ttl", 0)) \
+                    and (source.name in self.published or self.publish_entry(source, entry)):
+                self.cache.hits += 1
+                instrumentation.count("{}_cache_hits_total".format(source.name))
+                return True
+
+            self.cache.misses += 1
+            headers = self.cache.conditional_headers(entry)
+
+        self.fetches[source.name] += 1
+        fetch_start = time.monotonic()
+
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            async with self.session.get(source.status_request_url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and entry is not None:
+                    self.record_fetch_time(source, time.monotonic() - fetch_start)
+                    instrumentation.count("{}_not_modified_total".format(source.name))
+                    self.cache.not_modified += 1
+                    self.cache.refresh(source.name)
+
+                    if source.name not in self.published:
+                        try:
+                            self.publish(source, source.parse_summary_status(entry["body"]))
+                        except (ValueError, KeyError, IndexError, TypeError):
+                            self.cache.drop_validators(source.name)
+                            raise
+                    return True
+
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+
+            self.record_fetch_time(source, time.monotonic() - fetch_start)
+            data = source.parse_summary_status(result)
+
+            if self.cache is not None:
+                self.cache.store(source.name, result, etag, last_modified)
+
+            self.publish(source, data)
+            return True
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, IndexError, TypeError):
+            self.failures[source.name] += 1
+            instrumentation.count("{}_fetch_failures_total".format(source.name))
+            print("*** {} fetch failed: {}".format(source.name, sys.exc_info()[1]))
+            return False
+
+    # Fetch times go to the scheduler, and to the metrics when they are on.
+    def record_fetch_time(self, source, seconds):
+        self.scheduler.record_fetch_time(source.name, seconds)
+        instrumentation.observe("{}_fetch_seconds".format(source.name), seconds)
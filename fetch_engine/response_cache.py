@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+
+# Keeps the last good response for each source on disk, with the ETag and Last-Modified headers it came with.
+# A response younger than the source's TTL is used without asking the server at all; an older one is revalidated
+# with If-None-Match / If-Modified-Since, so an unchanged feed only costs a 304.  As the cache survives restarts,
+# the clock can draw with the last data it had before the network is up.
+class ResponseCache:
+
+    def __init__(self, cache_dir='./cache', clock=time.time):
+        self.cache_dir = cache_dir
+        self.clock = clock
+        self.entries = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, "{}.json".format(name))
+
+    # Returns the cached entry for a source - a dictionary of body, etag, last_modified and fetched_at - or None.
+    def load(self, name):
+        if name not in self.entries:
+            try:
+                with open(self.path(name)) as cache_file:
+                    self.entries[name] = json.load(cache_file)
+            except (OSError, ValueError):
+                return None
+        return self.entries[name]
+
+    def store(self, name, body, etag=None, last_modified=None):
+        entry = {"body": body, "etag": etag, "last_modified": last_modified, "fetched_at": self.clock()}
+        self.entries[name] = entry
+        self.save(name, entry)
+
+    # Marks the cached entry as checked just now, after the server said it hasn't changed.
+    def refresh(self, name):
+        entry = self.entries[name]
+        entry["fetched_at"] = self.clock()
+        self.save(name, entry)
+
+    # Forgets the ETag and Last-Modified of the cached entry, so the next request asks for the whole response.
+    def drop_validators(self, name):
+        entry = self.entries[name]
+        entry["etag"] = None
+        entry["last_modified"] = None
+        self.save(name, entry)
+
+    # Written to a temporary file first so a power cut can't leave half a cache file behind.
+    def save(self, name, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.path(name) + ".tmp"
+        with open(temp_path, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(temp_path, self.path(name))
+
+    def age(self, entry):
+        return self.clock() - entry["fetched_at"]
+
+    def is_fresh(self, entry, ttl):
+        return entry is not None and self.age(entry) < ttl
+
+    # Headers that make a request conditional on the cached copy being out of date.
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
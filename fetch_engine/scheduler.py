@@ -0,0 +1,77 @@
+import math
+import random
+import time
+
+
+# Scheduling state for one data source.
+class SourceSchedule:
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.failures = 0
+        self.fetch_seconds = None       # running average of how long a fetch takes
+        self.next_due = None
+
+
+# Decides when each data source should next be fetched.
+# After a successful fetch the next one is due a refresh interval later, moved on so that it should finish lead
+# seconds before a display boundary (every align_period seconds, i.e. when SemaphoreClock sends the display a new
+# time) - the data on screen is as fresh as it can be without fetching any more often.
+# After a failure, retries back off exponentially from base_backoff up to max_backoff, with jitter so sources
+# don't retry in step.  clock and random_fraction can be replaced to test the schedule without waiting.
+class FetchScheduler:
+
+    def __init__(self, align_period=60, lead=2, base_backoff=5, max_backoff=600, jitter=0.5,
+                 default_fetch_seconds=1.0, clock=time.time, random_fraction=random.random):
+        self.align_period = align_period
+        self.lead = lead
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.default_fetch_seconds = default_fetch_seconds
+        self.clock = clock
+        self.random_fraction = random_fraction
+
+        self.schedules = {}
+
+    def add_source(self, name, interval):
+        self.schedules[name] = SourceSchedule(interval)
+
+    # Fetch times feed the running average used to start fetches early enough to finish before the boundary.
+    def record_fetch_time(self, name, seconds):
+        schedule = self.schedules[name]
+        if schedule.fetch_seconds is None:
+            schedule.fetch_seconds = seconds
+        else:
+            schedule.fetch_seconds = 0.7 * schedule.fetch_seconds + 0.3 * seconds
+
+    def record_success(self, name):
+        schedule = self.schedules[name]
+        schedule.failures = 0
+        schedule.next_due = self.aligned_start(name, self.clock() + schedule.interval)
+
+    def record_failure(self, name):
+        schedule = self.schedules[name]
+        schedule.failures += 1
+        schedule.next_due = self.clock() + self.backoff(schedule.failures)
+
+    # Exponential backoff, spread by up to +/- jitter / 2 of itself.
+    def backoff(self, failures):
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (failures - 1))
+        return delay * (1 - self.jitter / 2 + self.jitter * self.random_fraction())
+
+    # The first start time no earlier than earliest that lets the fetch finish lead seconds before a boundary.
+    def aligned_start(self, name, earliest):
+        fetch_seconds = self.schedules[name].fetch_seconds
+        if fetch_seconds is None:
+            fetch_seconds = self.default_fetch_seconds
+
+        boundary = math.ceil((earliest + fetch_seconds + self.lead) / self.align_period) * self.align_period
+        return boundary - self.lead - fetch_seconds
+
+    # Seconds until the source is due, 0 if it is due now or has never been fetched.
+    def delay_until_due(self, name):
+        next_due = self.schedules[name].next_due
+        if next_due is None:
+            return 0
+        return max(0, next_due - self.clock())
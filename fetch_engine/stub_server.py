@@ -0,0 +1,83 @@
+import hashlib
+import http.server
+import os
+import threading
+from email.utils import formatdate
+
+
+# Local HTTP server that answers every request for a path with a fixed file, so the fetch engine can be run
+# against known data with no network or credentials.  routes maps a URL path (without the query string) to a file.
+# Responses carry an ETag and Last-Modified, and conditional requests for an unchanged file get a 304.
+#
+#   python -m fetch_engine.stub_server 8080 /met=met_weather_status/weather_data_json_example.json
+class StubServer(threading.Thread):
+
+    def __init__(self, routes, port=0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.routes = dict(routes)
+        self.requests = []
+
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                stub.requests.append((path, dict(self.headers)))
+
+                if path not in stub.routes:
+                    self.send_error(404)
+                    return
+
+                with open(stub.routes[path], 'rb') as route_file:
+                    body = route_file.read()
+
+                etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+                last_modified = formatdate(os.path.getmtime(stub.routes[path]), usegmt=True)
+
+                if self.headers.get("If-None-Match") == etag or \
+                        (self.headers.get("If-None-Match") is None and
+                         self.headers.get("If-Modified-Since") == last_modified):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self.server.server_address[1]
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.port, path)
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    stub_routes = dict(route.split('=', 1) for route in sys.argv[2:])
+    for route_path in stub_routes.values():
+        if not os.path.exists(route_path):
+            sys.exit("No such file: {}".format(route_path))
+
+    stub_server = StubServer(stub_routes, int(sys.argv[1]))
+    print("Serving on {}".format(stub_server.url("")))
+    stub_server.run()
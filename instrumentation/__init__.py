@@ -0,0 +1,15 @@
+from .metrics import Registry
+from .metrics import thread_cpu_seconds
+from .exporter import MetricsServer
+from .exporter import StatsFileWriter
+from .exporter import prometheus_text
+
+# The clock's metrics.  Modules record into this one with the functions below; it is off until enable() is called.
+registry = Registry()
+
+timer = registry.timer
+observe = registry.observe
+count = registry.count
+set_gauge = registry.set_gauge
+enable = registry.enable
+disable = registry.disable
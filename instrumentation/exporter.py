@@ -0,0 +1,108 @@
+import http.server
+import json
+import os
+import threading
+
+from . import metrics
+
+
+# The metrics in the Prometheus text format, each name prefixed with prefix.
+def prometheus_text(registry, prefix="semaphore_clock_"):
+    lines = []
+    with registry.lock:
+        for name, counter in sorted(registry.counters.items()):
+            lines.append("# TYPE {}{} counter".format(prefix, name))
+            lines.append("{}{} {}".format(prefix, name, counter.value))
+
+        for name, gauge in sorted(registry.gauges.items()):
+            lines.append("# TYPE {}{} gauge".format(prefix, name))
+            lines.append("{}{} {}".format(prefix, name, gauge.value))
+
+        for name, histogram in sorted(registry.histograms.items()):
+            lines.append("# TYPE {}{} histogram".format(prefix, name))
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append('{}{}_bucket{{le="{}"}} {}'.format(prefix, name, bound, cumulative))
+            lines.append("{}{}_sum {}".format(prefix, name, histogram.sum))
+            lines.append("{}{}_count {}".format(prefix, name, histogram.count))
+
+    lines.append("# TYPE {}thread_cpu_seconds counter".format(prefix))
+    for thread_name, cpu_seconds in sorted(metrics.thread_cpu_seconds().items()):
+        lines.append('{}thread_cpu_seconds{{thread="{}"}} {}'.format(prefix, thread_name, cpu_seconds))
+
+    return "\n".join(lines) + "\n"
+
+
+# Serves the metrics at /metrics on a local port, for Prometheus (or curl) to read.
+class MetricsServer(threading.Thread):
+
+    def __init__(self, registry, port=9108, address='127.0.0.1'):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        metrics_registry = registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = prometheus_text(metrics_registry).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((address, port), Handler)
+        self.port = self.server.server_address[1]
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Appends a JSON snapshot of the metrics to a file every interval seconds.  When the file gets bigger than max_bytes
+# it is moved to <file>.1 (replacing the one before) and a new one is started, so it never takes more than about
+# twice max_bytes of the SD card.
+class StatsFileWriter(threading.Thread):
+
+    def __init__(self, registry, stats_file='./stats/clock_stats.jsonl', interval=60, max_bytes=1024 * 1024):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.registry = registry
+        self.stats_file = stats_file
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.stopping = threading.Event()
+
+    def write_snapshot(self):
+        directory = os.path.dirname(self.stats_file)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self.stats_file) and os.path.getsize(self.stats_file) > self.max_bytes:
+            os.replace(self.stats_file, self.stats_file + ".1")
+
+        with open(self.stats_file, 'a') as stats_file:
+            stats_file.write(json.dumps(self.registry.snapshot()) + "\n")
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except OSError as error:
+                print("*** Could not write stats file {}: {}".format(self.stats_file, error))
+
+    def stop(self):
+        self.stopping.set()
@@ -0,0 +1,158 @@
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the histogram buckets - from a text draw up to a full panel refresh and more.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class Counter:
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+# Counts of observations in buckets, plus the count, sum and largest value.
+class Histogram:
+
+    def __init__(self, name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)      # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "mean": self.sum / self.count if self.count > 0 else None}
+
+
+# Times a block of code into a histogram.
+class Timer:
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# What timer() hands out while the registry is off - does nothing, and is shared so nothing is created either.
+class NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+# Holds the clock's metrics.  Off until enable() is called - until then every hook returns straight away after
+# checking one flag, so leaving the hooks in the code costs next to nothing.  Metrics are created on first use.
+class Registry:
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def timer(self, name):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(name)
+            histogram.observe(value)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            counter = self.counters.get(name)
+            if counter is None:
+                counter = self.counters[name] = Counter(name)
+            counter.value += amount
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = Gauge(name)
+            gauge.value = value
+
+    # Copies of all the values, for exporting.
+    def snapshot(self):
+        with self.lock:
+            return {"time": time.time(),
+                    "counters": {name: counter.snapshot() for name, counter in self.counters.items()},
+                    "gauges": {name: gauge.snapshot() for name, gauge in self.gauges.items()},
+                    "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+                    "thread_cpu_seconds": thread_cpu_seconds()}
+
+
+# CPU time used by each running thread, by thread name.  Read from /proc on Linux; elsewhere only the calling
+# thread's own time is known.
+def thread_cpu_seconds():
+    ticks_per_second = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    cpu_seconds = {}
+
+    for thread in threading.enumerate():
+        try:
+            with open('/proc/self/task/{}/stat'.format(thread.native_id)) as stat_file:
+                # The command name is in brackets and may hold spaces, so count the fields from after it.
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+            cpu_seconds[thread.name] = (int(fields[11]) + int(fields[12])) / ticks_per_second
+        except (OSError, IndexError, ValueError, TypeError):
+            if thread is threading.current_thread():
+                cpu_seconds[thread.name] = time.thread_time()
+
+    return cpu_seconds
@@ -1,116 +1,216 @@
 import time
 import threading
-import ntplib
-import sys
-import socket
 
+import boot
+import scheduler
 import display
 import semaphore
 import tfl_status
 import met_weather_status
+import fetch_engine
+import instrumentation
+import time_sync
 
 
 class SemaphoreClock(threading.Thread):
 
+    # pi_connection lets a fake pigpio (semaphore.fake_pigpio.FakePi) be used instead of the real daemon, and clock
+    # (anything with time(), localtime(), monotonic() and sleep(), the time module by default) a simulated clock.
+    # Nothing is started until the thread is - simulation.simulator.Simulation drives the clock without threads.
+    # With metrics_port and/or stats_file set, per-stage timings, counters and thread CPU times are collected and
+    # served at http://127.0.0.1:<metrics_port>/metrics and/or appended to stats_file every minute.
+    # With batch_servos both arms are set in one request to pigpio, and with park_servos the servo pulses are
+    # turned off between messages.  With render_process the screen is drawn in a separate process, so drawing it
+    # doesn't hold up the servos.
     def __init__(self, semaphore_interval_min, display_interval_min, left_servo_dict, right_servo_dict,
-                 left_offset_angle=22, right_offset_angle=22):
+                 left_offset_angle=22, right_offset_angle=22, pi_connection=None, clock=time, metrics_port=None,
+                 stats_file=None, batch_servos=True, park_servos=False, render_process=False):
 
         # Init the threading
         threading.Thread.__init__(self)
-
-        # Start the display
-        self.clock_display = display.ClockDisplay()
-        self.clock_display.start()
+        self.clock = clock
+        self.metrics_port = metrics_port
+        self.stats_file = stats_file
 
         # Some configuration that could go into a Config File.
         self.last_time_semaphore = None
         self.semaphore_interval_min = semaphore_interval_min
 
         self.last_time_displayed = None
+        self.last_tfl_status = None
         self.display_interval_min = display_interval_min
 
-        # Create the servo objects
-        left_servo = semaphore.Servo(left_servo_dict)
-        right_servo = semaphore.Servo(right_servo_dict)
+        self.last_forecast = None
+        self.forecast_interval_min = 10
 
-        # Set up the Semaphore flagger and start the thread.
+        # The main loop's jobs, each run on time by the scheduler.  The data sources are checked every 2 s, the rest
+        # happens on minute boundaries - and the display is put right straight away if the clock is stepped back.
+        self.scheduler = scheduler.DeadlineScheduler(clock)
+        self.scheduler.add_periodic_job("sources", 2, self.check_sources)
+        self.scheduler.add_boundary_job("display", display_interval_min, self.update_display, resync=True)
+        self.scheduler.add_boundary_job("forecast", self.forecast_interval_min, self.update_forecast)
+        self.scheduler.add_boundary_job("semaphore", semaphore_interval_min, self.signal_time)
+
+        # The display only draws once the panel and fonts have been set up by the boot phases.  If either fails the
+        # clock carries on without it, signalling the time with the semaphore only.
+        self.display_ready = True
+        if render_process:
+            self.clock_display = display.RenderProcess(defer_init=True, clock=clock)
+        else:
+            self.clock_display = display.ClockDisplay(defer_init=True, clock=clock)
+
+        # Create the servo objects - they connect to pigpio when first moved.
+        left_servo = semaphore.Servo(left_servo_dict, pi_connection)
+        right_servo = semaphore.Servo(right_servo_dict, pi_connection)
+
+        # Set up the Semaphore flagger.
+        servo_output = semaphore.ScriptOutput(left_servo, right_servo) if batch_servos else None
         self.semaphore_flagger = semaphore.SemaphoreFlagger(left_servo, right_servo, 2, left_offset=left_offset_angle,
-                                                            right_offset=right_offset_angle)
+                                                            right_offset=right_offset_angle, sleep=clock.sleep,
+                                                            clock=clock.monotonic, output=servo_output,
+                                                            park=park_servos)
         self.semaphore_flagger.daemon = True
-        self.semaphore_flagger.start()
-
-        # check on the time sync.  If not synched yet, then wait and break out of the loop when detected or max loop
-        # reached
-        ntp_client = ntplib.NTPClient()
-
-        # Give some maximum time to sync, otherwise crack on.
-        for i in range (90):
-            try:
-                ntp_response = ntp_client.request('europe.pool.ntp.org', version=4)
-                # print (ntp_response.offset)
-
-                if ntp_response.offset < 2:
-                    print("Synced @ {}" .format(i))
-                    break
-
-            except ntplib.NTPException:
-                print("NTP Exception ", sys.exc_info())
-
-            except socket.gaierror:
-                print("socket.gaierror exception - can be a problem on first boot:", sys.exc_info())
-
-            time.sleep(1)
-
+        self.semaphore_ready = True     # False if pigpio couldn't be started - the time isn't signalled then.
+
+        # Data sources - created by the data boot phase, and left None if it fails.
+        self.tfl_status_source = None
+        self.met_status_source = None
+        self.fetch_engine = None
+
+        # Everything slow at start up happens at the same time, once run() starts the boot.  The first frame is
+        # drawn as soon as the display is ready and the time can be trusted.
+        self.first_frame_seconds = None
+        self.time_sync = time_sync.TimeSync()
+        self.boot = boot.BootOrchestrator()
+        if pi_connection is None:
+            self.boot.add_phase("pigpio", semaphore.get_pi)
+        self.boot.add_phase("panel", self.clock_display.init_panel)
+        self.boot.add_phase("fonts", self.clock_display.load_fonts)
+        self.boot.add_phase("ntp", self.start_time_sync)
+        self.boot.add_phase("data", self.start_data_sources)
+
+    def start_instrumentation(self):
+        if self.metrics_port is None and self.stats_file is None:
+            return
+
+        instrumentation.enable()
+        if self.metrics_port is not None:
+            instrumentation.MetricsServer(instrumentation.registry, self.metrics_port).start()
+        if self.stats_file is not None:
+            instrumentation.StatsFileWriter(instrumentation.registry, self.stats_file).start()
+
+    # Starts checking the clock against NTP, and waits until it is right or boot_timeout runs out.
+    def start_time_sync(self):
+        self.time_sync.start()
+        return self.time_sync.wait_trusted(self.time_sync.boot_timeout)
+
+    # Sets up the TfL and Met Office sources and starts fetching them.
+    def start_data_sources(self):
         # TFL status - gets the data for the Tube Lines.
-        self.tfl_status_thread = tfl_status.Tfl_Status()
-        self.tfl_status_thread.daemon = True
-        self.tfl_status_thread.start()
+        self.tfl_status_source = tfl_status.Tfl_Status()
 
-        # Met Status - Start up the thread that deals with the Met Status.
-        self.met_status_thread = met_weather_status.MetWeatherStatus()
-        self.last_forecast = None
-        self.forecast_interval_min = 10
-        self.met_status_thread.daemon = True
-        self.met_status_thread.start()
+        # Met Status - the Met Office 5 day forecast.
+        self.met_status_source = met_weather_status.MetWeatherStatus()
+
+        # Both sources are fetched by one engine, on one thread.
+        # Responses are cached on disk, so after a restart the screen can be drawn before the network is up.
+        # Fetches are timed to finish just before the display is updated.
+        self.fetch_engine = fetch_engine.FetchEngine(
+            [self.tfl_status_source, self.met_status_source], cache=fetch_engine.ResponseCache('./cache'),
+            fetch_scheduler=fetch_engine.FetchScheduler(align_period=self.display_interval_min * 60))
+        self.fetch_engine.daemon = True
+        self.fetch_engine.start()
 
     # Main method that runs regularly in the thread.
     def run(self):
 
-        while True:
-            current_time = time.localtime()
-
-            if self.tfl_status_thread.status_dictionary is not None:
-                self.clock_display.tfl_status_queue.put_nowait(self.tfl_status_thread.status_dictionary)
-
-            # checking whether display needs to be updated
-            if self.last_time_displayed is None or (
-                    current_time.tm_min % self.display_interval_min == 0
-                    and current_time.tm_min != self.last_time_displayed):
-
-                self.clock_display.time_queue.put_nowait(current_time)
-                self.last_time_displayed = current_time.tm_min
-
-            # checking if weather display needs to be updated
-            if len(self.met_status_thread.five_day_forecast) == 5 and \
-                    (self.last_forecast is None or (current_time.tm_min % self.forecast_interval_min == 0
-                                                    and current_time.tm_min != self.last_forecast)):
-                self.clock_display.met_forecast_queue.put_nowait(self.met_status_thread.five_day_forecast)
-                self.last_forecast = current_time.tm_min # stays at None until a valid forecast sent
-
-            # If first starting up, signal via the semaphores.  Also write the time if it meets the regular update time.
-            # Clear the screen first and then write date and time.
-            if self.last_time_semaphore is None or (
-                    current_time.tm_min % self.semaphore_interval_min == 0
-                    and current_time.tm_min != self.last_time_semaphore):
-
-                time_str = time.strftime("%Hh %Mm ", current_time)
-                #print(time_str)
-
-                self.semaphore_flagger.cmd_queue.put_nowait(time_str)
-
-                self.last_time_semaphore = current_time.tm_min
+        self.start_instrumentation()
+        self.semaphore_flagger.start()
+        self.boot.start()
+
+        # First frame, as soon as it can be drawn with the right time.
+        self.boot.wait("panel", "fonts", "ntp")
+        failed = [name for name in ("panel", "fonts") if name in self.boot.errors]
+        if len(failed) > 0:
+            print("*** No display - boot phase {} failed".format(" and ".join(failed)))
+            self.display_ready = False
+        else:
+            self.clock_display.start()
+            self.update_display(self.clock.localtime())
+            self.first_frame_seconds = self.boot.clock() - self.boot.boot_start
+
+        self.boot.wait()
+        self.check_boot_errors()
+        print(self.boot.report())
+        if self.first_frame_seconds is not None:
+            print("first frame   {:>9.2f}".format(self.first_frame_seconds))
 
-            time.sleep(2)
+        while True:
+            with instrumentation.timer("clock_tick_seconds"):
+                wait = self.scheduler.run_due()
+            self.clock.sleep(wait)
+
+    # The clock carries on without what failed to boot: without pigpio the time isn't signalled, and without the
+    # data sources the screen shows the time and date only.
+    def check_boot_errors(self):
+        if "pigpio" in self.boot.errors:
+            print("*** No semaphore - boot phase pigpio failed")
+            self.semaphore_ready = False
+        if "data" in self.boot.errors:
+            print("*** No TfL or Met Office data - boot phase data failed")
+
+    # The time the display will be given after current_time: the start of the next minute that is a multiple of
+    # display_interval_min.
+    def next_display_time(self, current_time):
+        minutes = self.display_interval_min - current_time.tm_min % self.display_interval_min
+        return self.clock.localtime(time.mktime(current_time) - current_time.tm_sec + minutes * 60)
+
+    # Passes on new data from the sources.
+    def check_sources(self, current_time):
+
+        # Only pass on TfL status when it is different from the last one passed on - each one wakes up the display,
+        # which redraws the lines that changed straight away.  Sources publish frozen statuses, so they are passed
+        # on and kept as they are.
+        tfl_status_dictionary = self.tfl_status_source.status_dictionary if self.tfl_status_source is not None else None
+        if self.display_ready and tfl_status_dictionary is not None and \
+                tfl_status_dictionary != self.last_tfl_status:
+            self.clock_display.post_tfl_status(tfl_status_dictionary)
+            self.last_tfl_status = tfl_status_dictionary
+
+        # The first forecast goes to the display as soon as there is one, the rest on the forecast boundaries.
+        if self.last_forecast is None:
+            self.update_forecast(current_time)
+
+    # Hands the display the time, unless it already has this minute.
+    def update_display(self, current_time):
+        minute = tuple(current_time[:5])
+        if not self.display_ready or minute == self.last_time_displayed:
+            return
+
+        # The display draws the following minute ahead of time once it knows what it is.
+        self.clock_display.post_next_time(self.next_display_time(current_time))
+        self.clock_display.post_time(current_time)
+        self.last_time_displayed = minute
+
+    # Hands the display the weather forecast, if there is a full one.
+    def update_forecast(self, current_time):
+        if self.display_ready and self.met_status_source is not None \
+                and len(self.met_status_source.five_day_forecast) == 5:
+            self.clock_display.post_met_forecast(self.met_status_source.five_day_forecast)
+            self.last_forecast = current_time.tm_min # stays at None until a valid forecast sent
+
+    # Signals the time via the semaphores - on starting up, then on each semaphore boundary.
+    def signal_time(self, current_time):
+        if not self.semaphore_ready:
+            return
+
+        time_str = time.strftime("%Hh %Mm ", current_time)
+        #print(time_str)
+
+        self.semaphore_flagger.cmd_queue.put_nowait(time_str, semaphore.CommandQueue.TIME)
+        instrumentation.set_gauge("semaphore_queue_depth", self.semaphore_flagger.cmd_queue.depth())
+
+        self.last_time_semaphore = current_time.tm_min
 
 
 if __name__ == "__main__":
@@ -121,7 +221,8 @@ if __name__ == "__main__":
     left_servo_def = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
 
     semaphore_clock = SemaphoreClock(15, 1, left_servo_def, right_servo_def, left_offset_angle=22,
-                                     right_offset_angle=22)
+                                     right_offset_angle=22, metrics_port=9108,
+                                     stats_file='./stats/clock_stats.jsonl')
     semaphore_clock.daemon = True
     semaphore_clock.start()
 
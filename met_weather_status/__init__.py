@@ -1 +1,2 @@
 from .met_status import MetWeatherStatus
+from .forecast import DayForecast
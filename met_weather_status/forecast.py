@@ -0,0 +1,122 @@
+import functools
+import json
+from datetime import date
+from typing import NamedTuple
+
+# Streaming parser for the bigger feeds, e.g. the 3 hourly forecast.  Optional - without it the feed is loaded in
+# one go.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+weather_types =[ # comments are original Met Office text
+    "Clear",    # Clear Night
+    "Sunny",    # Sunny day
+    "PrtCld",  # "Partly cloudy (night)",
+    "PrtCLd",  # "Partly cloudy (day)",
+    "Not used",
+    "Mist",
+    "Fog",
+    "Cloudy",
+    "Overcs",
+    "L rain",  # "Light rain shower (night)",
+    "L shwr",  # Light rain shower (day)",
+    "Drizzl",
+    "L rain",  # "Light rain",
+    "Hvy sh",  # "Heavy rain shower (night)",
+    "Hvy sh",  # "Heavy rain shower (day)",
+    "H rain",
+    "Slt sh",  # "Sleet shower (night)",
+    "Slt sh",  # "Sleet shower (day)",
+    "Sleet",
+    "Hail sh",  # Hail shower (night)",
+    "Hail sh",  # "Hail shower (day)",
+    "Hail",
+    "L snw sh",  # "Light snow shower (night)",
+    "L snw sh",  # "Light snow shower (day)",
+    "L snw",
+    "H snw sh",  # "Heavy snow shower (night)",
+    "H snw sh",  # "Heavy snow shower (day)",
+    "H snw",
+    "Thndr sh",  # "Thunder shower (night)",
+    "Thndr sh",  # "Thunder shower (day)",
+    "Thndr"]
+
+
+DEGREE_SIGN = u"\N{DEGREE SIGN}"
+
+
+# One day of the Met Office daily forecast - just the fields the clock shows, as numbers rather than strings.
+class DayForecast(NamedTuple):
+    date: date
+    day_weather_type: int
+    night_weather_type: int
+    high_temp: int
+    low_temp: int
+    prob_ppt_day: int
+    prob_ppt_night: int
+
+    # The three lines the clock shows for the day - see day_text().
+    def display_text(self):
+        return day_text(self)
+
+
+# The three lines the clock shows for a day: day name, day forecast and night forecast.  Forecasts are immutable,
+# so the text is only worked out once for each - the clock only ever has the five days of one forecast to show.
+@functools.lru_cache(maxsize=16)
+def day_text(day_forecast):
+    return (day_forecast.date.strftime("%a"),
+            "{} {}{}C {}%".format(weather_types[day_forecast.day_weather_type], day_forecast.high_temp, DEGREE_SIGN,
+                                  day_forecast.prob_ppt_day),
+            "{} {}{}C {}%".format(weather_types[day_forecast.night_weather_type], day_forecast.low_temp,
+                                  DEGREE_SIGN, day_forecast.prob_ppt_night))
+
+
+# One step of the Met Office 3 hourly forecast.
+class ThreeHourForecast(NamedTuple):
+    date: date
+    minutes: int            # Minutes after midnight the step starts.
+    weather_type: int
+    temperature: int
+    prob_ppt: int
+
+
+# Met Office dates are in the format YYYY-MM-DDZ.
+def parse_date(value):
+    return date(int(value[:4]), int(value[5:7]), int(value[8:10]))
+
+
+# Turns the daily forecast JSON into a tuple of DayForecast in a single pass, taking only the fields needed.
+def parse_daily(result):
+    forecasts = []
+
+    for period in result["SiteRep"]["DV"]["Location"]["Period"]:
+        # Met Office provides day forecast first, followed by night.  Night is from sundown previous day
+        # to sunrise.  Day from Sunrise to Sunset.
+        day_forecast, night_forecast = period["Rep"][0], period["Rep"][1]
+
+        forecasts.append(DayForecast(parse_date(period["value"]),
+                                     int(day_forecast["W"]), int(night_forecast["W"]),
+                                     int(day_forecast["Dm"]), int(night_forecast["Nm"]),
+                                     int(day_forecast["PPd"]), int(night_forecast["PPn"])))
+
+    return tuple(forecasts)
+
+
+# Reads the periods out of a forecast file object one at a time - streamed with ijson if it is installed, so the
+# whole document never has to be held in memory.
+def iter_periods(json_file):
+    if ijson is not None:
+        yield from ijson.items(json_file, "SiteRep.DV.Location.Period.item")
+    else:
+        yield from json.load(json_file)["SiteRep"]["DV"]["Location"]["Period"]
+
+
+# Yields a ThreeHourForecast for every step of the 3 hourly forecast read from a file object.
+def iter_three_hourly(json_file):
+    for period in iter_periods(json_file):
+        forecast_date = parse_date(period["value"])
+        for step in period["Rep"]:
+            yield ThreeHourForecast(forecast_date, int(step["$"]), int(step["W"]), int(step["T"]), int(step["Pp"]))
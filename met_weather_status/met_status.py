@@ -2,41 +2,11 @@ import requests
 import json
 import threading
 import time
-from datetime import date
 import sys
 
-weather_types =[ # comments are original Met Office text
-    "Clear",    # Clear Night
-    "Sunny",    # Sunny day
-    "PrtCld",  # "Partly cloudy (night)",
-    "PrtCLd",  # "Partly cloudy (day)",
-    "Not used",
-    "Mist",
-    "Fog",
-    "Cloudy",
-    "Overcs",
-    "L rain",  # "Light rain shower (night)",
-    "L shwr",  # Light rain shower (day)",
-    "Drizzl",
-    "L rain",  # "Light rain",
-    "Hvy sh",  # "Heavy rain shower (night)",
-    "Hvy sh",  # "Heavy rain shower (day)",
-    "H rain",
-    "Slt sh",  # "Sleet shower (night)",
-    "Slt sh",  # "Sleet shower (day)",
-    "Sleet",
-    "Hail sh",  # Hail shower (night)",
-    "Hail sh",  # "Hail shower (day)",
-    "Hail",
-    "L snw sh",  # "Light snow shower (night)",
-    "L snw sh",  # "Light snow shower (day)",
-    "L snw",
-    "H snw sh",  # "Heavy snow shower (night)",
-    "H snw sh",  # "Heavy snow shower (day)",
-    "H snw",
-    "Thndr sh",  # "Thunder shower (night)",
-    "Thndr sh",  # "Thunder shower (day)",
-    "Thndr"]
+import instrumentation
+
+from . import forecast
 
 
 # Class that manages the TFL status - sorts out the credentials and makes the queries when asked.
@@ -59,14 +29,19 @@ class MetWeatherStatus(threading.Thread):
 
         self.status_dictionary = None
 
-        self.five_day_forecast = []
+        self.five_day_forecast = ()
+
+        # Used by the fetch engine, which does the fetching for this source when the clock is running.
+        self.name = "met"
+        self.refresh_interval = 120
+        self.cache_ttl = 30 * 60     # The daily forecast only changes a few times a day.
 
         # print(self.status_request_url)
 
     # Get the status from the TFL site and process it to get just the summary status.
     def get_summary_status(self):
 
-        ret_five_day_forecast = []
+        ret_five_day_forecast = ()
 
         try:
             # print("trying")
@@ -75,28 +50,7 @@ class MetWeatherStatus(threading.Thread):
             #print(raw_data)
 
             try:
-                result = raw_data.json()
-                # Process each day in turn.  The Met Office data is nested - this gets us to the forecasts.
-                for day in result["SiteRep"]["DV"]["Location"]["Period"]:
-                    # put into date object - Met Office gives in format of YYYY-MM-DDZ - not sure what the Z is for.
-                    forecast_date = date(int(day["value"][:4]), int(day["value"][5:7]), int(day["value"][8:10]))
-
-                    # Met Office provides day forecast first, followed by night.  Night is from sundown previous day
-                    # to sunrise.  Day from Sunrise to Sunset.
-                    day_forecast = day["Rep"].pop(0)
-                    night_forecast = day["Rep"].pop(0)
-
-                    # print(int(day_forecast["W"]))
-                    # Create a dictionary for each day.
-                    simple_day_forecast = {"date": forecast_date.strftime("%a %d %m %y"),
-                                           "day_weather_type": weather_types[int(day_forecast["W"])],
-                                           "night_weather_type": weather_types[int(night_forecast["W"])],
-                                           "high_temp": day_forecast["Dm"],
-                                           "low_temp": night_forecast["Nm"],
-                                           "prob_ppt_day": day_forecast["PPd"],
-                                           "prob_ppt_night": night_forecast["PPn"]}
-
-                    ret_five_day_forecast.append(simple_day_forecast)
+                ret_five_day_forecast = self.parse_summary_status(raw_data.json())
 
             except:
                 print("Problem with dealing with {} from Met Office".format(raw_data))
@@ -109,13 +63,23 @@ class MetWeatherStatus(threading.Thread):
 
         return ret_five_day_forecast
 
-    def run(self):
-        # trying to ensure there is enough entropy to get started.  Just wait for 5 min.  Could be more clever.
+    # Turns the daily forecast JSON from the Met Office into a tuple of DayForecast, one for each day.
+    def parse_summary_status(self, result):
+        with instrumentation.timer("met_parse_seconds"):
+            return forecast.parse_daily(result)
 
-        # Get the status every once in a while
+    # Makes a new forecast available to the rest of the clock.
+    def publish(self, five_day_forecast):
+        self.five_day_forecast = five_day_forecast
+
+    # Fetches the forecast every refresh_interval, for running the source on its own.  It is published like the
+    # fetch engine's, and a failed fetch keeps the forecast already there.
+    def run(self):
         while True:
-            self.five_day_forecast = self.get_summary_status()
-            time.sleep(120)
+            five_day_forecast = self.get_summary_status()
+            if len(five_day_forecast) > 0:
+                self.publish(five_day_forecast)
+            time.sleep(self.refresh_interval)
 
 
 if __name__ == "__main__":
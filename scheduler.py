@@ -0,0 +1,139 @@
+import sys
+import time
+
+import instrumentation
+
+
+# Scheduling state for one job.  Boundary jobs are due on local time minute boundaries (deadlines in wall clock
+# seconds), periodic jobs every so many seconds (deadlines in monotonic seconds).
+class ScheduledJob:
+
+    def __init__(self, name, function, interval_min=None, interval_s=None, resync=False):
+        self.name = name
+        self.function = function
+        self.interval_min = interval_min
+        self.interval_s = interval_s
+        self.resync = resync
+        self.deadline = None        # None: due straight away
+        self.runs = 0
+        self.failures = 0
+        self.missed = 0             # boundaries that passed while the loop was stalled, run once late instead
+        self.last_lateness = None
+        self.max_lateness = 0.0
+
+
+# Runs the jobs of the SemaphoreClock main loop on time.  A boundary job runs at the start of every minute whose
+# tm_min is a multiple of its interval_min, as the old 2 s polling of localtime() did, but within a few milliseconds
+# of the boundary rather than up to 2 s after it.  run_due() runs whatever is due and returns how long to sleep.
+# The deadlines are in wall clock time, but sleeps are monotonic, so the time left is worked out again from the
+# wall clock on every wake up and sleeps are never longer than max_sleep.
+# If the wall clock moves more than step_tolerance seconds further than the monotonic clock between two wake ups
+# (an NTP step), boundaries the clock has jumped over are run late as usual.  If it has gone back before the
+# boundary a job last ran for, a job with resync is run again straight away so what it shows is put right; any other
+# job keeps waiting for the boundary after the one it last ran for, so it doesn't do the same boundary twice.  A loop
+# that stalls past one or more boundaries runs each job once when it catches up, and counts the boundaries it
+# missed.
+# How late each job ran is kept per job and recorded in the scheduler_<name>_lateness_seconds metric.
+# clock is anything with time(), monotonic() and localtime() - the time module by default.
+class DeadlineScheduler:
+
+    def __init__(self, clock=time, max_sleep=2.0, step_tolerance=1.0):
+        self.clock = clock
+        self.max_sleep = max_sleep
+        self.step_tolerance = step_tolerance
+        self.jobs = []
+        self.last_wake = None      # (wall, monotonic) at the last run_due()
+        self.clock_steps = 0
+
+    # function(current_time) runs every interval_min minutes, on the minute.
+    def add_boundary_job(self, name, interval_min, function, resync=False):
+        self.jobs.append(ScheduledJob(name, function, interval_min=interval_min, resync=resync))
+
+    # function(current_time) runs every interval_s seconds.
+    def add_periodic_job(self, name, interval_s, function):
+        self.jobs.append(ScheduledJob(name, function, interval_s=interval_s))
+
+    # The first minute boundary of interval_min after wall (seconds since the epoch).
+    def next_boundary(self, wall, interval_min):
+        local_time = self.clock.localtime(wall)
+        minute_start = int(wall) - local_time.tm_sec
+        return minute_start + (interval_min - local_time.tm_min % interval_min) * 60
+
+    # Runs the jobs that are due, in the order they were added, and returns the seconds to sleep until the next one.
+    # A job that raises is reported and counted, and scheduled again as usual - it doesn't stop the loop.
+    def run_due(self):
+        wall = self.clock.time()
+        monotonic = self.clock.monotonic()
+
+        if self.last_wake is not None:
+            step = (wall - self.last_wake[0]) - (monotonic - self.last_wake[1])
+            if abs(step) > self.step_tolerance:
+                self.clock_stepped(wall, step)
+        self.last_wake = (wall, monotonic)
+
+        for job in self.jobs:
+            now = wall if job.interval_min is not None else monotonic
+            if job.deadline is not None and now < job.deadline:
+                continue
+
+            if job.deadline is not None:
+                self.record_lateness(job, now - job.deadline)
+
+            try:
+                job.function(self.clock.localtime(wall))
+            except Exception:
+                job.failures += 1
+                instrumentation.count("scheduler_job_failures_total")
+                print("*** Job {} failed: {!r}".format(job.name, sys.exc_info()[1]))
+            job.runs += 1
+
+            if job.interval_min is not None:
+                job.deadline = self.next_boundary(wall, job.interval_min)
+            elif job.deadline is None or monotonic - job.deadline >= job.interval_s:
+                job.deadline = monotonic + job.interval_s
+            else:
+                job.deadline += job.interval_s      # keeps the period from drifting
+
+        return self.seconds_to_next()
+
+    def clock_stepped(self, wall, step):
+        print("*** Clock stepped by {:.1f} s - rescheduling".format(step))
+        self.clock_steps += 1
+        instrumentation.count("scheduler_clock_steps_total")
+
+        for job in self.jobs:
+            if not job.resync or job.deadline is None:
+                continue
+            # The boundary the job last ran for is still to come.
+            if job.deadline - job.interval_min * 60 > wall:
+                job.deadline = None
+
+    def record_lateness(self, job, lateness):
+        job.last_lateness = lateness
+        job.max_lateness = max(job.max_lateness, lateness)
+        instrumentation.observe("scheduler_{}_lateness_seconds".format(job.name), lateness)
+
+        if job.interval_min is not None:
+            missed = int(lateness // (job.interval_min * 60))
+            if missed > 0:
+                job.missed += missed
+                instrumentation.count("scheduler_missed_boundaries_total", missed)
+
+    # Seconds until the next deadline, from the clocks as they are now, but no more than max_sleep.
+    def seconds_to_next(self):
+        wall = self.clock.time()
+        monotonic = self.clock.monotonic()
+
+        wait = self.max_sleep
+        for job in self.jobs:
+            if job.deadline is None:
+                return 0.0
+            now = wall if job.interval_min is not None else monotonic
+            wait = min(wait, job.deadline - now)
+        return max(0.0, wait)
+
+    # Runs, failures, missed boundaries and lateness in seconds for each job.
+    def stats(self):
+        return {job.name: {"runs": job.runs, "failures": job.failures, "missed": job.missed,
+                           "last_lateness": job.last_lateness, "max_lateness": job.max_lateness}
+                for job in self.jobs}
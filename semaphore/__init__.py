@@ -1,2 +1,7 @@
 from .semaphore import Servo
 from .semaphore import SemaphoreFlagger
+from .command_queue import CommandQueue
+from .semaphore import get_pi
+from .servo_output import PerServoOutput
+from .servo_output import ScriptOutput
+from .servo_output import RecordingOutput
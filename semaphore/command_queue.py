@@ -0,0 +1,114 @@
+import collections
+import threading
+import time
+
+
+# A message waiting to be signalled, with the times it was queued and started.
+class QueuedCommand:
+
+    def __init__(self, text, kind, queued_at):
+        self.text = text
+        self.kind = kind
+        self.queued_at = queued_at
+        self.started_at = None
+
+
+# Blocking queue of messages for the SemaphoreFlagger.
+# PRIORITY messages (errors, test patterns) go in their own lane and are always taken first.  With latest_wins set,
+# a new TIME message replaces any TIME message still waiting, and tells the flagger to stop signalling a TIME
+# message it has already started - there is no point finishing a time that is out of date.
+# Queue depth, replaced and preempted messages, and latency from queueing to starting and to finishing are kept
+# for metrics().
+class CommandQueue:
+
+    MESSAGE = "message"
+    TIME = "time"
+    PRIORITY = "priority"
+
+    def __init__(self, latest_wins=True, clock=time.monotonic, latency_samples=100):
+        self.latest_wins = latest_wins
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.priority_lane = collections.deque()
+        self.messages = collections.deque()
+
+        self.max_depth = 0
+        self.replaced = 0
+        self.preempted = 0
+        self.completed = 0
+        self.start_latencies = collections.deque(maxlen=latency_samples)
+        self.end_to_end_latencies = collections.deque(maxlen=latency_samples)
+
+    def put(self, text, kind=MESSAGE):
+        with self.condition:
+            command = QueuedCommand(text, kind, self.clock())
+
+            if kind == self.PRIORITY:
+                self.priority_lane.append(command)
+            else:
+                if self.latest_wins and kind == self.TIME:
+                    waiting = len(self.messages)
+                    self.messages = collections.deque(queued for queued in self.messages if queued.kind != self.TIME)
+                    self.replaced += waiting - len(self.messages)
+                self.messages.append(command)
+
+            self.max_depth = max(self.max_depth, self.depth())
+            self.condition.notify()
+
+    # Never blocks - the queue is unbounded.  Kept so the flagger's queue can be used like the queue.Queue it was.
+    def put_nowait(self, text, kind=MESSAGE):
+        self.put(text, kind)
+
+    # Waits for the next message, priority lane first.  Returns None if timeout runs out first.
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.depth() > 0, timeout):
+                return None
+
+            if len(self.priority_lane) > 0:
+                command = self.priority_lane.popleft()
+            else:
+                command = self.messages.popleft()
+
+            command.started_at = self.clock()
+            self.start_latencies.append(command.started_at - command.queued_at)
+            return command
+
+    # Whether the flagger should give up on the message it is signalling: a newer time message has arrived for a
+    # time message, or anything is waiting in the priority lane for an ordinary one.
+    def should_preempt(self, command):
+        with self.condition:
+            if command.kind == self.PRIORITY:
+                return False
+            if len(self.priority_lane) > 0:
+                return True
+            return self.latest_wins and command.kind == self.TIME and \
+                any(queued.kind == self.TIME for queued in self.messages)
+
+    # Called by the flagger when it is done with a message, whether it was finished or preempted.
+    def task_done(self, command, preempted=False):
+        with self.condition:
+            if preempted:
+                self.preempted += 1
+            else:
+                self.completed += 1
+                self.end_to_end_latencies.append(self.clock() - command.queued_at)
+
+    def depth(self):
+        return len(self.priority_lane) + len(self.messages)
+
+    def empty(self):
+        return self.depth() == 0
+
+    def metrics(self):
+        with self.condition:
+            return {"depth": self.depth(), "max_depth": self.max_depth, "replaced": self.replaced,
+                    "preempted": self.preempted, "completed": self.completed,
+                    "start_latency": average(self.start_latencies),
+                    "end_to_end_latency": average(self.end_to_end_latencies)}
+
+
+def average(samples):
+    if len(samples) == 0:
+        return None
+    return sum(samples) / len(samples)
@@ -0,0 +1,65 @@
+import time
+
+
+# Stand-in for a pigpio.pi connection.  Nothing is sent to the daemon - every servo pulse write is logged with a
+# timestamp instead, so the number of daemon round trips and their timing can be checked without a Pi.
+# Stored scripts are run too, as far as their servo commands go, so a script that sets several servos is one
+# round trip with all its pulse writes at the same time.
+class FakePi:
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.connected = True
+        self.pulse_writes = []      # (timestamp, pin, pulse width)
+        self.pulse_widths = {}
+        self.scripts = []
+        self.requests = 0
+
+    def set_servo_pulsewidth(self, user_gpio, pulsewidth):
+        self.requests += 1
+        self.write_pulse(self.clock(), user_gpio, pulsewidth)
+        return 0
+
+    def write_pulse(self, timestamp, user_gpio, pulsewidth):
+        self.pulse_writes.append((timestamp, user_gpio, pulsewidth))
+        self.pulse_widths[user_gpio] = pulsewidth
+
+    def get_servo_pulsewidth(self, user_gpio):
+        return self.pulse_widths.get(user_gpio, 0)
+
+    def store_script(self, script):
+        self.requests += 1
+        self.scripts.append(script.lower().split())
+        return len(self.scripts) - 1
+
+    # Scripts are ready as soon as they are stored: halted, with no parameters.
+    def script_status(self, script_id):
+        self.requests += 1
+        return 1, []
+
+    # Runs the servo commands of a script - "servo" or "s" followed by a pin and a pulse width, either of which can
+    # be a parameter (p0 to p9).
+    def run_script(self, script_id, params=None):
+        self.requests += 1
+        params = params or []
+        words = self.scripts[script_id]
+        timestamp = self.clock()
+
+        def value(word):
+            return params[int(word[1:])] if word.startswith("p") else int(word)
+
+        for position in range(len(words)):
+            if words[position] in ("servo", "s"):
+                self.write_pulse(timestamp, value(words[position + 1]), value(words[position + 2]))
+        return 0
+
+    def delete_script(self, script_id):
+        self.requests += 1
+        return 0
+
+    # Each call is one request to the daemon.
+    def round_trips(self):
+        return self.requests
+
+    def stop(self):
+        self.connected = False
@@ -0,0 +1,79 @@
+import math
+import time
+
+from . import servo_output
+
+
+# Smoothstep easing - starts and ends slowly, so the arms don't jerk at either end of a move.
+def ease_in_out(fraction):
+    return fraction * fraction * (3 - 2 * fraction)
+
+
+# The steepest slope of ease_in_out, halfway through - the arms go this many times the average speed of a move.
+EASE_PEAK_SLOPE = 1.5
+
+
+# Plans and makes the arm movements for the flagger.  Arms that are already where they need to be are not written
+# to, and with max_speed set (degrees per second) a move is broken into eased steps step_time seconds apart so
+# neither arm goes faster than that - or than a degree a step, if max_speed is slower still.  Keeps count of the
+# daemon writes and the total arm travel in degrees.
+# Both arms of each step are sent through output, a servo_output.ServoOutput - by default one request per servo.
+class MotionPlanner:
+
+    def __init__(self, left_servo, right_servo, max_speed=None, step_time=0.02, sleep=time.sleep, output=None):
+        self.left_servo = left_servo
+        self.right_servo = right_servo
+        self.output = output if output is not None else servo_output.PerServoOutput(left_servo, right_servo)
+        self.max_speed = max_speed
+        self.step_time = step_time
+        self.sleep = sleep
+
+        self.position = None        # (left, right) physical angles last set, None until the first move
+        self.moves = 0
+        self.steps = 0
+        self.travel = 0.0
+
+    # Returns the list of (left, right) positions to go through to get to the target, the target being the last.
+    def plan_move(self, left_angle, right_angle):
+        if self.max_speed is None or self.position is None:
+            return [(left_angle, right_angle)]
+
+        # Enough steps that the fastest one, in the middle of the move, is within max_speed.  Steps are rounded to
+        # whole degrees, which can add a degree to a step, so the limit is taken in whole degrees a step too.
+        start_left, start_right = self.position
+        distance = max(abs(left_angle - start_left), abs(right_angle - start_right))
+        degrees_per_step = max(1, math.floor(self.max_speed * self.step_time))
+        step_count = max(1, math.ceil(EASE_PEAK_SLOPE * distance / degrees_per_step))
+
+        steps = []
+        for step in range(1, step_count + 1):
+            fraction = ease_in_out(step / step_count)
+            # Whole degrees, so the servos' pulse width tables are used for the intermediate steps too.
+            steps.append((int(round(start_left + (left_angle - start_left) * fraction)),
+                          int(round(start_right + (right_angle - start_right) * fraction))))
+        steps[-1] = (left_angle, right_angle)
+        return steps
+
+    # Moves both arms to the given physical angles.
+    def move_to(self, left_angle, right_angle):
+        steps = self.plan_move(left_angle, right_angle)
+
+        for step_number, (left_step, right_step) in enumerate(steps):
+            if step_number > 0:
+                self.sleep(self.step_time)
+
+            self.output.set_angles(left_step, right_step)
+
+            if self.position is not None:
+                self.travel += abs(left_step - self.position[0]) + abs(right_step - self.position[1])
+            self.position = (left_step, right_step)
+
+        self.moves += 1
+        self.steps += len(steps)
+
+    def round_trips(self):
+        return self.output.round_trips()
+
+    def report(self):
+        return {"moves": self.moves, "steps": self.steps, "round_trips": self.round_trips(),
+                "travel_degrees": self.travel}
@@ -1,74 +1,228 @@
 # !/usr/bin/env python3
 
-import pigpio
 import threading
 import time
 import sys
 import subprocess
-import queue
 import os
 import json
 
+import instrumentation
+
+from . import command_queue
+from . import fake_pigpio
+from . import motion
+
+# Shared connection to the pigpio daemon, made the first time it is needed by get_pi().
+pi = None
+pi_lock = threading.Lock()
+
+
 """
 This bit just gets the pigpiod daemon up and running if it isn't already.
 The pigpio daemon accesses the Raspberry Pi GPIO.  
 """
-p = subprocess.Popen(['pgrep', '-f', 'pigpiod'], stdout=subprocess.PIPE)
-out, err = p.communicate()
+def start_pigpio_daemon():
+    p = subprocess.Popen(['pgrep', '-f', 'pigpiod'], stdout=subprocess.PIPE)
+    out, err = p.communicate()
+
+    if len(out.strip()) == 0:
+        os.system("sudo pigpiod")
+        return True
+    return False
+
+
+# Returns the shared pigpio connection, starting the daemon and connecting first if need be.  Nothing touches the
+# hardware until this is called, so importing the module has no side effects.
+def get_pi(connect_timeout=3):
+    global pi
+
+    with pi_lock:
+        if pi is None:
+            import pigpio
+
+            started = start_pigpio_daemon()
+            connection = pigpio.pi()
+
+            # A daemon that has only just been started takes a moment before it accepts connections.
+            deadline = time.monotonic() + connect_timeout
+            while started and not connection.connected and time.monotonic() < deadline:
+                time.sleep(0.1)
+                connection = pigpio.pi()
 
-if len(out.strip()) == 0:
-    os.system("sudo pigpiod")
-    time.sleep(3)
+            pi = connection
 
-pi = pigpio.pi()
+        return pi
+
+
+# Word codes are written in brackets in a message, e.g. "[REST]", so ordinary words are still spelt out letter by
+# letter.
+WORD_CODE_START = "["
+WORD_CODE_END = "]"
 
 
 # Manages the code to angles translation.
 class SemaphoreCodes:
 
-    # Reads all the codes from the file.
-    def __init__(self):
-        with open('./semaphore/semaphore_codes.json') as json_semaphore_codes:
+    # Reads all the codes from the file and compiles them once: single characters go into a dictionary and word
+    # codes (e.g. "Letters", "Rest") into a trie under their bracketed form, e.g. "[LETTERS]".
+    def __init__(self, codes_file='./semaphore/semaphore_codes.json'):
+        with open(codes_file) as json_semaphore_codes:
             self.codes = json.load(json_semaphore_codes)
 
-    # Returns the flag angles required for each letter.
-    def return_flag_angles(self, code):
+        self.char_index = {}
+        self.word_trie = {}
 
-        # TO_DO: can't find the word codes, individual letters works OK.
-        ret_code = None
         for array_member in self.codes["semaphore_codes"]:
-            if array_member['code'] is code:
-                ret_code = (array_member["left"], array_member["right"])
-                break  # break out of for loop - found it
-        return ret_code
+            code = array_member['code'].upper()
+            angles = (array_member["left"], array_member["right"])
+
+            if len(code) == 1:
+                # The first entry for a code wins, as it did when the list was searched in order.
+                self.char_index.setdefault(code, angles)
+            else:
+                self.add_word_code(WORD_CODE_START + code + WORD_CODE_END, angles)
+
+    # Adds a word code to the trie.  The angles are stored under the None key of the node the word ends on.
+    def add_word_code(self, word, angles):
+        node = self.word_trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault(None, angles)
+
+    # Returns the flag angles required for a letter or a word code ("REST" or "[REST]"), None if there are none.
+    def return_flag_angles(self, code):
+        code = code.upper()
+
+        if len(code) == 1:
+            return self.char_index.get(code)
+
+        if not code.startswith(WORD_CODE_START):
+            code = WORD_CODE_START + code + WORD_CODE_END
+
+        node = self.word_trie
+        for char in code:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node.get(None)
+
+    # Finds the longest word code starting at position start of the message.
+    # Returns (end position, angles), or None if no word code starts there.
+    def match_word_code(self, message, start):
+        node = self.word_trie
+        match = None
+        for position in range(start, len(message)):
+            node = node.get(message[position])
+            if node is None:
+                break
+            if None in node:
+                match = (position + 1, node[None])
+        return match
+
+    # Turns a whole message into a list of (code, angles) in one pass, taking the longest word code wherever one
+    # matches and single characters everywhere else.  angles is None for characters that have no code.
+    def encode(self, message):
+        message = message.upper()
+        char_index = self.char_index
+        sequence = []
+        position = 0
+
+        while position < len(message):
+            # Every word code starts with WORD_CODE_START, so the characters up to the next one are plain letters.
+            word_start = message.find(WORD_CODE_START, position)
+            if word_start < 0:
+                word_start = len(message)
+
+            sequence.extend((char, char_index.get(char)) for char in message[position:word_start])
+            if word_start == len(message):
+                break
+
+            match = self.match_word_code(message, word_start)
+            if match is not None:
+                end, angles = match
+                sequence.append((message[word_start:end], angles))
+                position = end
+            else:
+                sequence.append((message[word_start], char_index.get(message[word_start])))
+                position = word_start + 1
+
+        return sequence
+
+
+# Works out the pulse width for an angle, including dealing with negative angles.
+# The negative angles lets you deal with a motor that you are using for counterclockwise motion.
+def calculate_pulse_width(servo_dict, angle):
+
+    if angle < 0:
+        servo_pulse = servo_dict['high_duty'] + (float(angle / 210) * (servo_dict['high_duty']
+                                                                       - servo_dict['low_duty']))
+
+    else:
+        servo_pulse = int((float(angle / 210) * (servo_dict['high_duty'] - servo_dict['low_duty']))
+                          + servo_dict['low_duty'])
+
+    return int(servo_pulse)
 
 
 # Sets up a Servo and drives it as requested.
 class Servo:
 
-    # Details of how to drive the servo.
-    def __init__(self, servo_dict):
-        self.servo_dict = servo_dict        
-
-    # Drives the servo to a certain angle, including dealing with negative angles.
-    # The negative angles lets you deal with a motor that you are using for counterclockwise motion.
+    # Details of how to drive the servo.  The pulse widths for every whole degree of the servo's travel are
+    # worked out up front.  pi_connection defaults to the shared pigpio connection, which is only made when the
+    # servo is first moved - pass a FakePi to test.
+    def __init__(self, servo_dict, pi_connection=None):
+        self.servo_dict = servo_dict
+        self.pi = pi_connection
+        self.pulse_table = {angle: calculate_pulse_width(servo_dict, angle) for angle in range(-210, 211)}
+        self.current_pulse = None
+        self.writes = 0
+
+    # The pigpio connection, made the first time it is needed.
+    def connection(self):
+        if self.pi is None:
+            self.pi = get_pi()
+        return self.pi
+
+    def pulse_width(self, angle):
+        servo_pulse = self.pulse_table.get(angle)
+        if servo_pulse is None:
+            servo_pulse = calculate_pulse_width(self.servo_dict, angle)
+        return servo_pulse
+
+    # Drives the servo to a certain angle.  Nothing is sent if the servo is already at that pulse width.
+    # Returns whether anything was sent.
     def set_angle(self, angle):
+        return self.set_pulse_width(self.pulse_width(angle))
 
-        if angle < 0:
-            servo_pulse = self.servo_dict['high_duty'] + (float(angle / 210) * (self.servo_dict['high_duty'] 
-                                                                                - self.servo_dict['low_duty']))
+    # Sets the pulse width directly - 0 turns the pulses off.  Returns whether anything was sent.
+    def set_pulse_width(self, servo_pulse):
+        if servo_pulse == self.current_pulse:
+            return False
 
-        else:
-            servo_pulse = int((float(angle / 210) * (self.servo_dict['high_duty'] - self.servo_dict['low_duty'])) 
-                              + self.servo_dict['low_duty'])
+        self.connection().set_servo_pulsewidth(self.servo_dict['pwm_pin'], servo_pulse)
+        self.record_pulse_width(servo_pulse)
+        return True
+
+    # Notes the pulse width the servo has been set to, however it was sent - a change counts as a write.
+    def record_pulse_width(self, servo_pulse):
+        if servo_pulse == self.current_pulse:
+            return
 
-        pi.set_servo_pulsewidth(self.servo_dict['pwm_pin'], int(servo_pulse))
+        self.current_pulse = servo_pulse
+        self.writes += 1
+        instrumentation.count("semaphore_pulse_writes_total")
 
 
 # The flagger, which translates words into flag movements.  Monitors a queue of what needs to be sent.
 class SemaphoreFlagger(threading.Thread):
 
-    def __init__(self, left_servo, right_servo, pause_time, left_offset=0, right_offset=0 ):
+    # max_speed (degrees per second) limits how fast the arms move, None moves them as fast as the servos go.
+    # output is the servo_output.ServoOutput the arms are moved through - one request per servo by default.  With
+    # park the servo pulses are turned off once there is nothing left to signal.
+    # sleep and clock can be replaced to run the flagger in simulated time.
+    def __init__(self, left_servo, right_servo, pause_time, left_offset=0, right_offset=0, max_speed=None,
+                 step_time=0.02, sleep=time.sleep, clock=time.monotonic, output=None, park=False):
         threading.Thread.__init__(self)
 
         self.left_servo = left_servo
@@ -76,59 +230,112 @@ class SemaphoreFlagger(threading.Thread):
         self.left_offset = left_offset
         self.right_offset = right_offset
         self.pause_time = pause_time
-        self.cmd_queue = queue.Queue()
+        self.park = park
+        self.sleep = sleep
+        self.cmd_queue = command_queue.CommandQueue(clock=clock)
         self.semaphore_codes = SemaphoreCodes()
+        self.planner = motion.MotionPlanner(left_servo, right_servo, max_speed=max_speed, step_time=step_time,
+                                            sleep=sleep, output=output)
 
     # calculates the physical angles to use - Left is negative as the servo is inverted
-    def set_physical_angles(self, letter, angles):
+    @staticmethod
+    def physical_angles(angles):
 
         # Left is made negative as the servo is inverted.  0 doesn't work as -1 *0 = 0, so set to -1
-        if angles[1] is 0:
-            physical_left, physical_right = (angles[0], - 1)
+        if angles[1] == 0:
+            return angles[0], - 1
         else:
-            physical_left, physical_right= (angles[0], -1 * angles[1])
+            return angles[0], -1 * angles[1]
+
+    def set_physical_angles(self, letter, angles):
+        physical_left, physical_right = self.physical_angles(angles)
 
         #print("letter {} L= {} R= {}".format(letter, physical_left, physical_right))
 
-        self.left_servo.set_angle(physical_left)
-        self.right_servo.set_angle(physical_right)
+        self.planner.move_to(physical_left, physical_right)
+
+    # Reports what signalling a message would take - daemon round trips and total arm travel - by running it through
+    # a planner that drives a fake pigpio, through the same kind of output, so the arms don't move and nothing sleeps.
+    def estimate_message(self, message):
+        fake_pi = fake_pigpio.FakePi()
+        left_servo = Servo(self.left_servo.servo_dict, fake_pi)
+        right_servo = Servo(self.right_servo.servo_dict, fake_pi)
+        planner = motion.MotionPlanner(left_servo, right_servo, max_speed=self.planner.max_speed,
+                                       step_time=self.planner.step_time, sleep=lambda seconds: None,
+                                       output=type(self.planner.output)(left_servo, right_servo))
+
+        for code, angles in self.semaphore_codes.encode(message):
+            if angles is not None:
+                planner.move_to(*self.physical_angles((angles[0] + self.left_offset, angles[1] + self.right_offset)))
+
+        return planner.report()
+
+    # Publishes the queue's metrics() as gauges - semaphore_queue_depth, semaphore_queue_start_latency (in seconds)
+    # and so on.
+    def export_queue_metrics(self):
+        for name, value in self.cmd_queue.metrics().items():
+            if value is not None:
+                instrumentation.set_gauge("semaphore_queue_{}".format(name), value)
 
     def signal_error(self, char):
         for i in range(5):
             self.set_physical_angles(char, (135 + self.left_offset, 135 + self.right_offset))
-            time.sleep(0.5)
+            self.sleep(0.5)
             self.set_physical_angles(char, (45 + self.left_offset, 45 + self.right_offset))
-            time.sleep(0.5)
+            self.sleep(0.5)
 
-    # This is the over-ridden function for the running of the thread.  It just looks for things to pop up
-    # in its queue and gets the angles set accordingly.
-    def run(self):
+    # Signals one message taken off the queue, letter by letter.  Returns whether it was preempted.
+    # A letter that can't be signalled is put in the priority lane, so the error is flagged straight away, ahead of
+    # anything else waiting, and the rest of the message is dropped.
+    def signal(self, command):
+        preempted = False
 
-        try:
+        if command.kind == self.cmd_queue.PRIORITY:
+            self.signal_error(command.text)
+        else:
+            # Processing each letter or word code.
+            for code, ret_code in self.semaphore_codes.encode(command.text):
 
-            while True:
+                # Stop if the message has been overtaken, e.g. by a newer time or an error.
+                if self.cmd_queue.should_preempt(command):
+                    preempted = True
+                    break
+
+                if ret_code is not None:
+                    self.set_physical_angles(code, (ret_code[0] + self.left_offset,
+                                                    ret_code[1] + self.right_offset))
+                    self.sleep(self.pause_time)
+                else:
+                    print("Error - couldn't find {}".format(code))
+                    self.cmd_queue.put(code, self.cmd_queue.PRIORITY)
+
+        self.cmd_queue.task_done(command, preempted)
+        self.export_queue_metrics()
 
-                # If Queue isn't empty, deal with the string by processing each letter.
-                if not self.cmd_queue.empty():
+        if not preempted:
+            self.sleep(self.pause_time)
 
-                    # Get the string
-                    string = self.cmd_queue.get_nowait()
+            # Nothing else to signal - the arms can rest until the next message.
+            if self.park and self.cmd_queue.depth() == 0:
+                self.planner.output.park()
 
-                    # Processing each letter.
-                    for i in string.upper():
-                        ret_code = self.semaphore_codes.return_flag_angles(i)
+        return preempted
 
-                        if ret_code is not None:
-                            self.set_physical_angles(i, (ret_code[0] + self.left_offset,
-                                                         ret_code[1] + self.right_offset))
-                            time.sleep(self.pause_time)
-                        else:
-                            print("Error - couldn't find {}".format(i))
-                            self.signal_error(i)
+    # This is the over-ridden function for the running of the thread.  It waits for things to pop up
+    # in its queue and gets the angles set accordingly.
+    def run(self):
+
+        try:
+
+            while True:
 
-                    time.sleep(self.pause_time)
+                # Blocks until there is something to signal.
+                command = self.cmd_queue.get()
+                instrumentation.set_gauge("semaphore_queue_depth", self.cmd_queue.depth())
 
-                time.sleep(self.pause_time)
+                with instrumentation.timer("semaphore_message_seconds"):
+                    if self.signal(command):
+                        instrumentation.count("semaphore_preempted_total")
 
         except KeyboardInterrupt:
             pi.set_servo_pulsewidth(self.pwm_pin, self.low_duty)
@@ -179,4 +386,4 @@ if __name__ == "__main__":
 
     finally:
         print("\nTidying up")
-        pi.stop()
+        get_pi().stop()
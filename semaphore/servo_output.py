@@ -0,0 +1,162 @@
+import sys
+import time
+
+import instrumentation
+
+# The script the daemon runs to set both arms at once: p0 and p2 are the pins, p1 and p3 the pulse widths.
+BOTH_SERVOS_SCRIPT = "servo p0 p1 servo p2 p3"
+
+# pigpio's script states (PI_SCRIPT_INITING and PI_SCRIPT_FAILED), so pigpio needn't be imported here.
+SCRIPT_INITING = 0
+SCRIPT_FAILED = 4
+
+
+# Sends the pulse widths for both arms of the flagger.  set_angles() moves both arms to a pose - nothing is sent if
+# neither pulse width has changed - and park() turns the pulses off until the next pose, which takes the load of
+# generating them off the daemon between messages; the arms are light enough to stay where they are.
+# Subclasses decide how the pulse widths get to the daemon, in send() and send_off().
+class ServoOutput:
+
+    def __init__(self, left_servo, right_servo):
+        self.left_servo = left_servo
+        self.right_servo = right_servo
+        self.pulses = None      # (left, right) pulse widths last sent, None if parked or nothing has been sent
+        self.poses = 0
+        self.parks = 0
+
+    # Returns whether anything was sent.
+    def set_angles(self, left_angle, right_angle):
+        pulses = (self.left_servo.pulse_width(left_angle), self.right_servo.pulse_width(right_angle))
+        if pulses == self.pulses:
+            return False
+
+        self.send(pulses)
+        self.pulses = pulses
+        self.poses += 1
+        instrumentation.count("semaphore_output_poses_total")
+        return True
+
+    # Returns whether the pulses were on.
+    def park(self):
+        if self.pulses is None:
+            return False
+
+        self.send_off()
+        self.pulses = None
+        self.parks += 1
+        instrumentation.count("semaphore_output_parks_total")
+        return True
+
+    def send(self, pulses):
+        raise NotImplementedError
+
+    def send_off(self):
+        raise NotImplementedError
+
+    # Requests made to the daemon.
+    def round_trips(self):
+        raise NotImplementedError
+
+
+# The original way: one set_servo_pulsewidth request per arm, only for the arms whose pulse width has changed.
+# The second arm starts moving a round trip after the first.
+class PerServoOutput(ServoOutput):
+
+    def __init__(self, left_servo, right_servo):
+        ServoOutput.__init__(self, left_servo, right_servo)
+        self.requests = 0
+
+    def send(self, pulses):
+        self.requests += self.left_servo.set_pulse_width(pulses[0])
+        self.requests += self.right_servo.set_pulse_width(pulses[1])
+
+    def send_off(self):
+        self.send((0, 0))
+
+    def round_trips(self):
+        return self.requests
+
+
+# Both arms in one request: a script stored in the daemon sets both pulse widths, one straight after the other, so
+# both arms start on the same pulse cycle and every pose costs one round trip instead of two.
+# The script is stored the first time it is needed.  If the daemon won't take it, or running it fails, the output
+# falls back to one request per arm.  pigpio raises pigpio.error when a request fails - pigpio isn't imported here,
+# so any exception counts.  The servos are told the pulse widths the script sets, so they know where they are.
+class ScriptOutput(ServoOutput):
+
+    def __init__(self, left_servo, right_servo, init_timeout=1.0):
+        ServoOutput.__init__(self, left_servo, right_servo)
+        self.init_timeout = init_timeout
+        self.pi = None
+        self.script_id = None
+        self.requests = 0
+        self.fallback = None
+
+    # Stores the script and waits for the daemon to get it ready.  Returns whether it can be used.
+    def store_script(self):
+        self.pi = self.left_servo.connection()
+        try:
+            self.requests += 1
+            self.script_id = self.pi.store_script(BOTH_SERVOS_SCRIPT)
+
+            deadline = time.monotonic() + self.init_timeout
+            status = SCRIPT_INITING if self.script_id >= 0 else SCRIPT_FAILED
+            while status == SCRIPT_INITING and time.monotonic() < deadline:
+                self.requests += 1
+                status = self.pi.script_status(self.script_id)[0]
+            reason = "status {}".format(status)
+        except Exception:
+            status = SCRIPT_FAILED
+            reason = sys.exc_info()[1]
+
+        if status in (SCRIPT_INITING, SCRIPT_FAILED):
+            print("*** Couldn't store the servo script ({}) - sending to each servo separately".format(reason))
+            self.fallback = PerServoOutput(self.left_servo, self.right_servo)
+            return False
+        return True
+
+    def send(self, pulses):
+        if self.script_id is None and self.fallback is None:
+            self.store_script()
+
+        if self.fallback is None:
+            try:
+                self.requests += 1
+                self.pi.run_script(self.script_id, [self.left_servo.servo_dict['pwm_pin'], pulses[0],
+                                                    self.right_servo.servo_dict['pwm_pin'], pulses[1]])
+            except Exception:
+                print("*** Servo script failed ({}) - sending to each servo separately".format(sys.exc_info()[1]))
+                self.fallback = PerServoOutput(self.left_servo, self.right_servo)
+            else:
+                self.left_servo.record_pulse_width(pulses[0])
+                self.right_servo.record_pulse_width(pulses[1])
+                return
+
+        self.fallback.send(pulses)
+
+    def send_off(self):
+        self.send((0, 0))
+
+    def round_trips(self):
+        if self.fallback is not None:
+            return self.requests + self.fallback.round_trips()
+        return self.requests
+
+
+# Records what would be sent instead of sending it, so batching, parking and timing can be checked without a Pi or
+# pigpio.  sends is a list of (timestamp, (left, right) pulse widths) - (0, 0) for a park.
+class RecordingOutput(ServoOutput):
+
+    def __init__(self, left_servo, right_servo, clock=time.monotonic):
+        ServoOutput.__init__(self, left_servo, right_servo)
+        self.clock = clock
+        self.sends = []
+
+    def send(self, pulses):
+        self.sends.append((self.clock(), pulses))
+
+    def send_off(self):
+        self.send((0, 0))
+
+    def round_trips(self):
+        return len(self.sends)
@@ -0,0 +1,4 @@
+from .virtual_clock import VirtualClock
+from .fake_panel import RecordingPanel
+from .fixture_sources import FixtureTflStatus
+from .fixture_sources import FixtureMetWeatherStatus
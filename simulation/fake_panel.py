@@ -0,0 +1,116 @@
+import os
+
+from PIL import Image
+
+from display import epd4in2b
+from display import epdif
+
+
+# A stand-in for the e-paper panel that works out what it would show.  It is an epdif transport: the commands and
+# data the EPD driver sends are decoded into the panel's black and red memory - whole frames and partial windows -
+# and each DISPLAY_REFRESH takes a picture of the screen.  The pictures are saved as PNGs if output_dir is given,
+# along with how many SPI bytes it took to get each one to the panel.
+class RecordingPanel(epdif.FakeTransport):
+
+    def __init__(self, output_dir=None, clock=None, width=epd4in2b.EPD_WIDTH, height=epd4in2b.EPD_HEIGHT):
+        epdif.FakeTransport.__init__(self, record_transfers=False)
+        self.output_dir = output_dir
+        self.clock = clock
+        self.width = width
+        self.height = height
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+        self.memory = {epd4in2b.DATA_START_TRANSMISSION_1: bytearray(b'\xff' * (width * height // 8)),
+                       epd4in2b.DATA_START_TRANSMISSION_2: bytearray(b'\xff' * (width * height // 8))}
+        self.command = None
+        self.parameters = bytearray()
+        self.write_position = 0
+        self.window = None              # (x, y, w, h) while in partial mode
+
+        self.frames = []                # (file name or None, SPI bytes sent for the frame, partial)
+        self.frame_bytes = 0
+        self.frame_partial = False
+        self.last_image = None
+
+    def spi_transfer(self, data):
+        epdif.FakeTransport.spi_transfer(self, data)
+        self.frame_bytes += len(data)
+
+        if self.pins.get(epdif.DC_PIN, epdif.LOW) == epdif.LOW:
+            for command in data:
+                self.start_command(command)
+        else:
+            self.receive_data(data)
+
+    def start_command(self, command):
+        self.command = command
+        self.parameters = bytearray()
+        self.write_position = 0
+
+        if command == epd4in2b.PARTIAL_OUT:
+            self.window = None
+        elif command == epd4in2b.DISPLAY_REFRESH:
+            self.refresh()
+
+    def receive_data(self, data):
+        if self.command in self.memory:
+            if self.window is None:
+                plane = self.memory[self.command]
+                plane[self.write_position:self.write_position + len(data)] = data
+                self.write_position += len(data)
+            else:
+                for value in data:
+                    self.write_window_byte(self.memory[self.command], value)
+        elif self.command == epd4in2b.PARTIAL_WINDOW:
+            self.parameters.extend(data)
+            if len(self.parameters) >= 8:
+                p = self.parameters
+                x_start = (p[0] << 8 | p[1]) & ~0x07
+                x_end = (p[2] << 8 | p[3]) | 0x07
+                y_start = p[4] << 8 | p[5]
+                y_end = p[6] << 8 | p[7]
+                self.window = (x_start, y_start, x_end - x_start + 1, y_end - y_start + 1)
+                self.frame_partial = True
+
+    # Window data comes row by row, a byte per 8 pixels across the window.
+    def write_window_byte(self, plane, value):
+        x, y, w, h = self.window
+        row_bytes = w // 8
+        row, column = divmod(self.write_position, row_bytes)
+        if row < h:
+            plane[(y + row) * (self.width // 8) + x // 8 + column] = value
+        self.write_position += 1
+
+    # What the screen shows: red wins over black, and a 0 bit in either plane is ink.
+    def screen_image(self):
+        black = Image.frombytes('1', (self.width, self.height), bytes(self.memory[epd4in2b.DATA_START_TRANSMISSION_1]))
+        red = Image.frombytes('1', (self.width, self.height), bytes(self.memory[epd4in2b.DATA_START_TRANSMISSION_2]))
+
+        image = Image.new('RGB', (self.width, self.height), (255, 255, 255))
+        image.paste((0, 0, 0), mask=black.point(lambda value: 255 - value))
+        image.paste((200, 0, 0), mask=red.point(lambda value: 255 - value))
+        return image
+
+    def refresh(self):
+        self.last_image = self.screen_image()
+
+        file_name = None
+        if self.output_dir is not None:
+            stamp = ""
+            if self.clock is not None:
+                stamp = "_" + "{:02}{:02}".format(self.clock.localtime().tm_hour, self.clock.localtime().tm_min)
+            file_name = os.path.join(self.output_dir, "frame_{:05}{}.png".format(len(self.frames), stamp))
+            self.last_image.save(file_name)
+
+        self.frames.append((file_name, self.frame_bytes, self.frame_partial))
+        self.frame_bytes = 0
+        self.frame_partial = False
+
+    def report(self):
+        partial = sum(1 for frame in self.frames if frame[2])
+        total_bytes = sum(frame[1] for frame in self.frames)
+        return {"frames": len(self.frames), "partial_frames": partial, "full_frames": len(self.frames) - partial,
+                "spi_bytes": total_bytes,
+                "spi_bytes_per_frame": total_bytes / len(self.frames) if len(self.frames) > 0 else 0}
@@ -0,0 +1,62 @@
+import json
+
+import channels
+
+from met_weather_status import forecast
+from tfl_status import tfl_status
+
+TFL_FIXTURES = ('./simulation/fixtures/tfl_good_service.json', './simulation/fixtures/tfl_disruption.json')
+MET_FIXTURES = ('./met_weather_status/weather_data_json_example.json',)
+
+
+# A data source that serves saved responses instead of asking the real API, so no credentials or network are
+# needed.  It has everything the FetchEngine needs from a source - point status_request_url at a
+# fetch_engine.StubServer serving the same files - and load() publishes a fixture directly for simulations, going
+# round the fixture files in turn, moving on to the next every loads_per_fixture loads.
+class FixtureSource:
+
+    def __init__(self, name, fixture_files, refresh_interval, status_request_url=None, loads_per_fixture=1):
+        self.name = name
+        self.fixture_files = tuple(fixture_files)
+        self.loads_per_fixture = loads_per_fixture
+        self.refresh_interval = refresh_interval
+        self.status_request_url = status_request_url
+        self.cache_ttl = 0
+        self.loads = 0
+
+    def load(self):
+        fixture_number = self.loads // self.loads_per_fixture
+        with open(self.fixture_files[fixture_number % len(self.fixture_files)]) as fixture_file:
+            result = json.load(fixture_file)
+        self.loads += 1
+        self.publish(self.parse_summary_status(result))
+
+
+# TfL line status from fixtures - looks like tfl_status.Tfl_Status to the rest of the clock.
+class FixtureTflStatus(FixtureSource):
+
+    def __init__(self, fixture_files=TFL_FIXTURES, refresh_interval=120, status_request_url=None,
+                 loads_per_fixture=1):
+        FixtureSource.__init__(self, "tfl", fixture_files, refresh_interval, status_request_url, loads_per_fixture)
+        self.status_dictionary = None
+
+    def parse_summary_status(self, result):
+        return tfl_status.parse_line_statuses(result)
+
+    def publish(self, status):
+        self.status_dictionary = channels.freeze(status)
+
+
+# The Met Office forecast from fixtures - looks like met_weather_status.MetWeatherStatus to the rest of the clock.
+class FixtureMetWeatherStatus(FixtureSource):
+
+    def __init__(self, fixture_files=MET_FIXTURES, refresh_interval=120, status_request_url=None,
+                 loads_per_fixture=1):
+        FixtureSource.__init__(self, "met", fixture_files, refresh_interval, status_request_url, loads_per_fixture)
+        self.five_day_forecast = ()
+
+    def parse_summary_status(self, result):
+        return forecast.parse_daily(result)
+
+    def publish(self, five_day_forecast):
+        self.five_day_forecast = five_day_forecast
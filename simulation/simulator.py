@@ -0,0 +1,108 @@
+import time
+
+import main
+from display import epdif
+from semaphore import fake_pigpio
+
+from . import fake_panel
+from . import fixture_sources
+from . import virtual_clock
+
+LEFT_SERVO = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
+RIGHT_SERVO = {'pwm_pin': 27, 'low_duty': 500, 'high_duty': 2500}
+
+
+# Runs the whole clock - SemaphoreClock, the display and the flagger - on simulated hardware in virtual time.
+# The panel is a RecordingPanel, pigpio is a FakePi and the data comes from fixture sources.
+# Rather than running threads, each step does what the clock's threads would do in turn: running whatever the main
+# loop's scheduler has due, a redraw if anything was posted to the display followed by drawing the next minute
+# ahead, and signalling any message that is waiting for the flagger.
+# The flagger's pauses move the virtual clock on, so a message takes as long as it would on the real clock.
+#
+#   python -m simulation.simulator 24 ./simulation_frames
+class Simulation:
+
+    def __init__(self, output_dir=None, start=None, semaphore_interval_min=15, display_interval_min=1,
+                 step_seconds=2):
+        self.clock = virtual_clock.VirtualClock(start)
+        self.step_seconds = step_seconds
+
+        self.panel = fake_panel.RecordingPanel(output_dir, self.clock)
+        epdif.set_transport(self.panel)
+        self.pi = fake_pigpio.FakePi(self.clock.time)
+
+        self.semaphore_clock = main.SemaphoreClock(semaphore_interval_min, display_interval_min, LEFT_SERVO,
+                                                   RIGHT_SERVO, pi_connection=self.pi, clock=self.clock)
+        self.display = self.semaphore_clock.clock_display
+        self.flagger = self.semaphore_clock.semaphore_flagger
+
+        # The tube status changes every half hour.
+        self.sources = [fixture_sources.FixtureTflStatus(loads_per_fixture=15),
+                        fixture_sources.FixtureMetWeatherStatus()]
+        self.semaphore_clock.tfl_status_source, self.semaphore_clock.met_status_source = self.sources
+        self.next_load = {source.name: self.clock.time() for source in self.sources}
+
+        self.steps = 0
+        self.redraws = 0
+        self.render_seconds = 0.0
+        self.messages = 0
+        self.booted = False
+
+    # The boot phases that matter with simulated hardware - there is no daemon to start and no NTP to wait for.
+    def boot(self):
+        self.display.init_panel()
+        self.display.load_fonts()
+        self.booted = True
+
+    def step(self):
+        if not self.booted:
+            self.boot()
+
+        for source in self.sources:
+            if self.clock.time() >= self.next_load[source.name]:
+                source.load()
+                self.next_load[source.name] = self.clock.time() + source.refresh_interval
+
+        self.semaphore_clock.scheduler.run_due()
+
+        if self.display.wakeup.is_set():
+            self.display.wakeup.clear()
+            render_start = time.perf_counter()
+            if self.display.update():
+                self.redraws += 1
+            self.display.prepare_ahead()
+            self.render_seconds += time.perf_counter() - render_start
+
+        command = self.flagger.cmd_queue.get(timeout=0)
+        if command is not None:
+            self.flagger.signal(command)
+            self.messages += 1
+
+        self.clock.sleep(self.step_seconds)
+        self.steps += 1
+
+    # Runs the clock for the given number of virtual hours.
+    def run(self, hours):
+        end = self.clock.time() + hours * 60 * 60
+        while self.clock.time() < end:
+            self.step()
+
+    def report(self):
+        report = {"virtual_hours": (self.clock.time() - self.clock.start) / 3600, "steps": self.steps,
+                  "redraws": self.redraws, "frames_drawn_ahead": self.display.frames_drawn_ahead,
+                  "render_seconds": self.render_seconds, "messages": self.messages,
+                  "pulse_writes": self.pi.round_trips()}
+        report.update(self.panel.report())
+        return report
+
+
+if __name__ == "__main__":
+    import sys
+
+    simulation = Simulation(output_dir=sys.argv[2] if len(sys.argv) > 2 else None)
+    run_start = time.perf_counter()
+    simulation.run(float(sys.argv[1]) if len(sys.argv) > 1 else 24)
+
+    for key, value in simulation.report().items():
+        print("{:20} {}".format(key, round(value, 3) if isinstance(value, float) else value))
+    print("{:20} {:.1f}".format("wall_seconds", time.perf_counter() - run_start))
@@ -0,0 +1,32 @@
+import time
+
+
+# A clock for simulations.  Time only moves when sleep() or advance() is called, and then instantly, so a day of
+# the clock can be run in seconds.  Has the parts of the time module the clock uses, and can be passed as the
+# clock of a SemaphoreClock, a FakePi or a CommandQueue (monotonic).
+class VirtualClock:
+
+    # start is in seconds since the epoch, by default 06:00 local time on the date of the Met Office example data.
+    def __init__(self, start=None):
+        if start is None:
+            start = time.mktime((2018, 5, 20, 6, 0, 0, 0, 0, -1))
+        self.now = float(start)
+        self.start = self.now
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    # Seconds since the clock was created.
+    def monotonic(self):
+        return self.now - self.start
+
+    def localtime(self, seconds=None):
+        return time.localtime(self.now if seconds is None else seconds)
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
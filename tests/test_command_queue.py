@@ -0,0 +1,121 @@
+from semaphore import command_queue
+from semaphore import fake_pigpio
+from semaphore import semaphore
+from simulation.virtual_clock import VirtualClock
+import instrumentation
+
+LEFT_SERVO = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
+RIGHT_SERVO = {'pwm_pin': 27, 'low_duty': 500, 'high_duty': 2500}
+
+MESSAGE = command_queue.CommandQueue.MESSAGE
+TIME = command_queue.CommandQueue.TIME
+PRIORITY = command_queue.CommandQueue.PRIORITY
+
+
+def texts(queue):
+    taken = []
+    while not queue.empty():
+        taken.append(queue.get(timeout=0).text)
+    return taken
+
+
+# Messages come out in the order they went in, and a newer time replaces one still waiting.
+def test_messages_in_order_and_latest_time_wins():
+    queue = command_queue.CommandQueue()
+    queue.put("hello")
+    queue.put("12h 34m ", TIME)
+    queue.put("world")
+    queue.put("12h 35m ", TIME)
+
+    assert texts(queue) == ["hello", "world", "12h 35m "]
+    assert queue.metrics()["replaced"] == 1
+    assert queue.metrics()["max_depth"] == 3
+    assert queue.get(timeout=0) is None
+
+
+def test_without_latest_wins_every_time_is_kept():
+    queue = command_queue.CommandQueue(latest_wins=False)
+    queue.put("12h 34m ", TIME)
+    queue.put("12h 35m ", TIME)
+    assert texts(queue) == ["12h 34m ", "12h 35m "]
+
+
+# The priority lane is taken first, and preempts whatever is being signalled - except another priority message.
+def test_priority_is_taken_first_and_preempts():
+    queue = command_queue.CommandQueue()
+    queue.put("hello")
+    message = queue.get()
+    queue.put("12h 34m ", TIME)
+    time_message = queue.get()
+    assert not queue.should_preempt(message)
+
+    queue.put("%", PRIORITY)
+    queue.put("world")
+    assert queue.should_preempt(message)
+    assert queue.should_preempt(time_message)
+
+    error = queue.get()
+    assert error.kind == PRIORITY
+    queue.put("!", PRIORITY)
+    assert not queue.should_preempt(error)
+    assert texts(queue) == ["!", "world"]
+
+
+# A time is only preempted by a newer time, not by an ordinary message.
+def test_time_is_preempted_by_a_newer_time():
+    queue = command_queue.CommandQueue()
+    queue.put("12h 34m ", TIME)
+    command = queue.get()
+    queue.put("hello")
+    assert not queue.should_preempt(command)
+    queue.put("12h 35m ", TIME)
+    assert queue.should_preempt(command)
+
+
+# Latency is measured from being queued to being started, and to being finished; preempted messages aren't
+# finished, so only count as preempted.
+def test_latency_accounting():
+    clock = VirtualClock(0)
+    queue = command_queue.CommandQueue(clock=clock.monotonic)
+    queue.put("hello")
+    queue.put("world")
+    clock.advance(2)
+    first = queue.get()
+    clock.advance(10)
+    queue.task_done(first)
+    second = queue.get()
+    clock.advance(3)
+    queue.task_done(second, preempted=True)
+
+    metrics = queue.metrics()
+    assert metrics["start_latency"] == (2 + 12) / 2
+    assert metrics["end_to_end_latency"] == 12
+    assert metrics["completed"] == 1 and metrics["preempted"] == 1
+    assert metrics["depth"] == 0
+
+
+# A letter that can't be signalled puts the error in the priority lane: the rest of the message is dropped, the
+# error is signalled next, ahead of anything else waiting, and the queue's metrics are published.
+def test_error_goes_through_the_priority_lane():
+    clock = VirtualClock(0)
+    pi = fake_pigpio.FakePi()
+    flagger = semaphore.SemaphoreFlagger(semaphore.Servo(LEFT_SERVO, pi), semaphore.Servo(RIGHT_SERVO, pi), 1,
+                                         sleep=clock.sleep, clock=clock.monotonic)
+    flagger.cmd_queue.put("a%b")
+    flagger.cmd_queue.put("hello")
+
+    instrumentation.enable()
+    try:
+        assert flagger.signal(flagger.cmd_queue.get())
+        error = flagger.cmd_queue.get()
+        assert (error.text, error.kind) == ("%", PRIORITY)
+        assert not flagger.signal(error)
+        gauges = instrumentation.registry.snapshot()["gauges"]
+    finally:
+        instrumentation.disable()
+
+    assert flagger.cmd_queue.get().text == "hello"
+    assert flagger.cmd_queue.metrics()["preempted"] == 1
+    assert gauges["semaphore_queue_completed"] == 1
+    assert gauges["semaphore_queue_preempted"] == 1
+    assert gauges["semaphore_queue_depth"] == 1
@@ -0,0 +1,138 @@
+import datetime
+import time
+
+from display import display
+from display import epd4in2b
+from display import epdif
+from met_weather_status import forecast
+import instrumentation
+
+START_TIME = 1700000000
+
+
+def make_display():
+    transport = epdif.FakeTransport()
+    epdif.set_transport(transport)
+    clock_display = display.ClockDisplay()
+    clock_display.post_time(time.localtime(START_TIME))
+    assert clock_display.update()
+    return clock_display, transport
+
+
+# The registry is shared by every test, so counters are compared before and after.
+def counter_increase(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+# A frame that is already on the panel isn't sent again, and the refresh it would have taken is counted as saved.
+def test_identical_frame_is_skipped_and_the_time_saved_counted():
+    clock_display, transport = make_display()
+    transfers = len(transport.transfers)
+
+    before = instrumentation.registry.snapshot()["counters"]
+    instrumentation.enable()
+    try:
+        clock_display.write_display()
+        after = instrumentation.registry.snapshot()["counters"]
+    finally:
+        instrumentation.disable()
+
+    assert len(transport.transfers) == transfers
+    assert clock_display.skipped_refreshes == 1
+    assert clock_display.update_count == 1
+    saved = clock_display.refresh_seconds if clock_display.refresh_seconds is not None \
+        else display.REFRESH_SECONDS_ESTIMATE
+    assert clock_display.panel_time_saved == saved
+    assert counter_increase(before, after, "display_skipped_refreshes_total") == 1
+    assert counter_increase(before, after, "display_panel_time_saved_seconds_total") == saved
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def five_day_forecast():
+    return tuple(forecast.DayForecast(datetime.date(2023, 11, 14 + day), 1, 7, 12, 4, 10, 40) for day in range(5))
+
+
+# The display thread sleeps until something is posted, and a TfL status on its own is drawn without waiting for
+# the next minute.
+def test_display_thread_wakes_when_an_update_is_posted():
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+    clock_display = display.ClockDisplay()
+    clock_display.daemon = True
+    clock_display.start()
+
+    time.sleep(0.2)
+    assert clock_display.update_count == 0
+    assert not clock_display.wakeup.is_set()
+
+    clock_display.post_time(time.localtime(START_TIME))
+    assert wait_for(lambda: clock_display.update_count == 1)
+
+    clock_display.post_tfl_status({"Jubilee": "Severe Delays"})
+    assert wait_for(lambda: clock_display.update_count == 2)
+    assert clock_display.line_status.line_list[clock_display.line_status.line_index["Jubilee"]][2] == "SEV.D"
+
+
+# Everything posted while the display is busy is drawn together in one update, and the mailboxes are left empty.
+def test_updates_posted_together_are_drawn_once():
+    clock_display, transport = make_display()
+
+    clock_display.post_time(time.localtime(START_TIME + 60))
+    clock_display.post_tfl_status({"Central": "Minor Delays"})
+    clock_display.post_tfl_status({"Central": "Part Suspended"})
+    clock_display.post_met_forecast(five_day_forecast())
+
+    assert clock_display.update()
+    assert clock_display.update_count == 2
+    assert clock_display.layout.slots["time"].content == time.strftime("%H:%M", time.localtime(START_TIME + 60))
+    assert clock_display.layout.slots["tfl_1"].content == ("CEN P.SUS", "red")
+    assert clock_display.layout.slots["weather"].content[0] == "Tue"
+
+    assert clock_display.time_mailbox.take() is None
+    assert clock_display.tfl_status_mailbox.take() is None
+    assert clock_display.met_forecast_mailbox.take() is None
+    assert not clock_display.update()
+
+
+# Only the lines whose status has changed are reported, in display order; lines TfL doesn't report, and ones the
+# clock doesn't show, are left alone.
+def test_line_status_reports_the_lines_that_changed():
+    line_status = display.LineStatus()
+    everything_good = {line[0]: "Good Service" for line in line_status.line_list}
+    assert line_status.fill_line_status(everything_good) == list(range(len(line_status.line_list)))
+    assert line_status.fill_line_status(everything_good) == []
+
+    changed = line_status.fill_line_status({"Victoria": "Severe Delays", "Central": "Good Service",
+                                            "Bakerloo": "Reduced Service", "Elizabeth": "Severe Delays"})
+    assert changed == [line_status.line_index["Bakerloo"], line_status.line_index["Victoria"]]
+    assert line_status.line_list[line_status.line_index["Victoria"]][2] == "SEV.D"
+    assert line_status.line_list[line_status.line_index["Bakerloo"]][2] == "Reduced Service"
+    assert line_status.line_list[line_status.line_index["Central"]][2] == "OK"
+
+
+# A line changing status is redrawn on its own, as a partial refresh, without waiting for the next minute.
+def test_status_change_redraws_only_that_line():
+    clock_display, transport = make_display()
+    everything_good = {line[0]: "Good Service" for line in clock_display.line_status.line_list}
+    clock_display.post_tfl_status(everything_good)
+    assert clock_display.update()
+
+    sent = len(transport.transfers)
+    clock_display.post_tfl_status(dict(everything_good, Jubilee="Severe Delays"))
+    assert clock_display.update()
+    assert bytes([epd4in2b.PARTIAL_WINDOW]) in [data for dc, data in transport.transfers[sent:]]
+    jubilee = clock_display.line_status.line_index["Jubilee"]
+    assert clock_display.layout.slots["tfl_{}".format(jubilee)].content == ("JUB SEV.D", "red")
+    assert clock_display.layout.repaints == 3
+
+    transfers = len(transport.transfers)
+    clock_display.post_tfl_status(dict(everything_good, Jubilee="Severe Delays"))
+    assert not clock_display.update()
+    assert len(transport.transfers) == transfers
@@ -0,0 +1,53 @@
+import time
+
+from display import epd4in2b
+from display import epdif
+
+REFRESH_SECONDS = 0.2
+
+
+def panel(edge_events):
+    transport = epdif.FakeTransport(record_transfers=False, busy_times={epd4in2b.DISPLAY_REFRESH: REFRESH_SECONDS},
+                                    edge_events=edge_events)
+    epdif.set_transport(transport)
+    return epd4in2b.EPD()
+
+
+# The refresh time is how long the panel was busy, not how long until the next frame came along.
+def test_refresh_time_from_the_edge_when_the_next_frame_is_late():
+    epd = panel(edge_events=True)
+    epd.refresh(wait=False)
+    time.sleep(REFRESH_SECONDS * 4)
+    epd.wait_if_refreshing()
+
+    assert abs(epd.last_refresh_seconds - REFRESH_SECONDS) < 0.02
+
+
+def test_refresh_time_from_polling_when_the_wait_blocks():
+    epd = panel(edge_events=False)
+    epd.refresh(wait=False)
+    epd.wait_if_refreshing()
+
+    assert REFRESH_SECONDS - 0.02 < epd.last_refresh_seconds < REFRESH_SECONDS + 2 * epdif.BUSY_POLL_MS / 1000
+
+
+# Polling that finds the panel idle already can't say when it finished, so no time is given.
+def test_no_refresh_time_when_polling_finds_the_panel_idle():
+    epd = panel(edge_events=False)
+    epd.refresh(wait=False)
+    time.sleep(REFRESH_SECONDS * 2)
+    epd.wait_if_refreshing()
+
+    assert epd.last_refresh_seconds is None
+    assert not epd.refreshing
+
+
+def test_waiting_for_the_refresh_lets_the_next_frame_be_drawn_meanwhile():
+    epd = panel(edge_events=True)
+    start = time.monotonic()
+    epd.refresh(wait=False)
+    assert time.monotonic() - start < REFRESH_SECONDS / 2
+    assert epd.refreshing
+
+    epd.wait_if_refreshing()
+    assert time.monotonic() - start >= REFRESH_SECONDS - 0.01
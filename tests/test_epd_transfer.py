@@ -0,0 +1,21 @@
+import random
+
+from display import epd4in2b
+from display import epdif
+
+
+def test_bulk_transfer_sends_the_same_bytes_in_fewer_calls():
+    plane = bytes(random.Random(1).randrange(256) for i in range(epd4in2b.EPD_WIDTH * epd4in2b.EPD_HEIGHT // 8))
+
+    sent = {}
+    for bulk in (False, True):
+        transport = epdif.FakeTransport()
+        epdif.set_transport(transport)
+        epd4in2b.EPD(bulk_transfer=bulk).display_frame(plane, plane)
+        sent[bulk] = transport
+
+    assert sent[True].data_bytes() == sent[False].data_bytes()
+    assert plane * 2 in sent[True].data_bytes()
+    assert sent[True].spi_calls < sent[False].spi_calls / 100
+    assert all(len(data) <= epdif.SPI_CHUNK_SIZE for dc, data in sent[True].transfers)
+
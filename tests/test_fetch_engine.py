@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import time
+
+import aiohttp
+
+import fetch_engine
+from fetch_engine import stub_server
+
+FIXTURE = './simulation/fixtures/tfl_good_service.json'
+MET_FIXTURE = './met_weather_status/weather_data_json_example.json'
+
+
+# A source that keeps what is published.  TfL responses are lists, Met Office ones have a SiteRep - any other
+# dictionary can't be parsed.
+class RecordingSource:
+
+    def __init__(self, url, name="test"):
+        self.name = name
+        self.status_request_url = url
+        self.refresh_interval = 60
+        self.cache_ttl = 0
+        self.published = []
+
+    def parse_summary_status(self, result):
+        if isinstance(result, dict):
+            return sorted(result["SiteRep"])
+        return len(result)
+
+    def publish(self, data):
+        self.published.append(data)
+
+
+def fixture_etag():
+    with open(FIXTURE, 'rb') as fixture_file:
+        return '"{}"'.format(hashlib.md5(fixture_file.read()).hexdigest())
+
+
+def run_fetches(engine, source, count):
+    async def fetches():
+        async with aiohttp.ClientSession() as session:
+            engine.session = session
+            return [await engine.fetch(source) for fetch in range(count)]
+
+    return asyncio.run(fetches())
+
+
+def start_stub():
+    stub = stub_server.StubServer({"/tfl": FIXTURE})
+    stub.start()
+    return stub
+
+
+# The cached copy was too old to warm start with, and the server says it hasn't changed: it is published then.
+def test_not_modified_publishes_the_cached_copy_when_nothing_has_been_published(tmp_path):
+    stub = start_stub()
+    try:
+        with open(FIXTURE) as fixture_file:
+            body = json.load(fixture_file)
+
+        cache = fetch_engine.ResponseCache(str(tmp_path))
+        cache.store("test", body, fixture_etag())
+        cache.entries["test"]["fetched_at"] = time.time() - 2 * 24 * 60 * 60
+
+        source = RecordingSource(stub.url("/tfl"))
+        engine = fetch_engine.FetchEngine([source], cache=cache)
+        engine.publish_cached()
+        assert source.published == []
+
+        assert run_fetches(engine, source, 2) == [True, True]
+        assert cache.not_modified == 2
+        assert source.published == [len(body)]
+    finally:
+        stub.stop()
+
+
+# A cached copy that can't be parsed is asked for again in full rather than revalidated for ever.
+def test_unparseable_cached_copy_is_fetched_again_in_full(tmp_path):
+    stub = start_stub()
+    try:
+        cache = fetch_engine.ResponseCache(str(tmp_path))
+        cache.store("test", {"not": "lines"}, fixture_etag())
+
+        source = RecordingSource(stub.url("/tfl"))
+        engine = fetch_engine.FetchEngine([source], cache=cache)
+
+        assert run_fetches(engine, source, 2) == [False, True]
+        assert "If-None-Match" in stub.requests[0][1]
+        assert "If-None-Match" not in stub.requests[1][1]
+        assert len(source.published) == 1
+    finally:
+        stub.stop()
+
+
+# A copy within its TTL isn't fetched - but if nothing has been published yet, the copy is published.
+def test_fresh_copy_is_published_when_nothing_has_been_published(tmp_path):
+    stub = start_stub()
+    try:
+        with open(FIXTURE) as fixture_file:
+            body = json.load(fixture_file)
+
+        cache = fetch_engine.ResponseCache(str(tmp_path))
+        cache.store("test", body, fixture_etag())
+
+        source = RecordingSource(stub.url("/tfl"))
+        source.cache_ttl = 600
+        engine = fetch_engine.FetchEngine([source], cache=cache)
+
+        assert run_fetches(engine, source, 2) == [True, True]
+        assert cache.hits == 2
+        assert stub.requests == []
+        assert source.published == [len(body)]
+    finally:
+        stub.stop()
+
+
+# A copy within its TTL that can't be parsed is fetched again in full straight away.
+def test_unparseable_fresh_copy_is_fetched_in_full(tmp_path):
+    stub = start_stub()
+    try:
+        cache = fetch_engine.ResponseCache(str(tmp_path))
+        cache.store("test", {"not": "lines"}, fixture_etag())
+
+        source = RecordingSource(stub.url("/tfl"))
+        source.cache_ttl = 600
+        engine = fetch_engine.FetchEngine([source], cache=cache)
+
+        assert run_fetches(engine, source, 1) == [True]
+        assert len(stub.requests) == 1
+        assert "If-None-Match" not in stub.requests[0][1]
+        assert len(source.published) == 1
+    finally:
+        stub.stop()
+
+# Both sources are fetched and published by the one engine thread, and it stops when asked.
+def test_engine_fetches_every_source(tmp_path):
+    stub = stub_server.StubServer({"/tfl": FIXTURE, "/met": MET_FIXTURE})
+    stub.start()
+    try:
+        tfl = RecordingSource(stub.url("/tfl"), "tfl")
+        met = RecordingSource(stub.url("/met"), "met")
+        engine = fetch_engine.FetchEngine([tfl, met], cache=fetch_engine.ResponseCache(str(tmp_path)))
+        engine.daemon = True
+        engine.start()
+
+        deadline = time.monotonic() + 10
+        while (not tfl.published or not met.published) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        engine.stop()
+        engine.join(5)
+
+        assert len(tfl.published) == 1 and len(met.published) == 1
+        assert engine.fetches == {"tfl": 1, "met": 1}
+        assert not engine.is_alive()
+    finally:
+        stub.stop()
+
+
+# A source that can't take the data the first time it is given it.
+class FailingSource(RecordingSource):
+
+    def __init__(self, url):
+        RecordingSource.__init__(self, url)
+        self.attempts = 0
+
+    def publish(self, data):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise RuntimeError("display not ready")
+        RecordingSource.publish(self, data)
+
+
+# An error fetch doesn't expect - here from publishing - backs the source off rather than ending its polling.
+def test_unexpected_error_backs_off_and_polling_goes_on():
+    stub = start_stub()
+    try:
+        source = FailingSource(stub.url("/tfl"))
+        fetch_scheduler = fetch_engine.FetchScheduler(base_backoff=0.05, jitter=0)
+        engine = fetch_engine.FetchEngine([source], fetch_scheduler=fetch_scheduler)
+        engine.daemon = True
+        engine.start()
+
+        deadline = time.monotonic() + 10
+        while not source.published and time.monotonic() < deadline:
+            time.sleep(0.05)
+        engine.stop()
+        engine.join(5)
+
+        assert len(source.published) == 1
+        assert engine.failures["test"] == 1
+        assert engine.fetches["test"] == 2
+        assert fetch_scheduler.schedules["test"].failures == 0
+    finally:
+        stub.stop()
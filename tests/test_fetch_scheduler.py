@@ -0,0 +1,54 @@
+from fetch_engine import FetchScheduler
+
+
+class FakeClock:
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_success_lines_the_fetch_up_to_finish_before_a_boundary():
+    clock = FakeClock(1000.0)
+    fetch_scheduler = FetchScheduler(align_period=60, lead=2, clock=clock)
+    fetch_scheduler.add_source("tfl", 60)
+    fetch_scheduler.record_fetch_time("tfl", 3.0)
+
+    fetch_scheduler.record_success("tfl")
+
+    # Due no sooner than an interval on, and finishing 2 s before the boundary at 1080.
+    assert fetch_scheduler.schedules["tfl"].next_due == 1080 - 2 - 3.0
+    assert fetch_scheduler.delay_until_due("tfl") == 75.0
+
+
+def test_failures_back_off_exponentially_up_to_the_limit():
+    clock = FakeClock(0.0)
+    fetch_scheduler = FetchScheduler(base_backoff=5, max_backoff=60, jitter=0.5, clock=clock,
+                                     random_fraction=lambda: 0.5)
+    fetch_scheduler.add_source("met", 600)
+
+    delays = []
+    for failure in range(6):
+        fetch_scheduler.record_failure("met")
+        delays.append(fetch_scheduler.delay_until_due("met"))
+
+    assert delays == [5, 10, 20, 40, 60, 60]
+
+    fetch_scheduler.record_success("met")
+    assert fetch_scheduler.schedules["met"].failures == 0
+
+
+def test_jitter_spreads_the_backoff():
+    fetch_scheduler = FetchScheduler(base_backoff=10, jitter=0.5, random_fraction=lambda: 0.0)
+    assert fetch_scheduler.backoff(1) == 7.5
+
+    fetch_scheduler.random_fraction = lambda: 1.0
+    assert fetch_scheduler.backoff(1) == 12.5
+
+
+def test_a_source_never_fetched_is_due_straight_away():
+    fetch_scheduler = FetchScheduler()
+    fetch_scheduler.add_source("tfl", 60)
+    assert fetch_scheduler.delay_until_due("tfl") == 0
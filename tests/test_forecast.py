@@ -0,0 +1,29 @@
+import json
+
+from met_weather_status import forecast
+
+EXAMPLE_FILE = './met_weather_status/weather_data_json_example.json'
+
+
+def example_forecast():
+    with open(EXAMPLE_FILE) as example_file:
+        return forecast.parse_daily(json.load(example_file))
+
+
+# The example feed parses to five days of numbers, and each day's text is worked out once.
+def test_parse_daily_and_display_text():
+    days = example_forecast()
+    assert len(days) == 5
+    assert all(isinstance(day.high_temp, int) and isinstance(day.day_weather_type, int) for day in days)
+
+    text = days[0].display_text()
+    assert len(text) == 3
+    assert text[0] == days[0].date.strftime("%a")
+    assert text[1].endswith("{}%".format(days[0].prob_ppt_day))
+    assert example_forecast()[0].display_text() is text
+
+
+def test_streamed_periods_match_the_daily_forecast():
+    with open(EXAMPLE_FILE) as example_file:
+        periods = list(forecast.iter_periods(example_file))
+    assert [forecast.parse_date(period["value"]) for period in periods] == [day.date for day in example_forecast()]
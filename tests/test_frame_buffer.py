@@ -0,0 +1,44 @@
+import random
+
+from PIL import Image
+
+from display import epd4in2b
+from simulation import simulator
+
+
+def random_image(seed):
+    generator = random.Random(seed)
+    image = Image.new('1', (epd4in2b.EPD_WIDTH, epd4in2b.EPD_HEIGHT), 255)
+    image.putdata([generator.choice((0, 255)) for pixel in range(epd4in2b.EPD_WIDTH * epd4in2b.EPD_HEIGHT)])
+    return image
+
+
+# Every bit position in every byte, both ways round.
+def test_packing_matches_the_per_pixel_loop_on_random_pixels():
+    epd = epd4in2b.EPD()
+    for seed in range(2):
+        image = random_image(seed)
+        packed = epd.get_frame_buffer(image)
+        assert isinstance(packed, bytes)
+        assert packed == bytes(epd.get_frame_buffer_reference(image))
+
+
+# The black and red planes of a real screen, as the clock draws them.
+def test_packing_matches_the_per_pixel_loop_for_both_planes():
+    simulation = simulator.Simulation()
+    simulation.step()
+    display = simulation.display
+    epd = display.epd
+
+    for image in (display.image_black, display.image_red):
+        assert epd.get_frame_buffer(image) == bytes(epd.get_frame_buffer_reference(image))
+    assert display.image_red.getbbox() is not None
+
+
+def test_wrong_size_image_is_refused():
+    epd = epd4in2b.EPD()
+    try:
+        epd.get_frame_buffer(Image.new('1', (10, 10)))
+    except ValueError:
+        return
+    raise AssertionError("a 10x10 image was packed")
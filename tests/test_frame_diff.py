@@ -0,0 +1,67 @@
+from display import epd4in2b
+from display import epdif
+from display import frame_diff
+
+WIDTH = epd4in2b.EPD_WIDTH
+HEIGHT = epd4in2b.EPD_HEIGHT
+ROW_BYTES = WIDTH // 8
+
+
+def blank_frame():
+    return bytearray(b'\xff' * (ROW_BYTES * HEIGHT))
+
+
+def set_byte(frame, x, y, value=0x00):
+    frame[y * ROW_BYTES + x // 8] = value
+
+
+def test_same_frames_have_no_regions():
+    frame = blank_frame()
+    assert frame_diff.changed_regions((frame,), (bytes(frame),), WIDTH, HEIGHT) == []
+
+
+def test_one_change_is_one_byte_wide_window():
+    old = blank_frame()
+    new = blank_frame()
+    set_byte(new, 300, 10)
+
+    assert frame_diff.changed_regions((old,), (new,), WIDTH, HEIGHT) == [(296, 10, 8, 1)]
+
+
+def test_nearby_rows_merge_and_distant_rows_do_not():
+    old = blank_frame()
+    new = blank_frame()
+    set_byte(new, 16, 20)
+    set_byte(new, 64, 25)
+    set_byte(new, 200, 100)
+
+    regions = frame_diff.changed_regions((old,), (new,), WIDTH, HEIGHT, merge_gap=8)
+
+    assert regions == [(16, 20, 56, 6), (200, 100, 8, 1)]
+    assert frame_diff.region_area(regions) == 56 * 6 + 8
+
+
+# A change in either plane counts, and the box covers both.
+def test_regions_cover_both_planes():
+    old_black, old_red = blank_frame(), blank_frame()
+    new_black, new_red = blank_frame(), blank_frame()
+    set_byte(new_black, 40, 50)
+    set_byte(new_red, 80, 52)
+
+    regions = frame_diff.changed_regions((old_black, old_red), (new_black, new_red), WIDTH, HEIGHT)
+
+    assert regions == [(40, 50, 48, 3)]
+
+
+# Windows past x = 255 need the high byte of the start and end columns.
+def test_partial_window_past_column_255():
+    transport = epdif.FakeTransport()
+    epdif.set_transport(transport)
+    epd = epd4in2b.EPD()
+
+    epd.set_partial_window(bytes(16 * 4), bytes(16 * 4), 296, 10, 32, 4)
+
+    command_at = [data for dc, data in transport.transfers].index(bytes([epd4in2b.PARTIAL_WINDOW]))
+    window = b''.join(data for dc, data in transport.transfers[command_at + 1:command_at + 10])
+    x_end = 296 + 32 - 1
+    assert window == bytes([1, 296 & 0xff, x_end >> 8, x_end & 0xff, 0, 10, 0, 13, 1])
@@ -0,0 +1,87 @@
+from PIL import Image
+from PIL import ImageChops
+from PIL import ImageFont
+
+from display import layout
+from display import text_cache
+
+MAIN_FONT = './display/HammersmithOne-Regular.ttf'
+WIDTH = 400
+HEIGHT = 300
+
+
+def blank():
+    return Image.new('1', (WIDTH, HEIGHT), 255), Image.new('1', (WIDTH, HEIGHT), 255)
+
+
+def make_layout():
+    font = ImageFont.truetype(MAIN_FONT, 30)
+    screen = layout.Layout(text_cache.TextMaskCache())
+    screen.add_slot("title", layout.centred(font, 300, layout.BLACK, HEIGHT))
+    for row in range(3):
+        screen.add_slot("row_{}".format(row), layout.fixed(font, (200 - row * 35, 0)))
+    return screen
+
+
+def same(image, other):
+    return ImageChops.difference(image, other).getbbox() is None
+
+
+# Sizes are measured once for each font and text.
+def test_text_metrics_are_cached():
+    font = ImageFont.truetype(MAIN_FONT, 30)
+    metrics = layout.TextMetrics()
+    assert metrics.size(font, "BAK OK") == font.getsize("BAK OK")
+    assert metrics.size(font, "BAK OK") == font.getsize("BAK OK")
+    assert (metrics.hits, metrics.misses) == (1, 1)
+
+
+# Setting a slot to what it already shows doesn't mark it dirty, and a render with nothing dirty draws nothing.
+def test_unchanged_content_is_not_redrawn():
+    screen = make_layout()
+    image_black, image_red = blank()
+    screen.set("title", "Sun 20 05 2018")
+    screen.set("row_0", ("BAK OK", layout.BLACK))
+    screen.render(image_black, image_red)
+    repaints = screen.repaints
+
+    assert not screen.set("title", "Sun 20 05 2018")
+    assert not screen.dirty()
+    assert screen.render(image_black, image_red) == []
+    assert screen.repaints == repaints
+
+
+# After any run of changes, the kept images are the same as drawing the screen again from scratch - including a
+# slot that is emptied and one that moves to the other colour.
+def test_render_matches_drawing_from_scratch():
+    screen = make_layout()
+    image_black, image_red = blank()
+    changes = [{"title": "Sun 20 05 2018", "row_0": ("BAK OK", layout.BLACK), "row_1": ("CEN OK", layout.BLACK)},
+               {"row_1": ("CEN SEV.D", layout.RED)},
+               {"title": "Mon 21 05 2018", "row_2": ("JUB MIN.D", layout.RED)},
+               {"row_0": None, "row_1": ("CEN OK", layout.BLACK)}]
+
+    for change in changes:
+        for name, content in change.items():
+            screen.set(name, content)
+        screen.render(image_black, image_red)
+
+        fresh = make_layout()
+        for name, slot in screen.slots.items():
+            fresh.set(name, slot.content)
+        fresh_black, fresh_red = blank()
+        fresh.render(fresh_black, fresh_red)
+
+        assert same(image_black, fresh_black) and same(image_red, fresh_red), change
+
+
+# A copy can be drawn on without changing the layout it came from.
+def test_copy_leaves_the_original_alone():
+    screen = make_layout()
+    screen.set("title", "Sun 20 05 2018")
+    screen.render(*blank())
+
+    other = screen.copy()
+    other.set("title", "Mon 21 05 2018")
+    assert other.dirty() and not screen.dirty()
+    assert screen.slots["title"].content == "Sun 20 05 2018"
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from channels import Mailbox
+from channels import freeze
+
+
+def test_take_returns_each_value_once():
+    mailbox = Mailbox()
+    assert mailbox.take() is None
+
+    mailbox.put(1)
+    assert mailbox.take() == 1
+    assert mailbox.take() is None
+    assert mailbox.peek() == 1
+
+
+# A consumer that falls behind only sees the newest value.
+def test_put_replaces_what_has_not_been_taken():
+    mailbox = Mailbox()
+    for value in range(5):
+        mailbox.put(value)
+
+    assert mailbox.take() == 4
+    assert mailbox.take() is None
+
+
+# The same value put again is a new letter, and is taken again.
+def test_same_value_put_twice_is_taken_twice():
+    mailbox = Mailbox()
+    mailbox.put("12:34")
+    assert mailbox.take() == "12:34"
+    mailbox.put("12:34")
+    assert mailbox.take() == "12:34"
+    assert mailbox.letter.version == 2
+
+
+def test_put_sets_the_shared_wakeup():
+    wakeup = threading.Event()
+    first, second = Mailbox(wakeup), Mailbox(wakeup)
+
+    second.put("x")
+    assert wakeup.is_set()
+    wakeup.clear()
+    first.put("y")
+    assert wakeup.is_set()
+
+
+def test_values_are_frozen():
+    mailbox = Mailbox()
+    mailbox.put({"Central": "Good Service"})
+    with pytest.raises(TypeError):
+        mailbox.take()["Central"] = "Closed"
+
+    mailbox.put([1, 2])
+    assert mailbox.take() == (1, 2)
+    assert freeze("text") == "text"
+
+
+# Values put from another thread while this one is taking are never lost for good: the last one is always taken.
+def test_last_value_from_another_thread_is_taken():
+    mailbox = Mailbox()
+    putter = threading.Thread(target=lambda: [mailbox.put(value) for value in range(10000)])
+    putter.start()
+
+    taken = []
+    while putter.is_alive():
+        value = mailbox.take()
+        if value is not None:
+            taken.append(value)
+    putter.join()
+    value = mailbox.take()
+    if value is not None:
+        taken.append(value)
+
+    assert taken[-1] == 9999
+    assert taken == sorted(taken)
+
+
+# take() returns None for nothing new, so None can't be put - it would look like nothing had been.
+def test_none_is_refused():
+    mailbox = Mailbox()
+    mailbox.put("first")
+    with pytest.raises(ValueError):
+        mailbox.put(None)
+    assert mailbox.take() == "first"
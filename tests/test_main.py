@@ -0,0 +1,59 @@
+import time
+
+import main
+from display import epdif
+from semaphore import fake_pigpio
+from simulation.virtual_clock import VirtualClock
+
+LEFT_SERVO = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
+RIGHT_SERVO = {'pwm_pin': 27, 'low_duty': 500, 'high_duty': 2500}
+
+
+def semaphore_clock():
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+    clock = VirtualClock(time.mktime((2018, 5, 20, 22, 28, 30, 0, 0, -1)))
+    return main.SemaphoreClock(15, 1, LEFT_SERVO, RIGHT_SERVO, pi_connection=fake_pigpio.FakePi(), clock=clock)
+
+
+# Without the data sources (the data phase failed) or pigpio, the main loop's jobs carry on with what there is.
+def test_jobs_run_without_data_or_pigpio():
+    clock = semaphore_clock()
+    clock.display_ready = False
+    clock.boot.errors["data"] = RuntimeError("no credentials")
+    clock.boot.errors["pigpio"] = RuntimeError("no daemon")
+    clock.check_boot_errors()
+
+    for tick in range(40):
+        clock.clock.sleep(clock.scheduler.run_due())
+
+    stats = clock.scheduler.stats()
+    assert all(job["failures"] == 0 for job in stats.values())
+    assert stats["sources"]["runs"] > 1 and stats["semaphore"]["runs"] == 1
+    assert clock.semaphore_flagger.cmd_queue.depth() == 0
+
+
+class StatusSource:
+
+    def __init__(self):
+        self.status_dictionary = None
+
+
+# The TfL status goes to the display only when it has changed - a status the display already has isn't posted.
+def test_only_changed_statuses_are_posted():
+    clock = semaphore_clock()
+    source = clock.tfl_status_source = StatusSource()
+    mailbox = clock.clock_display.tfl_status_mailbox
+    now = clock.clock.localtime()
+
+    clock.check_sources(now)
+    assert mailbox.letter.version == 0
+
+    source.status_dictionary = {"Jubilee": "Good Service"}
+    clock.check_sources(now)
+    clock.check_sources(now)
+    assert mailbox.letter.version == 1
+
+    source.status_dictionary = {"Jubilee": "Severe Delays"}
+    clock.check_sources(now)
+    assert mailbox.letter.version == 2
+    assert mailbox.take() == {"Jubilee": "Severe Delays"}
@@ -0,0 +1,63 @@
+from semaphore import fake_pigpio
+from semaphore import motion
+from semaphore import semaphore
+
+LEFT_SERVO = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
+RIGHT_SERVO = {'pwm_pin': 27, 'low_duty': 500, 'high_duty': 2500}
+
+MOVES = [(-1, 0), (-180, 180), (-45, 45), (-46, 44), (-135, 0), (-1, 90), (-180, 0), (-90, 90)]
+
+
+def planner(max_speed, step_time=0.02):
+    pi = fake_pigpio.FakePi()
+    return motion.MotionPlanner(semaphore.Servo(LEFT_SERVO, pi), semaphore.Servo(RIGHT_SERVO, pi),
+                                max_speed=max_speed, step_time=step_time, sleep=lambda seconds: None)
+
+
+# Neither arm moves further in a step than max_speed allows - not even in the middle of a move, where the easing
+# is fastest - and every move ends exactly on its target.
+def test_steps_stay_within_max_speed_and_end_on_the_target():
+    for max_speed, step_time in ((200, 0.02), (90, 0.02), (333, 0.015), (1000, 0.02)):
+        arms = planner(max_speed, step_time)
+        limit = max_speed * step_time
+        arms.move_to(*MOVES[0])
+
+        for target in MOVES[1:]:
+            start = arms.position
+            steps = arms.plan_move(*target)
+
+            assert steps[-1] == target
+            for before, after in zip([start] + steps[:-1], steps):
+                assert abs(after[0] - before[0]) <= limit, (max_speed, target)
+                assert abs(after[1] - before[1]) <= limit, (max_speed, target)
+            arms.move_to(*target)
+            assert arms.position == target
+
+
+# Without a speed limit, and for the first move (when where the arms are isn't known), the arms go straight there.
+def test_unlimited_and_first_moves_are_one_step():
+    assert planner(None).plan_move(-180, 180) == [(-180, 180)]
+    assert planner(200).plan_move(-180, 180) == [(-180, 180)]
+
+
+# Moves that don't go anywhere take one step and leave the servos alone.
+def test_move_to_the_same_place_writes_nothing():
+    arms = planner(200)
+    arms.move_to(-45, 45)
+    round_trips = arms.round_trips()
+
+    assert arms.plan_move(-45, 45) == [(-45, 45)]
+    arms.move_to(-45, 45)
+    assert arms.round_trips() == round_trips
+
+
+# The estimate for a message runs on a fake pigpio of its own, so the flagger's servos aren't touched.
+def test_estimate_message_leaves_the_servos_alone():
+    pi = fake_pigpio.FakePi()
+    flagger = semaphore.SemaphoreFlagger(semaphore.Servo(LEFT_SERVO, pi), semaphore.Servo(RIGHT_SERVO, pi), 2,
+                                         max_speed=200, sleep=lambda seconds: None)
+    estimate = flagger.estimate_message("12h 34m ")
+
+    assert pi.round_trips() == 0
+    assert estimate["moves"] > 0 and estimate["steps"] > estimate["moves"]
+    assert estimate["round_trips"] > 0 and estimate["travel_degrees"] > 0
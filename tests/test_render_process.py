@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+
+from display import display
+from display import epd4in2b
+from display import epdif
+from display import render_process
+
+START_TIME = 1700000000
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def planes(fill):
+    return bytes([fill]) * render_process.PLANE_BYTES, bytes([255 - fill]) * render_process.PLANE_BYTES
+
+
+# A slot written in one process is read in place by another that attaches to the frames by name.
+def test_shared_frames_slots():
+    frames = render_process.SharedFrames()
+    try:
+        other = render_process.SharedFrames(frames.name)
+        frames.write(0, *planes(0x0f))
+        frames.write(1, *planes(0xa5))
+
+        assert tuple(bytes(plane) for plane in other.planes(0)) == planes(0x0f)
+        assert tuple(bytes(plane) for plane in other.planes(1)) == planes(0xa5)
+        views = other.planes(0)
+        for view in views:
+            view.release()
+        other.close()
+    finally:
+        frames.close()
+
+
+# The render side fills a free slot and hands it over; it only gets the slot back once the frame has been sent,
+# along with how long the refresh took.
+def test_render_side_hands_slots_over_and_gets_them_back():
+    connection, worker_connection = multiprocessing.Pipe()
+    frames = render_process.SharedFrames()
+    try:
+        worker = render_process.RenderWorker(worker_connection, frames, 10)
+        for fill in (0x01, 0x02):
+            worker.send_to_panel(display.PackedFrame(b"", *planes(fill), None))
+
+        assert connection.recv() == ("frame", 0, None)
+        assert connection.recv() == ("frame", 1, None)
+        assert worker.free_slots.empty()
+        assert bytes(frames.planes(1)[0]) == planes(0x02)[0]
+
+        connection.send(("sent", 0, 12.5))
+        connection.send(("stop",))
+        worker.receive()
+        assert worker.free_slots.get_nowait() == 0
+        assert worker.refresh_seconds == 12.5
+    finally:
+        frames.close()
+
+
+# The clock's side sends the frame in a slot straight from the shared memory, and hands the slot back.
+def test_clock_side_sends_the_slot_and_hands_it_back():
+    transport = epdif.FakeTransport()
+    epdif.set_transport(transport)
+    clock_display = render_process.RenderProcess(defer_init=True)
+    connection, worker_connection = multiprocessing.Pipe()
+    clock_display.connection = connection
+    try:
+        frame_black, frame_red = os.urandom(render_process.PLANE_BYTES), os.urandom(render_process.PLANE_BYTES)
+        clock_display.frames.write(1, frame_black, frame_red)
+        clock_display.send_frame(1, None)
+
+        # The planes go in chunks, with their commands in between.
+        sent = b"".join(data for dc, data in transport.transfers)
+        assert sent.index(frame_black) < sent.index(frame_red)
+        assert worker_connection.recv()[:2] == ("sent", 1)
+        assert clock_display.frames_sent == 1
+    finally:
+        clock_display.frames.close()
+
+
+# A render process that dies is started again, given what was posted, and draws the screen again.
+def test_render_process_is_restarted_after_a_crash():
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+    clock_display = render_process.RenderProcess()
+    clock_display.daemon = True
+    clock_display.start()
+    try:
+        clock_display.post_tfl_status({"Jubilee": "Severe Delays"})
+        clock_display.post_time(time.localtime(START_TIME))
+        assert wait_for(lambda: clock_display.frames_sent == 1)
+
+        first = clock_display.process
+        first.kill()
+        assert wait_for(lambda: clock_display.restarts == 1 and clock_display.frames_sent == 2)
+        assert clock_display.process is not first and clock_display.process.is_alive()
+
+        clock_display.post_time(time.localtime(START_TIME + 60))
+        assert wait_for(lambda: clock_display.frames_sent == 3)
+    finally:
+        clock_display.stop()
+
+    assert not clock_display.process.is_alive()
+    assert not clock_display.is_alive()
@@ -0,0 +1,116 @@
+import time
+
+import scheduler
+from simulation.virtual_clock import VirtualClock
+
+
+# A virtual clock whose wall time can be stepped, as NTP would, without the monotonic time moving.
+class SteppingClock(VirtualClock):
+
+    def step(self, seconds):
+        self.now += seconds
+        self.start += seconds
+
+
+def at(hour, minute, second):
+    return time.mktime((2018, 5, 20, hour, minute, second, 0, 0, -1))
+
+
+# Runs the loop as SemaphoreClock does until the wall clock reaches until.
+def run_until(deadline_scheduler, clock, until):
+    while clock.time() < until:
+        clock.sleep(deadline_scheduler.run_due())
+
+
+def recording_scheduler(clock):
+    runs = {"display": [], "semaphore": []}
+    deadline_scheduler = scheduler.DeadlineScheduler(clock)
+    deadline_scheduler.add_boundary_job("display", 1, lambda now: runs["display"].append(now[3:6]), resync=True)
+    deadline_scheduler.add_boundary_job("semaphore", 15, lambda now: runs["semaphore"].append(now[3:6]))
+    return deadline_scheduler, runs
+
+
+def test_boundary_jobs_run_on_the_minute():
+    clock = SteppingClock(at(22, 28, 30))
+    deadline_scheduler, runs = recording_scheduler(clock)
+
+    run_until(deadline_scheduler, clock, at(22, 31, 5))
+
+    assert runs["display"] == [(22, 28, 30), (22, 29, 0), (22, 30, 0), (22, 31, 0)]
+    assert runs["semaphore"] == [(22, 28, 30), (22, 30, 0)]
+    assert deadline_scheduler.stats()["display"]["max_lateness"] < 1e-6
+
+
+# Stepped back past the last boundary: the display is put right straight away, the semaphore doesn't repeat 22:30.
+def test_step_back_does_not_repeat_a_boundary():
+    clock = SteppingClock(at(22, 29, 50))
+    deadline_scheduler, runs = recording_scheduler(clock)
+    run_until(deadline_scheduler, clock, at(22, 30, 16))
+
+    clock.step(-90)
+    run_until(deadline_scheduler, clock, at(22, 31, 5))
+
+    assert deadline_scheduler.clock_steps == 1
+    assert runs["semaphore"] == [(22, 29, 50), (22, 30, 0)]
+    assert runs["display"] == [(22, 29, 50), (22, 30, 0), (22, 28, 46), (22, 29, 0), (22, 30, 0), (22, 31, 0)]
+
+
+# Stepped forward over boundaries: each job runs once, late, and the jumped boundaries count as missed.
+def test_step_forward_runs_jumped_boundaries_once():
+    clock = SteppingClock(at(22, 29, 50))
+    deadline_scheduler, runs = recording_scheduler(clock)
+    run_until(deadline_scheduler, clock, at(22, 29, 55))
+
+    clock.step(20 * 60)
+    deadline_scheduler.run_due()
+    now = tuple(clock.localtime()[3:6])
+
+    assert runs["semaphore"] == [(22, 29, 50), now]
+    assert runs["display"][-1] == now
+    assert deadline_scheduler.stats()["display"]["missed"] == 19
+    assert deadline_scheduler.stats()["semaphore"]["missed"] == 1
+
+
+# A loop that stalls runs each job once when it catches up, and counts what it missed.
+def test_stall_runs_each_job_once():
+    clock = SteppingClock(at(22, 29, 50))
+    deadline_scheduler, runs = recording_scheduler(clock)
+    deadline_scheduler.run_due()
+
+    clock.advance(5 * 60 + 30)
+    deadline_scheduler.run_due()
+
+    assert runs["display"] == [(22, 29, 50), (22, 35, 20)]
+    assert deadline_scheduler.stats()["display"]["missed"] == 5
+    assert deadline_scheduler.stats()["display"]["last_lateness"] == 5 * 60 + 20
+    assert deadline_scheduler.clock_steps == 0
+
+
+def test_periodic_jobs_keep_their_period():
+    clock = SteppingClock(at(12, 0, 0))
+    runs = []
+    deadline_scheduler = scheduler.DeadlineScheduler(clock)
+    deadline_scheduler.add_periodic_job("sources", 2, lambda now: runs.append(clock.monotonic()))
+
+    run_until(deadline_scheduler, clock, at(12, 0, 9))
+
+    assert runs == [0, 2, 4, 6, 8]
+
+
+# A job that raises is reported and counted, the jobs after it still run, and it runs again on its next boundary.
+def test_failing_job_does_not_stop_the_loop():
+    clock = SteppingClock(at(22, 28, 30))
+    deadline_scheduler = scheduler.DeadlineScheduler(clock)
+    runs = []
+
+    def fail(now):
+        raise AttributeError("'NoneType' object has no attribute 'status_dictionary'")
+
+    deadline_scheduler.add_boundary_job("failing", 1, fail)
+    deadline_scheduler.add_boundary_job("display", 1, lambda now: runs.append(now[3:6]))
+
+    run_until(deadline_scheduler, clock, at(22, 30, 5))
+
+    assert runs == [(22, 28, 30), (22, 29, 0), (22, 30, 0)]
+    assert deadline_scheduler.stats()["failing"]["failures"] == 3
+    assert deadline_scheduler.stats()["failing"]["runs"] == 3
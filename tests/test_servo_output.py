@@ -0,0 +1,125 @@
+from semaphore import fake_pigpio
+from semaphore import semaphore
+from semaphore import servo_output
+from simulation.virtual_clock import VirtualClock
+
+LEFT_SERVO = {'pwm_pin': 9, 'low_duty': 500, 'high_duty': 2500}
+RIGHT_SERVO = {'pwm_pin': 27, 'low_duty': 500, 'high_duty': 2500}
+
+
+def servos(pi=None):
+    pi = pi if pi is not None else fake_pigpio.FakePi()
+    return semaphore.Servo(LEFT_SERVO, pi), semaphore.Servo(RIGHT_SERVO, pi)
+
+
+def recording_flagger(park, pause_time=2):
+    clock = VirtualClock(0)
+    left_servo, right_servo = servos()
+    output = servo_output.RecordingOutput(left_servo, right_servo, clock=clock.monotonic)
+    flagger = semaphore.SemaphoreFlagger(left_servo, right_servo, pause_time, sleep=clock.sleep,
+                                         clock=clock.monotonic, output=output, park=park)
+    return flagger, output
+
+
+def signal(flagger, text):
+    flagger.cmd_queue.put(text, flagger.cmd_queue.TIME)
+    return flagger.signal(flagger.cmd_queue.get())
+
+
+# Every pose sends both arms together, a pause apart, and the arms are parked once the message is done.
+def test_poses_are_sent_together_and_parked_after_the_message():
+    flagger, output = recording_flagger(park=True)
+    signal(flagger, "12h 34m ")
+
+    times = [timestamp for timestamp, pulses in output.sends]
+    pulses = [pulses for timestamp, pulses in output.sends]
+    assert len(pulses) == output.poses + 1
+    assert all(later - earlier == 2 for earlier, later in zip(times[:-2], times[1:-1]))
+    assert pulses[-1] == (0, 0)
+    assert all(0 not in pose for pose in pulses[:-1])
+    assert output.parks == 1 and output.pulses is None
+
+
+def test_no_park_while_more_is_waiting_or_without_park():
+    flagger, output = recording_flagger(park=True)
+    flagger.cmd_queue.put("12h 34m ", flagger.cmd_queue.TIME)
+    command = flagger.cmd_queue.get()
+    flagger.cmd_queue.put("hello", flagger.cmd_queue.MESSAGE)
+    flagger.signal(command)
+    assert output.parks == 0
+
+    flagger, output = recording_flagger(park=False)
+    signal(flagger, "12h 34m ")
+    assert output.parks == 0
+    assert (0, 0) not in [pulses for timestamp, pulses in output.sends]
+
+
+# The same pose twice isn't sent again; after a park it is.
+def test_repeated_pose_is_skipped_until_parked():
+    output = servo_output.RecordingOutput(*servos())
+    assert output.set_angles(45, -45)
+    assert not output.set_angles(45, -45)
+    assert output.park()
+    assert not output.park()
+    assert output.set_angles(45, -45)
+    assert output.round_trips() == 3
+
+
+def test_script_output_sets_both_arms_in_one_request():
+    pi = fake_pigpio.FakePi()
+    left_servo, right_servo = servos(pi)
+    output = servo_output.ScriptOutput(left_servo, right_servo)
+
+    output.set_angles(45, -45)
+    requests = pi.requests
+    output.set_angles(90, -90)
+
+    assert pi.requests == requests + 1
+    assert pi.pulse_writes[-1][0] == pi.pulse_writes[-2][0]
+    # The servos know where they are, so a fallback wouldn't skip a write it needs.
+    assert left_servo.current_pulse == left_servo.pulse_width(90)
+    assert right_servo.current_pulse == right_servo.pulse_width(-90)
+    assert left_servo.writes == 2 and right_servo.writes == 2
+
+
+# A pigpio connection that raises for failed requests, as pigpio does by default.
+class FailingPi(fake_pigpio.FakePi):
+
+    def __init__(self, fail_store=False, fail_run=False):
+        fake_pigpio.FakePi.__init__(self)
+        self.fail_store = fail_store
+        self.fail_run = fail_run
+
+    def store_script(self, script):
+        if self.fail_store:
+            raise RuntimeError("no scripts")
+        return fake_pigpio.FakePi.store_script(self, script)
+
+    def run_script(self, script_id, params=None):
+        if self.fail_run:
+            raise RuntimeError("bad script")
+        return fake_pigpio.FakePi.run_script(self, script_id, params)
+
+
+def test_falls_back_to_one_request_per_servo_when_the_script_cannot_be_stored():
+    pi = FailingPi(fail_store=True)
+    output = servo_output.ScriptOutput(*servos(pi))
+
+    assert output.set_angles(45, -45)
+    assert output.fallback is not None
+    assert [write[1:] for write in pi.pulse_writes] == [(9, output.pulses[0]), (27, output.pulses[1])]
+
+
+def test_falls_back_when_running_the_script_fails():
+    pi = FailingPi()
+    left_servo, right_servo = servos(pi)
+    output = servo_output.ScriptOutput(left_servo, right_servo)
+    output.set_angles(45, -45)
+
+    pi.fail_run = True
+    output.set_angles(90, -45)
+
+    assert output.fallback is not None
+    # Only the arm that moved is written to, as the servos knew where the script had put them.
+    assert [write[1:] for write in pi.pulse_writes[-1:]] == [(9, left_servo.pulse_width(90))]
+    assert pi.get_servo_pulsewidth(27) == right_servo.pulse_width(-45)
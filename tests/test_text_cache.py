@@ -0,0 +1,74 @@
+import time
+
+from PIL import Image
+from PIL import ImageChops
+from PIL import ImageFont
+
+from display import display
+from display import epdif
+from display import text_cache
+import instrumentation
+
+MAIN_FONT = './display/HammersmithOne-Regular.ttf'
+
+
+def all_times():
+    return ["{:02d}:{:02d}".format(hour, minute) for hour in range(24) for minute in range(60)]
+
+
+# Every time the clock can show comes out of the atlas exactly as render_mask draws it, in the same size.
+def test_atlas_matches_render_mask_for_every_time():
+    font = ImageFont.truetype(MAIN_FONT, 100)
+    atlas = text_cache.GlyphAtlas(font, "0123456789:", rotation=270)
+
+    for text in all_times():
+        expected = text_cache.render_mask(font, text, 270)
+        image = Image.new('1', expected.size, color=1)
+        atlas.paste(image, (0, 0), text)
+
+        assert atlas.text_size(text) == font.getsize(text), text
+        assert ImageChops.difference(image, expected).getbbox() is None, text
+
+
+def test_atlas_unrotated():
+    font = ImageFont.truetype(MAIN_FONT, 100)
+    atlas = text_cache.GlyphAtlas(font, "0123456789:", rotation=0)
+
+    for text in ("07:17", "11:11", "20:48"):
+        expected = text_cache.render_mask(font, text)
+        image = Image.new('1', expected.size, color=1)
+        atlas.paste(image, (0, 0), text)
+        assert ImageChops.difference(image, expected).getbbox() is None, text
+
+
+def test_cache_evicts_least_recently_used():
+    font = ImageFont.truetype(MAIN_FONT, 30)
+    first = text_cache.render_mask(font, "Bakerloo", 270)
+    cache = text_cache.TextMaskCache(max_bytes=text_cache.mask_bytes(first) * 2)
+
+    cache.get_mask(font, "Bakerloo", 270)
+    cache.get_mask(font, "Central", 270)
+    cache.get_mask(font, "Bakerloo", 270)
+    cache.get_mask(font, "Victoria Line", 270)
+
+    assert cache.stats()["hits"] == 1
+    assert cache.evictions >= 1
+    assert (font.path, font.size, "Central", 270) not in cache.masks
+
+
+# Each screen drawn publishes the cache counts, so the hit rate can be watched on a running clock.
+def test_display_exports_the_cache_counts():
+    epdif.set_transport(epdif.FakeTransport(record_transfers=False))
+    clock_display = display.ClockDisplay()
+    instrumentation.enable()
+    try:
+        clock_display.post_time(time.localtime(1700000000))
+        assert clock_display.update()
+        gauges = instrumentation.registry.snapshot()["gauges"]
+    finally:
+        instrumentation.disable()
+
+    stats = clock_display.text_cache_stats()
+    assert stats["atlas_hits"] == 1
+    for name in ("hits", "misses", "atlas_hits", "atlas_misses", "metrics_hits", "metrics_misses"):
+        assert gauges["display_text_cache_{}".format(name)] == stats[name]
@@ -0,0 +1,64 @@
+import time
+
+from time_sync import TimeSample
+from time_sync import TimeSync
+from time_sync import time_sync
+from time_sync.stub_server import NtpStubServer
+
+
+def sample(server, offset, delay, stratum=2, taken_at=0.0):
+    return TimeSample(server, offset, delay, stratum, taken_at)
+
+
+# The closest server wins, but not if it disagrees with the rest, and unsynchronised servers don't count.
+def test_best_sample_ignores_outliers_and_bad_strata():
+    samples = [sample("a", 0.10, 0.050), sample("b", 0.12, 0.020), sample("c", 30.0, 0.001),
+               sample("d", 0.11, 0.005, stratum=16)]
+    assert time_sync.best_sample(samples).server == "b"
+    assert time_sync.best_sample([sample("d", 0.1, 0.01, stratum=0)]) is None
+
+
+def test_clock_is_trusted_only_while_close_enough():
+    sync = TimeSync(servers=("a",), max_offset=2)
+    sync.record(sample("a", 5.0, 0.01, taken_at=0.0))
+    assert not sync.trusted.is_set()
+
+    sync.record(sample("a", 0.3, 0.01, taken_at=10.0))
+    assert sync.trusted.is_set()
+
+    sync.record(sample("a", -2.5, 0.01, taken_at=20.0))
+    assert not sync.trusted.is_set()
+
+
+def test_drift_from_the_offsets_and_reset_by_a_step():
+    sync = TimeSync(servers=("a",), max_offset=2)
+    for second in range(0, 1000, 100):
+        # Offset shrinking by 1 ms every 100 s: the clock gains 10 us a second.
+        sync.record(sample("a", 0.5 - second * 1e-5, 0.01, taken_at=float(second)))
+    assert abs(sync.drift - 1e-5) < 1e-9
+
+    sync.record(sample("a", 10.0, 0.01, taken_at=1000.0))
+    assert sync.samples == [sample("a", 10.0, 0.01, taken_at=1000.0)]
+    assert sync.drift is None
+
+
+# Several servers are asked at once; one that doesn't answer doesn't hold up the rest or the trust.
+def test_sync_against_stub_servers():
+    good = NtpStubServer(offset=0.2)
+    silent = NtpStubServer()
+    silent.silent = True
+    for server in (good, silent):
+        server.start()
+
+    sync = TimeSync(servers=(good.address(), silent.address()), request_timeout=0.5)
+    try:
+        start = time.monotonic()
+        sync.start()
+        assert sync.wait_trusted(5)
+        assert time.monotonic() - start < 2
+        assert abs(sync.offset - 0.2) < 0.05
+        assert sync.answers[good.address()] >= 1
+    finally:
+        sync.stop()
+        for server in (good, silent):
+            server.stop()
@@ -3,6 +3,18 @@ import json
 import threading
 import time
 
+import channels
+import instrumentation
+
+
+# The summary status of each line, by line name, from the JSON TfL sends back.
+def parse_line_statuses(result):
+    status = {}
+    for line in result:
+        # print (line['name'],":", line['lineStatuses'][0]['statusSeverityDescription'])
+        status[line['name']] = line['lineStatuses'][0]['statusSeverityDescription']
+    return status
+
 
 # Class that manages the TFL status - sorts out the credentials and makes the queries when asked.
 class Tfl_Status(threading.Thread):
@@ -25,27 +37,41 @@ class Tfl_Status(threading.Thread):
 
         self.status_dictionary = None
 
+        # Used by the fetch engine, which does the fetching for this source when the clock is running.
+        self.name = "tfl"
+        self.refresh_interval = 120
+        self.cache_ttl = 60
+
     # Get the status from the TFL site and process it to get just the summary status.
     def get_summary_status(self):
 
         status ={}
 
         try:
-            result= requests.get(self.status_request_url).json()
-            for line in result:
-                # print (line['name'],":", line['lineStatuses'][0]['statusSeverityDescription'])
-                status[line['name']] = line['lineStatuses'][0]['statusSeverityDescription']
+            status = self.parse_summary_status(requests.get(self.status_request_url).json())
         except:
             print("tfl status get failed - random number generator or Internet not avail?")
             #raise - removed on 07/02/21 - keep retrying. 
 
         return status
 
+    # Picks the summary status of each line out of the JSON TfL sends back.
+    def parse_summary_status(self, result):
+        with instrumentation.timer("tfl_parse_seconds"):
+            return parse_line_statuses(result)
+
+    # Makes a new status available to the rest of the clock.  It is frozen, so it can be passed on without copying.
+    def publish(self, status):
+        self.status_dictionary = channels.freeze(status)
+
+    # Fetches the status every refresh_interval, for running the source on its own.  A failed fetch keeps the
+    # status already published, as the fetch engine does.
     def run(self):
-        # Get the status every once in a while
         while True:
-            self.status_dictionary = self.get_summary_status()
-            time.sleep(120)
+            status = self.get_summary_status()
+            if len(status) > 0:
+                self.publish(status)
+            time.sleep(self.refresh_interval)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,2 @@
+from .time_sync import TimeSync
+from .time_sync import TimeSample
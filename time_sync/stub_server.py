@@ -0,0 +1,67 @@
+import socket
+import threading
+import time
+
+import ntplib
+
+
+# Local UDP NTP server, so TimeSync can be run with no network.  It answers with the system time plus offset
+# seconds, after waiting delay seconds, and doesn't answer at all while silent is set.
+#
+#   python -m time_sync.stub_server 12300 0.5
+class NtpStubServer(threading.Thread):
+
+    def __init__(self, offset=0.0, delay=0.0, stratum=2, port=0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.offset = offset
+        self.delay = delay
+        self.stratum = stratum
+        self.silent = False
+        self.requests = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', port))
+        self.port = self.socket.getsockname()[1]
+        self.stopping = False
+
+    def address(self):
+        return "127.0.0.1:{}".format(self.port)
+
+    def run(self):
+        while not self.stopping:
+            try:
+                data, client = self.socket.recvfrom(256)
+            except OSError:
+                break
+
+            received = ntplib.system_to_ntp_time(time.time() + self.offset)
+            self.requests += 1
+            if self.silent:
+                continue
+
+            query = ntplib.NTPPacket()
+            query.from_data(data)
+
+            time.sleep(self.delay)
+
+            reply = ntplib.NTPPacket(version=query.version, mode=4)
+            reply.stratum = self.stratum
+            reply.orig_timestamp = query.tx_timestamp
+            reply.ref_timestamp = received
+            reply.recv_timestamp = received
+            reply.tx_timestamp = ntplib.system_to_ntp_time(time.time() + self.offset)
+            self.socket.sendto(reply.to_data(), client)
+
+    def stop(self):
+        self.stopping = True
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    stub_server = NtpStubServer(offset=float(sys.argv[2]) if len(sys.argv) > 2 else 0.0, port=int(sys.argv[1]))
+    print("Serving NTP on {}".format(stub_server.address()))
+    stub_server.run()
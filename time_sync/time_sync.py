@@ -0,0 +1,165 @@
+import concurrent.futures
+import statistics
+import threading
+import time
+from typing import NamedTuple
+
+import ntplib
+
+
+DEFAULT_SERVERS = ('0.europe.pool.ntp.org', '1.europe.pool.ntp.org', '2.europe.pool.ntp.org',
+                   '3.europe.pool.ntp.org')
+
+
+# One answer from one server.  offset is how far the system clock is behind the server, in seconds.
+class TimeSample(NamedTuple):
+    server: str
+    offset: float
+    delay: float
+    stratum: int
+    taken_at: float
+
+
+# Servers can be given as "host" or "host:port" - the port is mostly for pointing at a local stub.
+def split_server(server):
+    if ':' in server:
+        host, port = server.rsplit(':', 1)
+        return host, int(port)
+    return server, 'ntp'
+
+
+# The best of one round of samples: the one with the least round trip delay, as its offset is the most certain,
+# from among the samples that agree with the median offset.  A server far off from the rest is ignored.
+def best_sample(samples, max_disagreement=0.5):
+    samples = [sample for sample in samples if 0 < sample.stratum < 16]
+    if len(samples) == 0:
+        return None
+
+    median_offset = statistics.median(sample.offset for sample in samples)
+    agreeing = [sample for sample in samples if abs(sample.offset - median_offset) <= max_disagreement]
+    return min(agreeing, key=lambda sample: sample.delay)
+
+
+# Checks the system clock against several NTP servers at once.
+# At start up it queries them every round_interval seconds until the clock is within max_offset of the best answer,
+# at which point the trusted Event is set.  Anything waiting on the clock can use wait_trusted() - given a timeout
+# it gives up after that long instead of hanging on a dead network.
+# After that the clock is checked every track_interval seconds to follow its offset and drift; trusted is cleared if
+# the clock wanders off (and set again when it comes back).  If the clock can't be trusted after boot_timeout
+# seconds, it keeps on trying every retry_interval seconds.
+class TimeSync(threading.Thread):
+
+    def __init__(self, servers=DEFAULT_SERVERS, max_offset=2, request_timeout=2, round_interval=1, boot_timeout=30,
+                 retry_interval=30, track_interval=1024, max_samples=32, clock=time.time, ntp_client=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.servers = tuple(servers)
+        self.max_offset = max_offset
+        self.request_timeout = request_timeout
+        self.round_interval = round_interval
+        self.boot_timeout = boot_timeout
+        self.retry_interval = retry_interval
+        self.track_interval = track_interval
+        self.max_samples = max_samples
+        self.clock = clock
+        self.ntp_client = ntp_client if ntp_client is not None else ntplib.NTPClient()
+
+        self.trusted = threading.Event()
+        self.stopping = threading.Event()
+
+        # Best sample of each round, oldest first.
+        self.samples = []
+        self.offset = None
+        self.delay = None
+        self.drift = None           # seconds the clock gains (+) or loses (-) per second
+
+        self.rounds = 0
+        self.answers = {server: 0 for server in self.servers}
+        self.failures = {server: 0 for server in self.servers}
+
+    # Waits until the clock can be trusted.  Returns False if timeout runs out first.
+    def wait_trusted(self, timeout=None):
+        return self.trusted.wait(timeout)
+
+    # The system time with the last measured offset applied.
+    def corrected_time(self):
+        if self.offset is None:
+            return self.clock()
+        return self.clock() + self.offset
+
+    def query_server(self, server):
+        host, port = split_server(server)
+        stats = self.ntp_client.request(host, version=4, port=port, timeout=self.request_timeout)
+        return TimeSample(server, stats.offset, stats.delay, stats.stratum, self.clock())
+
+    # Queries every server at once and returns the best sample, or None if none answered.
+    def sync_round(self):
+        self.rounds += 1
+        samples = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.servers)) as executor:
+            futures = {executor.submit(self.query_server, server): server for server in self.servers}
+            for future in concurrent.futures.as_completed(futures):
+                server = futures[future]
+                try:
+                    samples.append(future.result())
+                    self.answers[server] += 1
+                except (ntplib.NTPException, OSError):
+                    self.failures[server] += 1
+
+        if len(samples) == 0:
+            print("*** No answer from any NTP server")
+        return best_sample(samples)
+
+    def record(self, sample):
+        # A jump in the offset means the clock has been stepped, so the history no longer says anything about drift.
+        if self.offset is not None and abs(sample.offset - self.offset) > self.max_offset:
+            self.samples = []
+
+        self.samples.append(sample)
+        del self.samples[:-self.max_samples]
+        self.offset = sample.offset
+        self.delay = sample.delay
+        self.drift = self.estimate_drift()
+
+        if abs(sample.offset) < self.max_offset:
+            self.trusted.set()
+        else:
+            if self.trusted.is_set():
+                print("*** Clock is {:.1f}s out - no longer trusted".format(sample.offset))
+            self.trusted.clear()
+
+    # Least squares slope of offset against time.  The offset shrinking over time means the clock is gaining.
+    def estimate_drift(self):
+        if len(self.samples) < 2 or self.samples[-1].taken_at == self.samples[0].taken_at:
+            return None
+
+        mean_time = statistics.fmean(sample.taken_at for sample in self.samples)
+        mean_offset = statistics.fmean(sample.offset for sample in self.samples)
+        covariance = sum((sample.taken_at - mean_time) * (sample.offset - mean_offset) for sample in self.samples)
+        variance = sum((sample.taken_at - mean_time) ** 2 for sample in self.samples)
+        return -covariance / variance
+
+    def stats(self):
+        return {'trusted': self.trusted.is_set(), 'offset': self.offset, 'delay': self.delay, 'drift': self.drift,
+                'rounds': self.rounds, 'answers': dict(self.answers), 'failures': dict(self.failures)}
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self):
+        started = self.clock()
+
+        while not self.stopping.is_set():
+            sample = self.sync_round()
+            if sample is not None:
+                self.record(sample)
+
+            if self.trusted.is_set():
+                interval = self.track_interval
+            elif self.clock() - started < self.boot_timeout:
+                interval = self.round_interval
+            else:
+                interval = self.retry_interval
+
+            self.stopping.wait(interval)